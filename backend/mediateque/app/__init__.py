@@ -1,21 +1,65 @@
-from flask import Flask
+import time
+from flask import Flask, g, request
 from flask_pymongo import PyMongo
 from flask_cors import CORS
 from config import Config
+from app.utils.metriques import EcouteurCommandes, configurer_journal, observer_requete
+from app.utils.serialisation import ReponseJSON
 
 mongo = PyMongo()
 
-def create_app():
+def instrumenter(app):
+    # Latence de chaque route, sérialisation JSON comprise (voir /api/metrics)
+    @app.before_request
+    def demarrer_chrono():
+        g.debut_requete = time.perf_counter()
+
+    @app.after_request
+    def mesurer(response):
+        debut = g.pop('debut_requete', None)
+        if debut is not None:
+            observer_requete(request.endpoint, request.method, response.status_code,
+                             time.perf_counter() - debut,
+                             getattr(response, 'duree_serialisation', None))
+        return response
+
+def create_app(config=None):
     app = Flask(__name__)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
+    app.json = ReponseJSON(app)
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    configurer_journal(app.config['LOG_LEVEL'])
+    
+    mongo.init_app(
+        app,
+        event_listeners=[EcouteurCommandes(app.config['MONGO_SLOW_MS'])],
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        connectTimeoutMS=app.config['MONGO_CONNECT_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS']
+    )
+    
+    from app.commands import register_commands
+    from app.indexes import ensure_indexes
+    register_commands(app)
+    if app.config['MONGO_AUTO_INDEX']:
+        ensure_indexes(mongo.db)
     
-    mongo.init_app(app)
+    if app.config['MONGO_CHANGE_STREAMS']:
+        from app.utils.changements import ecouteur
+        # Démarré à la première requête : ni les commandes CLI ni le
+        # processus parent du rechargeur ne suivent le flux
+        app.before_request(lambda: ecouteur.demarrer(mongo.db))
     
-    from app.routes import abonnes, documents, emprunts, stats
+    instrumenter(app)
+    from app.routes import abonnes, documents, emprunts, metriques, stats
     app.register_blueprint(abonnes.bp, url_prefix='/api')
     app.register_blueprint(documents.bp, url_prefix='/api')
     app.register_blueprint(emprunts.bp, url_prefix='/api')
     app.register_blueprint(stats.bp, url_prefix='/api')
+    app.register_blueprint(metriques.bp, url_prefix='/api')
     
     return app
\ No newline at end of file
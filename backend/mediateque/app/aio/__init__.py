@@ -0,0 +1,116 @@
+"""Variante asyncio de l'API : Quart et le pilote asynchrone de PyMongo.
+
+Mêmes routes et mêmes réponses que l'application Flask ; les services
+attendent chaque aller-retour MongoDB sans bloquer de thread et lancent
+les requêtes indépendantes en parallèle (asyncio.gather).
+"""
+import asyncio
+import time
+from pymongo import AsyncMongoClient, MongoClient
+from quart import Quart, g, request
+from quart_cors import cors
+from config import Config
+from app.utils.metriques import EcouteurCommandes, configurer_journal, observer_requete
+from app.utils.serialisation import ReponseJSON
+
+
+class AsyncMongo:
+    """Pendant de flask_pymongo.PyMongo pour AsyncMongoClient.
+
+    Le client est ouvert au démarrage du serveur, dans la boucle
+    d'événements qui sert les requêtes, et fermé à son arrêt.
+    """
+
+    def __init__(self):
+        self.cx = None
+        self.db = None
+
+    def init_app(self, app, **kwargs):
+        @app.before_serving
+        async def connecter():
+            self.cx = AsyncMongoClient(app.config['MONGO_URI'], **kwargs)
+            self.db = self.cx.get_default_database()
+
+        @app.after_serving
+        async def fermer():
+            await self.cx.close()
+
+
+mongo = AsyncMongo()
+
+
+def appliquer_index(uri):
+    from app.indexes import ensure_indexes
+    with MongoClient(uri) as client:
+        ensure_indexes(client.get_default_database())
+
+
+def ecouter_changements(app):
+    from app.utils.changements import ecouteur
+    client = None
+
+    @app.before_serving
+    async def demarrer():
+        # Le flux de modifications est suivi par le thread de l'écouteur,
+        # sur un client synchrone qui lui est propre
+        nonlocal client
+        client = MongoClient(app.config['MONGO_URI'])
+        ecouteur.demarrer(client.get_default_database())
+
+    @app.after_serving
+    async def arreter():
+        await asyncio.to_thread(ecouteur.arreter)
+        client.close()
+
+
+def instrumenter(app):
+    @app.before_request
+    async def demarrer_chrono():
+        g.debut_requete = time.perf_counter()
+
+    @app.after_request
+    async def mesurer(response):
+        debut = g.pop('debut_requete', None)
+        if debut is not None:
+            observer_requete(request.endpoint, request.method, response.status_code,
+                             time.perf_counter() - debut,
+                             getattr(response, 'duree_serialisation', None))
+        return response
+
+
+def create_async_app(config=None):
+    app = cors(Quart(__name__), allow_origin='*')
+    app.json = ReponseJSON(app)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    configurer_journal(app.config['LOG_LEVEL'])
+
+    mongo.init_app(
+        app,
+        event_listeners=[EcouteurCommandes(app.config['MONGO_SLOW_MS'])],
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        connectTimeoutMS=app.config['MONGO_CONNECT_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS']
+    )
+
+    if app.config['MONGO_AUTO_INDEX']:
+        @app.before_serving
+        async def creer_index():
+            # Le registre d'index est synchrone : appliqué hors de la boucle
+            await asyncio.to_thread(appliquer_index, app.config['MONGO_URI'])
+
+    if app.config['MONGO_CHANGE_STREAMS']:
+        ecouter_changements(app)
+
+    instrumenter(app)
+    from app.aio.routes import abonnes, documents, emprunts, metriques, stats
+    app.register_blueprint(abonnes.bp, url_prefix='/api')
+    app.register_blueprint(documents.bp, url_prefix='/api')
+    app.register_blueprint(emprunts.bp, url_prefix='/api')
+    app.register_blueprint(stats.bp, url_prefix='/api')
+    app.register_blueprint(metriques.bp, url_prefix='/api')
+
+    return app
\ No newline at end of file
@@ -0,0 +1,57 @@
+from quart import Blueprint, request, jsonify
+from app.aio.services.abonne_service import AbonneService
+from app.aio.services.version_service import VersionService
+from app.aio.versions import conditionnel
+from app.utils.pagination import page, parse_pagination
+
+bp = Blueprint('abonnes', __name__)
+service = AbonneService()
+versions = VersionService()
+
+@bp.route('/abonnes', methods=['GET'])
+@conditionnel(versions, 'abonnes')
+async def get_abonnes():
+    try:
+        pagination = parse_pagination(args=request.args)
+        abonnes = await service.find_all(**pagination)
+        return jsonify(page(abonnes, pagination))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/abonnes/<id>', methods=['GET'])
+async def get_abonne(id):
+    try:
+        abonne = await service.find_by_id(id)
+        if abonne:
+            return jsonify(abonne)
+        return jsonify({'error': 'Abonné non trouvé'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/abonnes', methods=['POST'])
+async def create_abonne():
+    try:
+        data = await request.get_json()
+        abonne_id = await service.create(data)
+        return jsonify({'id': str(abonne_id)}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/abonnes/<id>', methods=['PUT'])
+async def update_abonne(id):
+    try:
+        data = await request.get_json()
+        await service.update(id, data)
+        return jsonify({'message': 'Abonné mis à jour'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/abonnes/<id>', methods=['DELETE'])
+async def delete_abonne(id):
+    try:
+        await service.delete(id)
+        return jsonify({'message': 'Abonné supprimé'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,115 @@
+from quart import Blueprint, request, jsonify
+from app.aio.services.document_service import DocumentService
+from app.aio.services.stats_service import StatsService
+from app.aio.services.version_service import VersionService
+from app.aio.versions import conditionnel
+from app.utils.pagination import encoder_curseur_score, page, parse_pagination
+
+bp = Blueprint('documents', __name__)
+service = DocumentService()
+stats_service = StatsService()
+versions = VersionService()
+
+@bp.route('/documents', methods=['GET'])
+@conditionnel(versions, 'documents')
+async def get_documents():
+    try:
+        search_query = request.args.get('search')
+        type_doc = request.args.get('type')
+        disponible = request.args.get('disponible')
+        pagination = parse_pagination(par_score=bool(search_query), args=request.args)
+        
+        if search_query:
+            documents = await service.search(search_query, **pagination)
+            return jsonify(page(documents, pagination, encoder_curseur_score))
+        elif type_doc:
+            documents = await service.find_by_type(type_doc, **pagination)
+        elif disponible:
+            documents = await service.find_by_disponibilite(disponible.lower() == 'true', **pagination)
+        else:
+            documents = await service.find_all(**pagination)
+            
+        return jsonify(page(documents, pagination))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/<id>', methods=['GET'])
+async def get_document(id):
+    try:
+        document = await service.find_by_id(id)
+        if document:
+            return jsonify(document)
+        return jsonify({'error': 'Document non trouvé'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents', methods=['POST'])
+async def create_document():
+    try:
+        data = await request.get_json()
+        required_fields = ['titre', 'auteur', 'type']
+        
+        if not all(field in data for field in required_fields):
+            return jsonify({
+                'error': 'Champs requis manquants',
+                'required_fields': required_fields
+            }), 400
+            
+        doc_id = await service.create(data)
+        return jsonify({
+            'message': 'Document créé avec succès',
+            'id': str(doc_id)
+        }), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/<id>', methods=['PUT'])
+async def update_document(id):
+    try:
+        data = await request.get_json()
+        await service.update(id, data)
+        return jsonify({'message': 'Document mis à jour avec succès'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/<id>', methods=['DELETE'])
+async def delete_document(id):
+    try:
+        await service.delete(id)
+        return jsonify({'message': 'Document supprimé avec succès'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/<id>/disponibilite', methods=['PUT'])
+async def update_disponibilite(id):
+    try:
+        data = await request.get_json()
+        if 'disponible' not in data:
+            return jsonify({'error': 'Le champ disponible est requis'}), 400
+            
+        await service.update_disponibilite(id, data['disponible'])
+        return jsonify({'message': 'Disponibilité mise à jour avec succès'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/stats', methods=['GET'])
+@conditionnel(versions, 'documents')
+async def get_stats():
+    try:
+        return jsonify(await stats_service.get_stats_documents())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/types', methods=['GET'])
+@conditionnel(versions, 'documents')
+async def get_types():
+    try:
+        return jsonify(await service.get_types())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,100 @@
+from quart import Blueprint, request, jsonify
+from app.aio.services.emprunt_service import EmpruntService
+from app.aio.services.archive_service import ArchiveService
+from app.aio.services.retard_service import RetardService
+from app.utils.pagination import page, parse_pagination
+
+bp = Blueprint('emprunts', __name__)
+service = EmpruntService()
+retards = RetardService()
+archives = ArchiveService()
+
+@bp.route('/emprunts', methods=['GET'])
+async def get_emprunts():
+    try:
+        pagination = parse_pagination(args=request.args)
+        emprunts = await service.get_emprunts(**pagination)
+        return jsonify(page(emprunts, pagination))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/emprunts', methods=['POST'])
+async def creer_emprunt():
+    try:
+        data = await request.get_json()
+        emprunt_id = await service.creer_emprunt(
+            data['abonne_id'],
+            data['document_id']
+        )
+        return jsonify({'id': str(emprunt_id)}), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/emprunts/<id>/retour', methods=['POST'])
+async def enregistrer_retour(id):
+    try:
+        await service.enregistrer_retour(id)
+        return jsonify({'message': 'Retour enregistré'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/emprunts/en-retard', methods=['GET'])
+async def get_retards():
+    try:
+        pagination = parse_pagination(args=request.args)
+        retards = await service.get_emprunts_en_retard(**pagination)
+        return jsonify(page(retards, pagination))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/en-retard/balayage', methods=['GET'])
+async def get_balayage_retards():
+    try:
+        return jsonify(await retards.lire_metriques()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/archivage', methods=['GET'])
+async def get_archivage():
+    try:
+        return jsonify(await archives.lire_metriques()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/abonne/<id>', methods=['GET'])
+async def get_emprunts_abonne(id):
+    try:
+        pagination = parse_pagination(args=request.args)
+        emprunts = await service.get_historique_emprunts_abonne(id, **pagination)
+        return jsonify(page(emprunts, pagination))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/document/<id>', methods=['GET'])
+async def get_emprunts_document(id):
+    try:
+        pagination = parse_pagination(args=request.args)
+        emprunts = await service.get_historique_emprunts_document(id, **pagination)
+        return jsonify(page(emprunts, pagination))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/<id>', methods=['DELETE'])
+async def delete_emprunt(id):
+    try:
+        await service.delete_emprunt(id)
+        return jsonify({'message': 'Emprunt supprimé'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,88 @@
+import asyncio
+from quart import Blueprint, current_app, jsonify, make_response, request
+from app.aio.services.cumul_service import CumulService
+from app.aio.services.stats_service import StatsService
+from app.services.cumul_service import lire_granularite, lire_limite, lire_periode
+from app.utils.changements import Cadence, ecouteur, format_sse
+
+bp = Blueprint('stats', __name__)
+service = StatsService()
+cumuls = CumulService()
+
+@bp.route('/stats', methods=['GET'])
+async def get_stats():
+    try:
+        stats = await service.get_stats()
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/timeseries', methods=['GET'])
+async def get_timeseries():
+    # Emprunts, retours et retards par jour, semaine ou mois, lus dans les
+    # cumuls (commande cumuler-emprunts), jamais dans la collection emprunts
+    try:
+        granularite = lire_granularite(request.args)
+        series = await cumuls.get_series(granularite=granularite, **lire_periode(request.args))
+        return jsonify(series), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/top-documents', methods=['GET'])
+async def get_top_documents():
+    try:
+        limite = lire_limite(request.args)
+        top = await cumuls.get_top_documents(limite=limite, **lire_periode(request.args))
+        return jsonify(top), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/flux', methods=['GET'])
+async def get_flux():
+    # Une connexion ne coûte qu'une tâche : le thread de l'écouteur réveille
+    # la boucle d'événements à chaque modification, pas de limite de flux
+    # ouverts ni de durée écourtée comme sous gunicorn gthread
+    cadence = Cadence(current_app.config)
+    dumps = current_app.json.dumps
+    boucle = asyncio.get_running_loop()
+    signal = asyncio.Event()
+
+    def reveiller():
+        try:
+            boucle.call_soon_threadsafe(signal.set)
+        except RuntimeError:
+            pass  # boucle déjà fermée
+
+    abonnement = ecouteur.abonner(request.headers.get('Last-Event-ID'), reveiller)
+
+    async def generer():
+        yield cadence.entete().encode()
+        try:
+            while not cadence.terminee():
+                if cadence.stats_dues():
+                    stats = await service.get_stats()
+                    yield format_sse({'type': 'stats', 'data': stats}, dumps).encode()
+                signal.clear()
+                evenements = abonnement.vider()
+                if not evenements:
+                    try:
+                        await asyncio.wait_for(signal.wait(), cadence.delai())
+                    except asyncio.TimeoutError:
+                        pass
+                    evenements = abonnement.vider()
+                for morceau in cadence.recevoir(evenements, dumps):
+                    yield morceau.encode()
+        except Exception as e:
+            yield format_sse({'type': 'erreur', 'data': {'error': str(e)}}, dumps).encode()
+        finally:
+            ecouteur.desabonner(abonnement)
+
+    response = await make_response(generer(), 200, {
+        'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'})
+    response.timeout = None
+    return response
\ No newline at end of file
@@ -0,0 +1,67 @@
+from bson import ObjectId
+from datetime import datetime
+from app.aio import mongo
+from app.models.abonne import Abonne
+from app.aio.services.compteur_service import CompteurService
+from app.aio.services.version_service import VersionService
+from config import Config
+from app.services import abonne_service
+from app.utils.pagination import paginer_async
+from app.utils.cache import abonnes_cache, stats_cache
+
+class AbonneService:
+    COLONNES_EXPORT = abonne_service.AbonneService.COLONNES_EXPORT
+
+    def __init__(self):
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+        self.modele = Abonne if Config.LECTURE_BSON_BRUTE else None
+
+    async def create(self, abonne_data):
+        abonne_data['date_inscription'] = datetime.now()
+        abonne_data['emprunts_actuels'] = []
+        abonne_data['historique_emprunts'] = []
+        result = await mongo.db.abonnes.insert_one(abonne_data)
+        await self.compteur_service.incrementer({'abonnes_total': 1})
+        await self.version_service.incrementer('abonnes')
+        stats_cache.invalidate()
+        return str(result.inserted_id)
+    
+    async def find_all(self, **pagination):
+        return await paginer_async(mongo.db.abonnes, modele=self.modele, **pagination)
+    
+    async def find_by_id(self, abonne_id):
+        _id = ObjectId(abonne_id)
+        return (await self.find_by_ids([_id])).get(_id)
+    
+    async def find_by_ids(self, abonne_ids):
+        return await abonnes_cache.trouver_async(
+            [ObjectId(i) for i in abonne_ids],
+            lambda ids: mongo.db.abonnes.find({'_id': {'$in': ids}}).to_list()
+        )
+    
+    async def update(self, abonne_id, data):
+        result = await mongo.db.abonnes.update_one(
+            {'_id': ObjectId(abonne_id)},
+            {'$set': data}
+        )
+        abonnes_cache.invalidate(ObjectId(abonne_id))
+        if result.matched_count:
+            await self.version_service.incrementer('abonnes')
+        return result
+    
+    async def delete(self, abonne_id):
+        result = await mongo.db.abonnes.delete_one({'_id': ObjectId(abonne_id)})
+        abonnes_cache.invalidate(ObjectId(abonne_id))
+        await self.compteur_service.incrementer({'abonnes_total': -result.deleted_count})
+        if result.deleted_count:
+            await self.version_service.incrementer('abonnes')
+        stats_cache.invalidate()
+        return result
+    
+    async def get_emprunts_actuels(self, abonne_id):
+        abonne = await self.find_by_id(abonne_id)
+        return abonne.get('emprunts_actuels', []) if abonne else []
+    
+    async def get_abonnes_count(self):
+        return await mongo.db.abonnes.count_documents({})
\ No newline at end of file
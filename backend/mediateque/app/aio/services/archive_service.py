@@ -0,0 +1,35 @@
+import asyncio
+from app.aio import mongo
+from app.aio.services.compteur_service import CompteurService
+from app.services.archive_service import metriques
+from app.utils.archives import ID_ARCHIVAGE, partitions
+from app.utils.cache import archives_cache
+from app.utils.politiques import ANALYTIQUE, collection
+
+class ArchiveService:
+    """Partitions et métriques des archives d'emprunts ; l'archivage
+    lui-même tourne hors de l'API (voir app.services.archive_service)."""
+
+    def __init__(self):
+        self.compteur_service = CompteurService()
+
+    async def partitions(self):
+        premiere = (await archives_cache.get_or_compute_async('premiere_annee', self._premiere_annee))[0]
+        return partitions(premiere)
+
+    async def _premiere_annee(self):
+        etat = await mongo.db.stats.find_one({'_id': ID_ARCHIVAGE}, {'premiere_annee': 1})
+        return etat.get('premiere_annee') if etat else None
+
+    async def lire_metriques(self):
+        emprunts = collection(mongo.db, 'emprunts', ANALYTIQUE)
+        curseur = await emprunts.aggregate([{'$collStats': {'storageStats': {}}}])
+        stockage, total, compteurs, etat = await asyncio.gather(
+            curseur.next(), emprunts.estimated_document_count(),
+            self.compteur_service.lire(ANALYTIQUE),
+            mongo.db.stats.find_one({'_id': ID_ARCHIVAGE}, {'_id': 0}))
+        etat = etat or {}
+        noms = partitions(etat.get('premiere_annee'))
+        tailles = await asyncio.gather(*(mongo.db[nom].estimated_document_count() for nom in noms))
+        return metriques(total, (compteurs or {}).get('emprunts_en_cours', 0), stockage['storageStats'],
+                         etat, dict(zip(noms, tailles)))
\ No newline at end of file
@@ -0,0 +1,24 @@
+from app.aio import mongo
+from app.services.compteur_service import (ID_COMPTEURS, deltas_mouvement, document_compteurs,
+                                           normaliser)
+from app.utils.politiques import collection
+
+class CompteurService:
+    """Compteurs matérialisés du tableau de bord (voir
+    app.services.compteur_service), lus et incrémentés sans bloquer."""
+
+    async def incrementer(self, deltas):
+        inc = {champ: n for champ, n in deltas.items() if n}
+        if inc:
+            await mongo.db.stats.update_one({'_id': ID_COMPTEURS}, {'$inc': inc})
+
+    async def mouvement_document(self, avant=None, apres=None):
+        await self.incrementer(deltas_mouvement(avant, apres))
+
+    async def lire(self, politique=None):
+        stats = collection(mongo.db, 'stats', politique)
+        return normaliser(await stats.find_one({'_id': ID_COMPTEURS}))
+
+    async def remplacer(self, compteurs):
+        await mongo.db.stats.replace_one({'_id': ID_COMPTEURS}, document_compteurs(compteurs),
+                                         upsert=True)
\ No newline at end of file
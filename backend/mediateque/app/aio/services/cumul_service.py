@@ -0,0 +1,33 @@
+import asyncio
+from app.aio import mongo
+from app.aio.services.document_service import DocumentService
+from app.services import cumul_service
+from app.services.cumul_service import (CUMULS_DOCUMENTS, CUMULS_JOURS, ID_CUMULS,
+                                        classement, series)
+from app.utils.politiques import ANALYTIQUE, collection
+
+class CumulService:
+    """Lectures des cumuls d'emprunts ; leur mise à jour tourne hors de
+    l'API (voir app.services.cumul_service)."""
+    pipeline_series = cumul_service.CumulService.pipeline_series
+    pipeline_top = cumul_service.CumulService.pipeline_top
+
+    def __init__(self):
+        self.document_service = DocumentService()
+
+    async def lire_filigrane(self):
+        etat = await collection(mongo.db, 'stats', ANALYTIQUE).find_one({'_id': ID_CUMULS}, {'filigrane': 1})
+        return etat['filigrane'] if etat else None
+
+    async def get_series(self, debut, fin, granularite='jour', type_doc=None):
+        curseur = await collection(mongo.db, CUMULS_JOURS, ANALYTIQUE).aggregate(
+            self.pipeline_series(debut, fin, granularite, type_doc))
+        resultats, filigrane = await asyncio.gather(curseur.to_list(), self.lire_filigrane())
+        return {**series(resultats, granularite), 'filigrane': filigrane}
+
+    async def get_top_documents(self, debut, fin, limite=10, type_doc=None):
+        curseur = await collection(mongo.db, CUMULS_DOCUMENTS, ANALYTIQUE).aggregate(
+            self.pipeline_top(debut, fin, limite, type_doc))
+        top, filigrane = await asyncio.gather(curseur.to_list(), self.lire_filigrane())
+        documents = await self.document_service.find_by_ids([t['_id'] for t in top])
+        return {'documents': classement(top, documents), 'filigrane': filigrane}
\ No newline at end of file
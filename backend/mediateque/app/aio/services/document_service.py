@@ -0,0 +1,173 @@
+from bson import ObjectId
+from app.aio import mongo
+from app.models.document import Document
+from app.aio.services.compteur_service import CompteurService
+from app.aio.services.version_service import VersionService
+from config import Config
+from app.services import document_service
+from app.services.document_service import (EXEMPLAIRE_DISPONIBLE, EXEMPLAIRES_EN_PRET,
+                                           alignement_disponible,
+                                           sans_disponibilite, stats_facettes)
+from app.utils.pagination import paginer_async
+from app.utils.cache import documents_cache, stats_cache
+from app.utils.politiques import ANALYTIQUE, collection
+from pymongo import ReturnDocument
+
+class DocumentService:
+    COLONNES_EXPORT = document_service.DocumentService.COLONNES_EXPORT
+    CHAMPS_COMPTES = document_service.DocumentService.CHAMPS_COMPTES
+    appliquer_defauts = document_service.DocumentService.appliquer_defauts
+    _pipeline_recherche = document_service.DocumentService._pipeline_recherche
+    pipeline_stats = document_service.DocumentService.pipeline_stats
+
+    def __init__(self):
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+        self.modele = Document if Config.LECTURE_BSON_BRUTE else None
+
+    async def create(self, document_data):
+        self.appliquer_defauts(document_data)
+        result = await mongo.db.documents.insert_one(document_data)
+        await self.compteur_service.mouvement_document(apres=document_data)
+        await self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return str(result.inserted_id)
+    
+    async def find_all(self, **pagination):
+        return await paginer_async(mongo.db.documents, modele=self.modele, **pagination)
+    
+    async def find_by_id(self, document_id):
+        _id = ObjectId(document_id)
+        return (await self.find_by_ids([_id])).get(_id)
+    
+    async def find_by_ids(self, document_ids):
+        return await documents_cache.trouver_async(
+            [ObjectId(i) for i in document_ids],
+            lambda ids: mongo.db.documents.find({'_id': {'$in': ids}}).to_list()
+        )
+    
+    async def update(self, document_id, data):
+        data = sans_disponibilite(data)
+        if 'exemplaires_total' in data:
+            return await self.modifier_exemplaires(document_id, data)
+        if not data:
+            return None
+        if 'type' not in data:
+            result = await mongo.db.documents.update_one(
+                {'_id': ObjectId(document_id)},
+                {'$set': data}
+            )
+            documents_cache.invalidate(ObjectId(document_id))
+            if result.matched_count:
+                await self.version_service.incrementer('documents')
+            return result
+        avant = await mongo.db.documents.find_one_and_update(
+            {'_id': ObjectId(document_id)},
+            {'$set': data},
+            projection=self.CHAMPS_COMPTES,
+            return_document=ReturnDocument.BEFORE
+        )
+        documents_cache.invalidate(ObjectId(document_id))
+        if avant:
+            await self.compteur_service.mouvement_document(avant, {**avant, **data})
+            await self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return avant
+    
+    async def modifier_exemplaires(self, document_id, data):
+        _id = ObjectId(document_id)
+        data = dict(data)
+        total = Document.nombre_exemplaires(data.pop('exemplaires_total'))
+        actuel = await mongo.db.documents.find_one({'_id': _id}, self.CHAMPS_COMPTES)
+        if not actuel:
+            return None
+        if 'exemplaires_total' not in actuel:
+            raise ValueError("Exemplaires non initialisés : lancer flask migrer-exemplaires")
+        ecart = total - actuel['exemplaires_total']
+        avant = await mongo.db.documents.find_one_and_update(
+            {'_id': _id, 'exemplaires_total': actuel['exemplaires_total'],
+             'exemplaires_disponibles': {'$gte': -ecart}},
+            {'$set': {**data, 'exemplaires_total': total},
+             '$inc': {'exemplaires_disponibles': ecart}},
+            projection=self.CHAMPS_COMPTES,
+            return_document=ReturnDocument.BEFORE
+        )
+        if not avant:
+            raise ValueError(f"Impossible de passer à {total} exemplaires : "
+                             f"{actuel['exemplaires_total'] - actuel['exemplaires_disponibles']} en prêt")
+        disponibles = avant['exemplaires_disponibles'] + ecart
+        await mongo.db.documents.update_one(*alignement_disponible(_id, disponibles))
+        documents_cache.invalidate(_id)
+        await self.compteur_service.mouvement_document(avant, {
+            **avant, **data, 'exemplaires_total': total, 'exemplaires_disponibles': disponibles})
+        await self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return avant
+    
+    async def delete(self, document_id):
+        avant = await mongo.db.documents.find_one_and_delete(
+            {'_id': ObjectId(document_id)},
+            projection=self.CHAMPS_COMPTES
+        )
+        documents_cache.invalidate(ObjectId(document_id))
+        await self.compteur_service.mouvement_document(avant=avant)
+        if avant:
+            await self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return avant
+    
+    async def search(self, query, **pagination):
+        documents = collection(mongo.db, 'documents', ANALYTIQUE)
+        curseur = await documents.aggregate(self._pipeline_recherche(query, **pagination))
+        return await curseur.to_list()
+    
+    async def update_disponibilite(self, document_id, disponible):
+        if disponible:
+            filtre = {'$expr': {'$ne': ['$exemplaires_disponibles', '$exemplaires_total']}}
+        else:
+            filtre = EXEMPLAIRE_DISPONIBLE
+        avant = await mongo.db.documents.find_one_and_update(
+            {'_id': ObjectId(document_id), **filtre},
+            [{'$set': {'exemplaires_disponibles': '$exemplaires_total' if disponible else 0,
+                       'disponible': disponible}}],
+            projection=self.CHAMPS_COMPTES,
+            return_document=ReturnDocument.BEFORE
+        )
+        if avant:
+            documents_cache.invalidate(avant['_id'])
+            disponibles = avant['exemplaires_total'] if disponible else 0
+            await self.compteur_service.mouvement_document(
+                avant, {**avant, 'disponible': disponible, 'exemplaires_disponibles': disponibles})
+            await self.version_service.incrementer('documents')
+            stats_cache.invalidate()
+        return avant
+    
+    async def find_by_type(self, type_doc, **pagination):
+        return await paginer_async(mongo.db.documents, {'type': type_doc}, self.modele, **pagination)
+
+    async def find_by_disponibilite(self, disponible, **pagination):
+        return await paginer_async(mongo.db.documents, {'disponible': disponible}, self.modele, **pagination)
+
+    async def count_total(self):
+        return await mongo.db.documents.count_documents({})
+
+    async def somme_exemplaires(self, champ, expression):
+        compteurs = await self.compteur_service.lire()
+        if compteurs is not None:
+            return compteurs[champ]
+        pipeline = [{'$group': {'_id': None, 'n': {'$sum': expression}}}]
+        resultat = await (await mongo.db.documents.aggregate(pipeline)).to_list()
+        return resultat[0]['n'] if resultat else 0
+
+    async def count_disponibles(self):
+        return await self.somme_exemplaires('documents_disponibles', '$exemplaires_disponibles')
+
+    async def count_empruntes(self):
+        return await self.somme_exemplaires('documents_empruntes', EXEMPLAIRES_EN_PRET)
+
+    async def get_stats(self):
+        curseur = await mongo.db.documents.aggregate(self.pipeline_stats())
+        return stats_facettes(await curseur.next())
+
+    async def get_types(self):
+        return await mongo.db.documents.distinct('type')
\ No newline at end of file
@@ -0,0 +1,269 @@
+import asyncio
+import logging
+from bson import ObjectId
+from datetime import datetime, timedelta
+from functools import partial
+from pymongo import ReturnDocument
+from app.aio import mongo
+from app.aio.transactions import en_parallele, executer_transaction
+from app.aio.services.archive_service import ArchiveService
+from app.aio.services.compteur_service import CompteurService
+from app.aio.services.version_service import VersionService
+from app.aio.services import abonne_service
+from app.aio.services import document_service
+from app.services import emprunt_service
+from app.services.emprunt_service import (COLLECTIONS_MOUVEMENT, EN_COURS, en_retard, ids_joints,
+                                          invalider_entites, joindre, pousser_borne)
+from app.services.document_service import (EXEMPLAIRE_DISPONIBLE, EXEMPLAIRE_EN_PRET,
+                                           RENDRE_EXEMPLAIRE, alignement_disponible,
+                                           compte_facette)
+from app.utils.pagination import paginer_async
+from app.utils.cache import stats_cache
+from app.utils.politiques import ANALYTIQUE, CRITIQUE, collection
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class EmpruntService:
+    CHAMPS_ABONNE = emprunt_service.EmpruntService.CHAMPS_ABONNE
+    CHAMPS_DOCUMENT = emprunt_service.EmpruntService.CHAMPS_DOCUMENT
+    COLONNES_EXPORT = emprunt_service.EmpruntService.COLONNES_EXPORT
+    _pipeline_jointure = emprunt_service.EmpruntService._pipeline_jointure
+    _pipeline_historique = emprunt_service.EmpruntService._pipeline_historique
+    jointures_entites = emprunt_service.EmpruntService.jointures_entites
+
+    def __init__(self):
+        self.duree_emprunt = timedelta(days=14)  # Durée par défaut de 14 jours
+        self.historique_max = Config.HISTORIQUE_EMBARQUE_MAX
+        self.abonne_service = abonne_service.AbonneService()
+        self.document_service = document_service.DocumentService()
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+        self.archive_service = ArchiveService()
+    
+    def critique(self, nom):
+        # Emprunts et retours : primaire, lectures et écritures majoritaires
+        return collection(mongo.db, nom, CRITIQUE)
+    
+    async def creer_emprunt(self, abonne_id, document_id):
+        emprunt_id = ObjectId()
+        date_emprunt = datetime.now()
+        
+        emprunt_data = {
+            '_id': emprunt_id,
+            'abonne_id': ObjectId(abonne_id),
+            'document_id': ObjectId(document_id),
+            'date_emprunt': date_emprunt,
+            'date_retour_prevue': date_emprunt + self.duree_emprunt,
+            'date_retour_effective': None,
+            'statut': 'en_cours'
+        }
+        
+        async def operation(session):
+            # La réservation conditionnelle d'un exemplaire passe en premier :
+            # elle seule décide qui l'obtient, le $inc ne descend jamais sous zéro
+            document = await self.critique('documents').find_one_and_update(
+                {'_id': ObjectId(document_id), **EXEMPLAIRE_DISPONIBLE},
+                {
+                    '$inc': {'exemplaires_disponibles': -1},
+                    '$push': {'emprunts': pousser_borne(str(emprunt_id), self.historique_max)}
+                },
+                projection={'exemplaires_disponibles': 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if not document:
+                raise ValueError("Document non disponible")
+            try:
+                if not document['exemplaires_disponibles']:
+                    # Dernier exemplaire : le titre n'est plus disponible
+                    await self.critique('documents').update_one(
+                        *alignement_disponible(document['_id'], 0), session=session)
+                
+                # L'emprunt et l'abonné ne dépendent que de la réservation
+                _, abonne = await en_parallele(
+                    session,
+                    partial(self.critique('emprunts').insert_one, emprunt_data, session=session),
+                    partial(
+                        self.critique('abonnes').update_one,
+                        {'_id': ObjectId(abonne_id)},
+                        {
+                            '$push': {
+                                'emprunts_actuels': str(emprunt_id),
+                                'historique_emprunts': pousser_borne(str(emprunt_id),
+                                                                     self.historique_max)
+                            }
+                        },
+                        session=session
+                    )
+                )
+                if not abonne.matched_count:
+                    raise ValueError("Abonné non trouvé")
+            except Exception:
+                if session is None:
+                    # Sans transaction, rien n'est annulé : on défait la réservation
+                    await self._annuler_emprunt(emprunt_data)
+                raise
+        
+        try:
+            await executer_transaction(operation)
+        finally:
+            invalider_entites([ObjectId(document_id)], [ObjectId(abonne_id)])
+        
+        await asyncio.gather(
+            self.compteur_service.incrementer({
+                'emprunts_en_cours': 1,
+                'documents_disponibles': -1,
+                'documents_empruntes': 1
+            }),
+            self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        )
+        stats_cache.invalidate()
+        return str(emprunt_id)
+    
+    async def _annuler_emprunt(self, emprunt):
+        # Voir app.services.emprunt_service.EmpruntService._annuler_emprunt
+        await asyncio.gather(
+            self.critique('emprunts').delete_one({'_id': emprunt['_id']}),
+            self.critique('documents').update_one(
+                {'_id': emprunt['document_id'], 'emprunts': str(emprunt['_id'])},
+                {**RENDRE_EXEMPLAIRE, '$pull': {'emprunts': str(emprunt['_id'])}}),
+            self.critique('abonnes').update_one(
+                {'_id': emprunt['abonne_id']},
+                {'$pull': {'emprunts_actuels': str(emprunt['_id']),
+                           'historique_emprunts': str(emprunt['_id'])}})
+        )
+
+    async def enregistrer_retour(self, emprunt_id):
+        async def operation(session):
+            emprunt = await self.critique('emprunts').find_one_and_update(
+                {'_id': ObjectId(emprunt_id), 'statut': {'$ne': 'retourne'}},
+                {
+                    '$set': {
+                        'date_retour_effective': datetime.now(),
+                        'statut': 'retourne'
+                    }
+                },
+                session=session
+            )
+            if not emprunt:
+                if await self.critique('emprunts').find_one({'_id': ObjectId(emprunt_id)}, {'_id': 1},
+                                                    session=session):
+                    raise ValueError("Emprunt déjà retourné")
+                raise ValueError("Emprunt non trouvé")
+            
+            document, _ = await en_parallele(
+                session,
+                partial(
+                    self.critique('documents').update_one,
+                    {'_id': emprunt['document_id'], **EXEMPLAIRE_EN_PRET},
+                    RENDRE_EXEMPLAIRE,
+                    session=session
+                ),
+                partial(
+                    self.critique('abonnes').update_one,
+                    {'_id': emprunt['abonne_id']},
+                    {'$pull': {'emprunts_actuels': str(emprunt_id)}},
+                    session=session
+                )
+            )
+            return document.modified_count, emprunt
+        
+        liberes, emprunt = await executer_transaction(operation)
+        invalider_entites([emprunt['document_id']], [emprunt['abonne_id']])
+        
+        await asyncio.gather(
+            self.compteur_service.incrementer({
+                'emprunts_en_cours': -1,
+                'documents_disponibles': liberes,
+                'documents_empruntes': -liberes
+            }),
+            self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        )
+        stats_cache.invalidate()
+    
+    async def get_emprunts_en_cours(self):
+        return await mongo.db.emprunts.find(EN_COURS).to_list()
+    
+    async def get_emprunts_count(self):
+        return await mongo.db.emprunts.count_documents(EN_COURS)
+    
+    async def get_emprunts_en_retard(self, **pagination):
+        return await paginer_async(mongo.db.emprunts, en_retard(), **pagination)
+    
+    async def get_emprunts_en_retard_count(self):
+        return await collection(mongo.db, 'emprunts', ANALYTIQUE).count_documents(en_retard())
+
+    async def get_stats(self):
+        pipeline = [
+            {'$match': EN_COURS},
+            {'$facet': {
+                'en_cours': [{'$count': 'n'}],
+                'en_retard': [{'$match': en_retard()}, {'$count': 'n'}]
+            }}
+        ]
+        curseur = await mongo.db.emprunts.aggregate(pipeline)
+        facettes = await curseur.next()
+        return {
+            'en_cours': compte_facette(facettes, 'en_cours'),
+            'en_retard': compte_facette(facettes, 'en_retard')
+        }
+
+    async def _joindre_entites(self, emprunts, fields=None):
+        jointures = self.jointures_entites(fields)
+        # Abonnés et documents absents du cache lus en parallèle
+        entites = await asyncio.gather(*(service.find_by_ids(ids_joints(emprunts, alias))
+                                         for alias, service, _ in jointures))
+        for (alias, _, champs), trouvees in zip(jointures, entites):
+            joindre(emprunts, alias, trouvees, champs, fields)
+        return emprunts
+
+    async def get_historique_emprunts_abonne(self, abonne_id, **pagination):
+        try:
+            pipeline = self._pipeline_historique({'abonne_id': ObjectId(abonne_id)},
+                                                 await self.archive_service.partitions(), **pagination)
+            emprunts = await (await collection(mongo.db, 'emprunts', ANALYTIQUE).aggregate(pipeline)).to_list()
+            return await self._joindre_entites(emprunts, pagination.get('fields'))
+        except Exception:
+            logger.exception("Lecture des emprunts impossible")
+            return []
+    
+    async def get_historique_emprunts_document(self, document_id, **pagination):
+        try:
+            pipeline = self._pipeline_historique({'document_id': ObjectId(document_id)},
+                                                 await self.archive_service.partitions(), **pagination)
+            emprunts = await (await collection(mongo.db, 'emprunts', ANALYTIQUE).aggregate(pipeline)).to_list()
+            return await self._joindre_entites(emprunts, pagination.get('fields'))
+        except Exception:
+            logger.exception("Lecture des emprunts impossible")
+            return []
+    
+    async def get_emprunts(self, **pagination):
+        try:
+            return await (await mongo.db.emprunts.aggregate(self._pipeline_jointure(**pagination))).to_list()
+        except Exception:
+            logger.exception("Lecture des emprunts impossible")
+            return []
+
+    async def delete_emprunt(self, emprunt_id):
+        emprunt = await mongo.db.emprunts.find_one({'_id': ObjectId(emprunt_id)})
+        if not emprunt:
+            raise ValueError("Emprunt non trouvé")
+        
+        # Le document, l'abonné et l'emprunt sont indépendants : en parallèle
+        await asyncio.gather(
+            mongo.db.documents.update_one(
+                {'_id': emprunt['document_id']},
+                {'$pull': {'emprunts': str(emprunt_id)}}
+            ),
+            mongo.db.abonnes.update_one(
+                {'_id': emprunt['abonne_id']},
+                {'$pull': {'historique_emprunts': str(emprunt_id)}}
+            ),
+            mongo.db.emprunts.delete_one({'_id': ObjectId(emprunt_id)})
+        )
+        invalider_entites([emprunt['document_id']], [emprunt['abonne_id']])
+        await self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        if emprunt['statut'] != 'retourne':
+            await self.compteur_service.incrementer({'emprunts_en_cours': -1})
+        stats_cache.invalidate()
\ No newline at end of file
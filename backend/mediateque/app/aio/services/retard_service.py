@@ -0,0 +1,11 @@
+from app.aio import mongo
+from app.services.retard_service import ID_BALAYAGE
+
+class RetardService:
+    """Métriques du balayage des retards ; le balayage lui-même tourne hors
+    de l'API (voir app.services.retard_service)."""
+
+    async def lire_metriques(self):
+        metriques = await mongo.db.stats.find_one({'_id': ID_BALAYAGE}, {'_id': 0})
+        return metriques or {'executions': 0, 'marques_total': 0, 'duree_totale_ms': 0,
+                             'dernier': None}
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio
+from app.aio import mongo
+from app.aio.services.compteur_service import CompteurService
+from app.aio.services.document_service import DocumentService
+from app.aio.services.emprunt_service import EmpruntService
+from app.aio.services.version_service import VersionService
+from app.services.stats_service import comparer_compteurs, fraicheur, total_exemplaires
+from app.utils.cache import stats_cache
+
+class StatsService:
+    def __init__(self):
+        self.document_service = DocumentService()
+        self.emprunt_service = EmpruntService()
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+    
+    async def lire_compteurs(self):
+        compteurs = await self.compteur_service.lire()
+        if compteurs is None:
+            compteurs = (await self.reconcilier_compteurs())['compteurs']
+        return compteurs
+    
+    async def calculer_stats(self):
+        # Les compteurs et le comptage des retards partent ensemble
+        compteurs, en_retard = await asyncio.gather(
+            self.lire_compteurs(),
+            self.emprunt_service.get_emprunts_en_retard_count()
+        )
+        return {
+            'empruntsEnCours': compteurs['emprunts_en_cours'],
+            'empruntsEnRetard': en_retard,
+            'totalDocuments': compteurs['documents_total'],
+            'totalExemplaires': total_exemplaires(compteurs),
+            'totalDocumentsDispo': compteurs['documents_disponibles'],
+            'totalDocumentsEmpruntes': compteurs['documents_empruntes'],
+            'totalAbonnes': compteurs['abonnes_total']
+        }
+    
+    async def calculer_stats_documents(self):
+        compteurs = await self.lire_compteurs()
+        return {
+            'total': compteurs['documents_total'],
+            'exemplaires': total_exemplaires(compteurs),
+            'disponibles': compteurs['documents_disponibles'],
+            'empruntes': compteurs['documents_empruntes'],
+            'par_type': compteurs['par_type']
+        }
+    
+    async def get_stats(self):
+        data, horodatage = await stats_cache.get_or_compute_async('dashboard', self.calculer_stats)
+        return {**data, **fraicheur(horodatage)}
+    
+    async def get_stats_documents(self):
+        data, horodatage = await stats_cache.get_or_compute_async('documents',
+                                                                  self.calculer_stats_documents)
+        return {**data, **fraicheur(horodatage)}
+    
+    async def compter_sources(self):
+        # Les trois collections sources sont comptées en parallèle
+        documents, abonnes, emprunts = await asyncio.gather(
+            self.document_service.get_stats(),
+            mongo.db.abonnes.count_documents({}),
+            self.emprunt_service.get_stats()
+        )
+        return {
+            'documents_total': documents['total'],
+            'exemplaires_total': documents['exemplaires'],
+            'documents_disponibles': documents['disponibles'],
+            'documents_empruntes': documents['empruntes'],
+            'abonnes_total': abonnes,
+            'emprunts_en_cours': emprunts['en_cours'],
+            'par_type': documents['par_type']
+        }
+    
+    async def reconcilier_compteurs(self, corriger=True):
+        reels, stockes = await asyncio.gather(self.compter_sources(),
+                                              self.compteur_service.lire())
+        stockes = stockes or {}
+        ecarts = comparer_compteurs(reels, stockes)
+        if corriger and (ecarts or not stockes):
+            await self.compteur_service.remplacer(reels)
+            await self.version_service.incrementer('documents')
+            stats_cache.invalidate()
+        return {'compteurs': reels, 'ecarts': ecarts}
\ No newline at end of file
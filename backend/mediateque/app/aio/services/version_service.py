@@ -0,0 +1,23 @@
+from bson import ObjectId
+from app.aio import mongo
+from app.utils.cache import versions_cache
+from app.utils.versions import ID_VERSIONS
+
+class VersionService:
+    """Versions des collections (voir app.services.version_service), lues
+    et incrémentées sans bloquer."""
+
+    async def incrementer(self, *collections):
+        await mongo.db.stats.update_one(
+            {'_id': ID_VERSIONS},
+            {'$inc': dict.fromkeys(collections, 1),
+             '$setOnInsert': {'epoque': str(ObjectId())}},
+            upsert=True
+        )
+        versions_cache.invalidate()
+
+    async def lire(self):
+        return (await versions_cache.get_or_compute_async('versions', self._charger))[0]
+
+    async def _charger(self):
+        return await mongo.db.stats.find_one({'_id': ID_VERSIONS}) or {}
\ No newline at end of file
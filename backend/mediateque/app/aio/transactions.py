@@ -0,0 +1,30 @@
+import asyncio
+from quart import current_app
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+from app.aio import mongo
+
+
+async def executer_transaction(operation):
+    """Variante asyncio de app.utils.transactions.executer_transaction :
+    operation est une fonction coroutine qui reçoit la session (ou None).
+
+    Les opérations d'une même session ne peuvent pas être concurrentes :
+    dans une transaction, operation enchaîne ses requêtes une à une.
+    """
+    if not current_app.config['MONGO_TRANSACTIONS']:
+        return await operation(None)
+    async with mongo.cx.start_session() as session:
+        return await session.with_transaction(
+            operation,
+            read_concern=ReadConcern('snapshot'),
+            write_concern=WriteConcern('majority')
+        )
+
+async def en_parallele(session, *requetes):
+    """Exécute des requêtes indépendantes (fonctions sans argument renvoyant
+    une coroutine) : ensemble via gather hors transaction, l'une après
+    l'autre dans une transaction."""
+    if session is None:
+        return await asyncio.gather(*(requete() for requete in requetes))
+    return [await requete() for requete in requetes]
\ No newline at end of file
@@ -0,0 +1,24 @@
+import logging
+from functools import wraps
+from quart import make_response, request
+from app.utils.versions import etag, etiqueter, non_modifie
+
+logger = logging.getLogger(__name__)
+
+
+def conditionnel(versions, *collections):
+    """Variante asyncio de app.utils.versions.conditionnel : `versions` est
+    le VersionService de app.aio."""
+    def decorateur(vue):
+        @wraps(vue)
+        async def route(*args, **kwargs):
+            try:
+                tag = etag(await versions.lire(), collections)
+            except Exception:
+                logger.exception("Versions illisibles : réponse sans ETag")
+                return await vue(*args, **kwargs)
+            if request.if_none_match.contains(tag):
+                return non_modifie(tag)
+            return etiqueter(await make_response(await vue(*args, **kwargs)), tag)
+        return route
+    return decorateur
\ No newline at end of file
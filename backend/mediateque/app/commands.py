@@ -0,0 +1,175 @@
+import click
+from pymongo.errors import PyMongoError
+from app import mongo
+from app.indexes import ensure_indexes
+
+
+@click.command('creer-index')
+def creer_index_command():
+    """Applique le registre d'index (app/indexes.py)."""
+    for collection, noms in ensure_indexes(mongo.db).items():
+        click.echo(f"{collection}: {', '.join(noms)}")
+
+
+@click.command('reconcilier-compteurs')
+@click.option('--dry-run', is_flag=True, help="Signale les écarts sans corriger.")
+def reconcilier_compteurs_command(dry_run):
+    """Recalcule les compteurs matérialisés et signale les écarts."""
+    from app.services.stats_service import StatsService
+    resultat = StatsService().reconcilier_compteurs(corriger=not dry_run)
+    if not resultat['ecarts']:
+        click.echo('Aucun écart.')
+    for champ, ecart in resultat['ecarts'].items():
+        click.echo(f"{champ}: stocké {ecart['stocke']}, réel {ecart['reel']}")
+
+
+@click.command('importer-documents')
+@click.argument('fichier', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format_import', type=click.Choice(['csv', 'ndjson']),
+              help="Format du fichier (déduit de l'extension par défaut).")
+@click.option('--taille-lot', type=int, default=None,
+              help='Notices par bulk_write (IMPORT_TAILLE_LOT par défaut).')
+def importer_documents_command(fichier, format_import, taille_lot):
+    """Importe un catalogue CSV ou NDJSON dans la collection documents."""
+    from flask import current_app
+    from app.services.import_service import ImportService
+    format_import = format_import or fichier.rsplit('.', 1)[-1].lower()
+    taille_lot = taille_lot or current_app.config['IMPORT_TAILLE_LOT']
+
+    def progression(rapport):
+        click.echo(f"{rapport['lus']} lues, {rapport['importes']} importées, "
+                   f"{rapport['doublons']} doublons, {rapport['rejets']} rejets "
+                   f"({rapport['lignes_par_seconde']} lignes/s)")
+
+    with open(fichier, encoding='utf-8-sig', newline='') as f:
+        rapport = ImportService().importer(f, format_import, taille_lot, progression)
+    for erreur in rapport['erreurs']:
+        click.echo(f"ligne {erreur['ligne']}: {erreur['error']}", err=True)
+    click.echo(f"Terminé en {rapport['duree']} s.")
+
+
+@click.command('borner-historiques')
+@click.option('--taille', type=int, default=None,
+              help='Emprunts récents conservés (HISTORIQUE_EMBARQUE_MAX par défaut).')
+def borner_historiques_command(taille):
+    """Tronque les historiques d'emprunts embarqués dans abonnes et documents."""
+    from app.services.emprunt_service import EmpruntService
+    for collection, modifies in EmpruntService().borner_historiques(taille).items():
+        click.echo(f"{collection}: {modifies} documents tronqués")
+
+
+@click.command('balayer-retards')
+@click.option('--boucle', is_flag=True,
+              help='Recommence toutes les RETARDS_INTERVALLE_SECONDES secondes.')
+@click.option('--taille-lot', type=int, default=None,
+              help='Emprunts marqués par update_many (RETARDS_TAILLE_LOT par défaut).')
+def balayer_retards_command(boucle, taille_lot):
+    """Passe les emprunts échus au statut 'retarde' et met en file les relances."""
+    import time
+    from flask import current_app
+    from app.services.retard_service import RetardService
+    service = RetardService(taille_lot)
+    while True:
+        try:
+            rapport = service.balayer()
+        except PyMongoError as e:
+            # En boucle, une panne passagère ne doit pas arrêter le worker
+            if not boucle:
+                raise
+            click.echo(f'Balayage échoué : {e}', err=True)
+        else:
+            click.echo(f"{rapport['date'].isoformat()} : {rapport['marques']} emprunts en retard "
+                       f"en {rapport['lots']} lots, {rapport['relances']} abonnés à relancer "
+                       f"({rapport['duree_ms']} ms)")
+        if not boucle:
+            break
+        time.sleep(current_app.config['RETARDS_INTERVALLE_SECONDES'])
+
+
+
+@click.command('migrer-exemplaires')
+def migrer_exemplaires_command():
+    """Initialise exemplaires_total et exemplaires_disponibles des anciens documents."""
+    from app.services.document_service import DocumentService
+    from app.services.stats_service import StatsService
+    migres = DocumentService().migrer_exemplaires()
+    click.echo(f'{migres} documents migrés.')
+    # Ajoute exemplaires_total aux compteurs matérialisés
+    for champ, ecart in StatsService().reconcilier_compteurs()['ecarts'].items():
+        click.echo(f"{champ}: {ecart['stocke']} corrigé en {ecart['reel']}")
+
+
+@click.command('cumuler-emprunts')
+@click.option('--boucle', is_flag=True,
+              help='Recommence toutes les CUMULS_INTERVALLE_SECONDES secondes.')
+def cumuler_emprunts_command(boucle):
+    """Met à jour les cumuls d'emprunts par jour depuis le filigrane."""
+    import time
+    from flask import current_app
+    from app.services.cumul_service import CumulService
+    service = CumulService()
+    while True:
+        try:
+            rapport = service.cumuler()
+        except PyMongoError as e:
+            if not boucle:
+                raise
+            click.echo(f'Cumul échoué : {e}', err=True)
+        else:
+            echo_cumul(rapport)
+        if not boucle:
+            break
+        time.sleep(current_app.config['CUMULS_INTERVALLE_SECONDES'])
+
+
+@click.command('reconstruire-cumuls')
+def reconstruire_cumuls_command():
+    """Recalcule les cumuls d'emprunts sur tout l'historique."""
+    from app.services.cumul_service import CumulService
+    echo_cumul(CumulService().cumuler(reconstruire=True))
+
+
+def echo_cumul(rapport):
+    depuis = rapport['depuis'].date().isoformat() if rapport['depuis'] else "l'origine"
+    click.echo(f"{rapport['filigrane'].isoformat()} : cumuls recalculés depuis {depuis} "
+               f"({rapport['duree_ms']} ms)")
+
+
+@click.command('archiver-emprunts')
+@click.option('--boucle', is_flag=True,
+              help='Recommence toutes les ARCHIVE_INTERVALLE_SECONDES secondes.')
+@click.option('--taille-lot', type=int, default=None,
+              help='Emprunts déplacés par transaction (ARCHIVE_TAILLE_LOT par défaut).')
+def archiver_emprunts_command(boucle, taille_lot):
+    """Déplace les emprunts retournés anciens vers les partitions d'archives."""
+    import time
+    from flask import current_app
+    from app.services.archive_service import ArchiveService
+    service = ArchiveService(taille_lot)
+    while True:
+        try:
+            rapport = service.archiver()
+        except PyMongoError as e:
+            if not boucle:
+                raise
+            click.echo(f'Archivage échoué : {e}', err=True)
+        else:
+            partitions = ', '.join(f'{nom}: {n}' for nom, n in sorted(rapport['par_partition'].items()))
+            click.echo(f"{rapport['date'].isoformat()} : {rapport['archives']} emprunts retournés "
+                       f"avant le {rapport['limite'].date().isoformat()} archivés en {rapport['lots']} lots"
+                       f"{f' ({partitions})' if partitions else ''} ({rapport['duree_ms']} ms)")
+        if not boucle:
+            break
+        time.sleep(current_app.config['ARCHIVE_INTERVALLE_SECONDES'])
+
+
+def register_commands(app):
+    app.cli.add_command(creer_index_command)
+    app.cli.add_command(reconcilier_compteurs_command)
+    app.cli.add_command(importer_documents_command)
+    app.cli.add_command(borner_historiques_command)
+    app.cli.add_command(balayer_retards_command)
+    app.cli.add_command(migrer_exemplaires_command)
+    app.cli.add_command(cumuler_emprunts_command)
+    app.cli.add_command(reconstruire_cumuls_command)
+    app.cli.add_command(archiver_emprunts_command)
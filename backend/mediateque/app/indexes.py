@@ -0,0 +1,100 @@
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+# Codes renvoyés quand un index du même nom existe avec une autre définition
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+# Registre déclaratif des index, par collection. Chaque index est taillé pour
+# une requête des services ; le suffixe _id des index composés sert la
+# pagination par curseur (tri sur _id) sans étape SORT en mémoire.
+INDEXES = {
+    'emprunts': [
+        # RetardService.balayer : emprunts en cours échus. L'index partiel ne
+        # contient que les emprunts en cours, pas l'historique retourné
+        IndexModel(
+            [('statut', ASCENDING), ('date_retour_prevue', ASCENDING)],
+            name='en_cours_date_retour_prevue',
+            partialFilterExpression={'statut': 'en_cours'}
+        ),
+        # get_emprunts_count / get_emprunts_en_retard(_count) : égalité sur le
+        # statut des emprunts non retournés ($in en filtre partiel : MongoDB 6.0+)
+        IndexModel(
+            [('statut', ASCENDING), ('_id', ASCENDING)],
+            name='statut__id',
+            partialFilterExpression={'statut': {'$in': ['en_cours', 'retarde']}}
+        ),
+        # get_historique_emprunts_abonne
+        IndexModel([('abonne_id', ASCENDING), ('_id', ASCENDING)],
+                   name='abonne_id__id'),
+        # CumulService.cumuler : emprunts et retours des jours recalculés
+        IndexModel([('date_emprunt', ASCENDING)], name='date_emprunt'),
+        IndexModel([('date_retour_effective', ASCENDING)], name='date_retour_effective',
+                   partialFilterExpression={'date_retour_effective': {'$type': 'date'}}),
+        # get_historique_emprunts_document : l'historique complet d'un
+        # document, documents.emprunts n'en gardant que les derniers
+        IndexModel([('document_id', ASCENDING), ('_id', ASCENDING)],
+                   name='document_id__id'),
+    ],
+    'documents': [
+        # find_by_type, count_par_type ($group couvert) et get_types (distinct)
+        IndexModel([('type', ASCENDING), ('_id', ASCENDING)], name='type__id'),
+        # find_by_disponibilite (count_disponibles et count_empruntes
+        # somment les exemplaires, sans index utile)
+        IndexModel([('disponible', ASCENDING), ('_id', ASCENDING)],
+                   name='disponible__id'),
+        # ImportService : déduplication des notices par ISBN. Non unique pour
+        # ne pas bloquer le démarrage sur d'anciens doublons
+        IndexModel([('isbn', ASCENDING)], name='isbn',
+                   partialFilterExpression={'isbn': {'$type': 'string'}}),
+        # search : index plein texte en français (racinisation, insensible
+        # à la casse et aux accents), le titre pèse plus que l'auteur
+        IndexModel([('titre', TEXT), ('auteur', TEXT)],
+                   name='recherche_texte',
+                   weights={'titre': 10, 'auteur': 5},
+                   default_language='french'),
+    ],
+    # CumulService : séries temporelles et classement lus par plage de jours
+    'cumuls_jours': [IndexModel([('jour', ASCENDING), ('type', ASCENDING)], name='jour_type')],
+    'cumuls_documents': [IndexModel([('jour', ASCENDING), ('type', ASCENDING)], name='jour_type')],
+    'abonnes': [],
+    'relances': [
+        # RetardService : une seule relance à envoyer par abonné, complétée
+        # à chaque balayage
+        IndexModel([('abonne_id', ASCENDING)], name='abonne_id_a_envoyer', unique=True,
+                   partialFilterExpression={'statut': 'a_envoyer'}),
+    ],
+}
+
+# Partitions d'archives des emprunts (emprunts_archive_<année>), créées par
+# ArchiveService.archiver : les historiques les relisent par abonné et par
+# document
+INDEXES_ARCHIVES = [
+    IndexModel([('abonne_id', ASCENDING), ('_id', ASCENDING)], name='abonne_id__id'),
+    IndexModel([('document_id', ASCENDING), ('_id', ASCENDING)], name='document_id__id'),
+]
+
+
+def ensure_indexes(db):
+    """Crée les index du registre ; idempotent.
+
+    Un index dont la définition a changé dans le registre est supprimé puis
+    recréé. Les index absents du registre ne sont jamais touchés.
+    Renvoie la liste des index créés ou confirmés, par collection.
+    """
+    resultat = {}
+    for nom, indexes in INDEXES.items():
+        if not indexes:
+            continue
+        collection = db[nom]
+        try:
+            resultat[nom] = collection.create_indexes(indexes)
+        except OperationFailure as e:
+            if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+                raise
+            existants = collection.index_information()
+            for index in indexes:
+                if index.document['name'] in existants:
+                    collection.drop_index(index.document['name'])
+            resultat[nom] = collection.create_indexes(indexes)
+    return resultat
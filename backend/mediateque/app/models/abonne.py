@@ -1,15 +1,16 @@
 import datetime
+from app.models.enregistrement import Enregistrement
 
 
-class Abonne:
-    def __init__(self):
-        self.schema = {
-            'nom': str,
-            'prenom': str,
-            'email': str,
-            'adresse': str,
-            'telephone': str,
-            'date_inscription': datetime,
-            'emprunts_actuels': list,
-            'historique_emprunts': list
-        }
\ No newline at end of file
+class Abonne(Enregistrement):
+    SCHEMA = {
+        'nom': str,
+        'prenom': str,
+        'email': str,
+        'adresse': str,
+        'telephone': str,
+        'date_inscription': datetime.datetime,
+        'emprunts_actuels': list,
+        'historique_emprunts': list
+    }
+    __slots__ = ('_id', *SCHEMA)
\ No newline at end of file
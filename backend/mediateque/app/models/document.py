@@ -1,14 +1,63 @@
 import datetime
+from app.models.enregistrement import Enregistrement
 
 
-class Document:
-    def __init__(self):
-        self.schema = {
-            'titre': str,
-            'auteur': str,
-            'type': str,
-            'isbn': str,
-            'date_publication': datetime,
-            'disponible': bool,
-            'emprunts': list
-        }
\ No newline at end of file
+class Document(Enregistrement):
+    CHAMPS_REQUIS = ['titre', 'auteur', 'type']
+    # Renseignés par DocumentService, jamais lus d'un enregistrement externe
+    CHAMPS_GERES = ('disponible', 'exemplaires_disponibles', 'emprunts', 'date_ajout')
+    SCHEMA = {
+        'titre': str,
+        'auteur': str,
+        'type': str,
+        'isbn': str,
+        'date_publication': datetime.datetime,
+        # Exemplaires physiques du titre ; disponible vaut
+        # exemplaires_disponibles > 0
+        'exemplaires_total': int,
+        'exemplaires_disponibles': int,
+        'disponible': bool,
+        'emprunts': list,
+        'date_ajout': datetime.datetime
+    }
+    __slots__ = ('_id', *SCHEMA)
+
+    @classmethod
+    def valider(cls, data):
+        """Vérifie un enregistrement externe et le convertit selon le schéma.
+
+        Les champs inconnus du schéma sont ignorés, de même que ceux que
+        DocumentService renseigne lui-même (disponibilité, emprunts, date_ajout).
+        Lève ValueError si un champ requis manque ou ne peut être converti.
+        """
+        manquants = [c for c in cls.CHAMPS_REQUIS if not str(data.get(c) or '').strip()]
+        if manquants:
+            raise ValueError(f"Champs requis manquants : {', '.join(manquants)}")
+        document = {}
+        for champ, type_champ in cls.SCHEMA.items():
+            valeur = data.get(champ)
+            if champ in cls.CHAMPS_GERES or valeur in (None, ''):
+                continue
+            if type_champ is str:
+                document[champ] = str(valeur).strip()
+            elif type_champ is datetime.datetime and not isinstance(valeur, datetime.datetime):
+                try:
+                    document[champ] = datetime.datetime.fromisoformat(str(valeur))
+                except ValueError:
+                    raise ValueError(f"Date invalide pour {champ} : {valeur}")
+            elif type_champ is int:
+                document[champ] = cls.nombre_exemplaires(valeur)
+            else:
+                document[champ] = valeur
+        return document
+
+    @staticmethod
+    def nombre_exemplaires(valeur):
+        """Nombre d'exemplaires d'un titre : entier strictement positif."""
+        try:
+            nombre = int(valeur)
+        except (TypeError, ValueError):
+            nombre = 0
+        if isinstance(valeur, bool) or nombre < 1 or nombre != float(valeur):
+            raise ValueError(f"Nombre d'exemplaires invalide : {valeur}")
+        return nombre
\ No newline at end of file
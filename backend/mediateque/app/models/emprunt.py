@@ -1,14 +1,15 @@
 import datetime
 from bson import ObjectId
+from app.models.enregistrement import Enregistrement
 
 
-class Emprunt:
-    def __init__(self):
-        self.schema = {
-            'abonne_id': ObjectId,
-            'document_id': ObjectId,
-            'date_emprunt': datetime.datetime,  # ISO format: "YYYY-MM-DDTHH:MM:SS.mmmZ"
-            'date_retour_prevue': datetime.datetime,  # ISO format: "YYYY-MM-DDTHH:MM:SS.mmmZ"
-            'date_retour_effective': datetime.datetime,  # ISO format: "YYYY-MM-DDTHH:MM:SS.mmmZ"
-            'statut': str  # 'en_cours', 'retarde', 'termine'
-        }
\ No newline at end of file
+class Emprunt(Enregistrement):
+    SCHEMA = {
+        'abonne_id': ObjectId,
+        'document_id': ObjectId,
+        'date_emprunt': datetime.datetime,  # ISO format: "YYYY-MM-DDTHH:MM:SS.mmmZ"
+        'date_retour_prevue': datetime.datetime,  # ISO format: "YYYY-MM-DDTHH:MM:SS.mmmZ"
+        'date_retour_effective': datetime.datetime,  # ISO format: "YYYY-MM-DDTHH:MM:SS.mmmZ"
+        'statut': str  # 'en_cours', 'retarde' (échu, voir RetardService), 'retourne'
+    }
+    __slots__ = ('_id', *SCHEMA)
\ No newline at end of file
@@ -0,0 +1,84 @@
+from bson import decode
+from bson.raw_bson import DEFAULT_RAW_BSON_OPTIONS, RawBSONDocument, _inflate_bson
+
+# Options de lecture en RawBSONDocument : le pilote garde les octets reçus
+# du serveur, les champs sont décodés par Enregistrement.depuis_bson
+OPTIONS_BRUTES = DEFAULT_RAW_BSON_OPTIONS
+ABSENT = object()
+
+
+class Enregistrement:
+    """Base des modèles : un attribut par champ du schéma (__slots__), sans
+    dictionnaire par instance. Les champs absents du document restent non
+    définis et ne sont pas sérialisés.
+
+    Les sous-classes déclarent SCHEMA (champ -> type) et
+    __slots__ = ('_id', *SCHEMA).
+    """
+    __slots__ = ()
+    SCHEMA = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.CHAMPS = tuple(cls.__slots__)
+        cls.NOMS = frozenset(cls.CHAMPS)
+        cls.TABLEAUX = frozenset(c for c, t in cls.SCHEMA.items() if t is list)
+
+    def __init__(self, **valeurs):
+        for champ, valeur in valeurs.items():
+            setattr(self, champ, valeur)
+
+    @classmethod
+    def depuis_bson(cls, brut, champs=None):
+        """Décode un RawBSONDocument (ou ses octets) en enregistrement.
+
+        Seuls les champs de `champs` connus du modèle (par défaut tous ceux
+        du modèle) sont lus : les tableaux et sous-documents des autres
+        champs restent des octets et ne sont jamais décodés.
+        """
+        if isinstance(brut, RawBSONDocument):
+            brut = brut.raw
+        enregistrement = cls.__new__(cls)
+        if champs is None:
+            # Document entier : un seul décodage en C, sans copie par champ
+            for champ, valeur in decode(brut).items():
+                if champ in cls.NOMS:
+                    setattr(enregistrement, champ, valeur)
+            return enregistrement
+        # Premier niveau décodé en C, tableaux et sous-documents laissés bruts
+        valeurs = _inflate_bson(brut, OPTIONS_BRUTES, raw_array=True)
+        for champ in champs:
+            valeur = valeurs.get(champ, ABSENT)
+            if valeur is ABSENT or champ not in cls.NOMS:
+                continue
+            if isinstance(valeur, RawBSONDocument):
+                valeur = decode(valeur.raw)
+            elif champ in cls.TABLEAUX and isinstance(valeur, bytes):
+                valeur = list(decode(valeur).values())
+            setattr(enregistrement, champ, valeur)
+        return enregistrement
+
+    def vers_dict(self):
+        valeurs = {}
+        for champ in self.CHAMPS:
+            valeur = getattr(self, champ, ABSENT)
+            if valeur is not ABSENT:
+                valeurs[champ] = valeur
+        return valeurs
+
+    def get(self, champ, defaut=None):
+        return getattr(self, champ, defaut) if champ in self.NOMS else defaut
+
+    def __getitem__(self, champ):
+        valeur = self.get(champ, ABSENT)
+        if valeur is ABSENT:
+            raise KeyError(champ)
+        return valeur
+
+    def __eq__(self, autre):
+        if type(autre) is not type(self):
+            return NotImplemented
+        return self.vers_dict() == autre.vers_dict()
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.vers_dict()!r})'
\ No newline at end of file
@@ -1,15 +1,24 @@
 from flask import Blueprint, request, jsonify
 from app.services.abonne_service import AbonneService
+from app.services.version_service import VersionService
 from bson import ObjectId
+from app.utils.pagination import parse_pagination, reponse_paginee
+from app.utils.export import parse_format, reponse_export
+from app.utils.versions import conditionnel
 
 bp = Blueprint('abonnes', __name__)
 service = AbonneService()
+versions = VersionService()
 
 @bp.route('/abonnes', methods=['GET'])
+@conditionnel(versions, 'abonnes')
 def get_abonnes():
     try:
-        abonnes = service.find_all()
-        return jsonify([{**abonne, '_id': str(abonne['_id'])} for abonne in abonnes])
+        pagination = parse_pagination()
+        abonnes = service.find_all(**pagination)
+        return reponse_paginee(abonnes, pagination)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -18,7 +27,7 @@ def get_abonne(id):
     try:
         abonne = service.find_by_id(id)
         if abonne:
-            return jsonify({**abonne, '_id': str(abonne['_id'])})
+            return jsonify(abonne)
         return jsonify({'error': 'Abonné non trouvé'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -46,5 +55,17 @@ def delete_abonne(id):
     try:
         service.delete(id)
         return jsonify({'message': 'Abonné supprimé'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/abonnes/export', methods=['GET'])
+def export_abonnes():
+    try:
+        format_export = parse_format()
+        colonnes = service.COLONNES_EXPORT if format_export == 'csv' else None
+        return reponse_export(service.curseur_export(colonnes=colonnes), format_export,
+                              service.COLONNES_EXPORT, 'abonnes', service.modele)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,27 +1,43 @@
-from flask import Blueprint, request, jsonify
+import io
+from flask import Blueprint, current_app, request, jsonify
 from app.services.document_service import DocumentService
+from app.services.stats_service import StatsService
+from app.services.import_service import FORMATS_IMPORT, ImportService
+from app.services.version_service import VersionService
 from bson import ObjectId
+from app.utils.pagination import encoder_curseur_score, parse_pagination, reponse_paginee
+from app.utils.export import parse_format, reponse_export
+from app.utils.versions import conditionnel
 
 bp = Blueprint('documents', __name__)
 service = DocumentService()
+stats_service = StatsService()
+import_service = ImportService()
+versions = VersionService()
 
 @bp.route('/documents', methods=['GET'])
+@conditionnel(versions, 'documents')
 def get_documents():
     try:
         search_query = request.args.get('search')
         type_doc = request.args.get('type')  # Pour filtrer par type
         disponible = request.args.get('disponible')  # Pour filtrer par disponibilité
+        pagination = parse_pagination(par_score=bool(search_query))
         
         if search_query:
-            documents = service.search(search_query)
+            # Résultats classés par pertinence, paginés sur (score, _id)
+            documents = service.search(search_query, **pagination)
+            return reponse_paginee(documents, pagination, encoder_curseur_score)
         elif type_doc:
-            documents = service.find_by_type(type_doc)
+            documents = service.find_by_type(type_doc, **pagination)
         elif disponible:
-            documents = service.find_by_disponibilite(disponible.lower() == 'true')
+            documents = service.find_by_disponibilite(disponible.lower() == 'true', **pagination)
         else:
-            documents = service.find_all()
+            documents = service.find_all(**pagination)
             
-        return jsonify([{**doc, '_id': str(doc['_id'])} for doc in documents])
+        return reponse_paginee(documents, pagination)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -30,7 +46,7 @@ def get_document(id):
     try:
         document = service.find_by_id(id)
         if document:
-            return jsonify({**document, '_id': str(document['_id'])})
+            return jsonify(document)
         return jsonify({'error': 'Document non trouvé'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -53,6 +69,24 @@ def create_document():
             'message': 'Document créé avec succès',
             'id': str(doc_id)
         }), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/import', methods=['POST'])
+def import_documents():
+    try:
+        fichier = request.files.get('fichier')
+        if fichier is None:
+            return jsonify({'error': 'Le fichier (champ fichier) est requis'}), 400
+        format_import = request.args.get('format') or fichier.filename.rsplit('.', 1)[-1].lower()
+        if format_import not in FORMATS_IMPORT:
+            return jsonify({'error': f"Format d'import inconnu : {format_import}"}), 400
+        texte = io.TextIOWrapper(fichier.stream, encoding='utf-8-sig', newline='')
+        rapport = import_service.importer(texte, format_import,
+                                          current_app.config['IMPORT_TAILLE_LOT'])
+        return jsonify(rapport), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -62,6 +96,8 @@ def update_document(id):
         data = request.get_json()
         service.update(id, data)
         return jsonify({'message': 'Document mis à jour avec succès'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -86,20 +122,29 @@ def update_disponibilite(id):
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/documents/stats', methods=['GET'])
+@conditionnel(versions, 'documents')
 def get_stats():
     try:
-        return jsonify({
-            'total': service.count_total(),
-            'disponibles': service.count_disponibles(),
-            'empruntes': service.count_empruntes(),
-            'par_type': service.count_par_type()
-        })
+        return jsonify(stats_service.get_stats_documents())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/documents/types', methods=['GET'])
+@conditionnel(versions, 'documents')
 def get_types():
     try:
         return jsonify(service.get_types())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/documents/export', methods=['GET'])
+def export_documents():
+    try:
+        format_export = parse_format()
+        colonnes = service.COLONNES_EXPORT if format_export == 'csv' else None
+        return reponse_export(service.curseur_export(colonnes=colonnes), format_export,
+                              service.COLONNES_EXPORT, 'documents', service.modele)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,14 +1,23 @@
 from flask import Blueprint, request, jsonify
 from app.services.emprunt_service import EmpruntService
+from app.services.archive_service import ArchiveService
+from app.services.retard_service import RetardService
+from app.utils.pagination import parse_pagination, reponse_paginee
+from app.utils.export import parse_format, reponse_export
 
 bp = Blueprint('emprunts', __name__)
 service = EmpruntService()
+retards = RetardService()
+archives = ArchiveService()
 
 @bp.route('/emprunts', methods=['GET'])
 def get_emprunts():
     try:
-        emprunts = service.get_emprunts()
-        return jsonify([{**e, '_id': str(e['_id'])} for e in emprunts])
+        pagination = parse_pagination()
+        emprunts = service.get_emprunts(**pagination)
+        return reponse_paginee(emprunts, pagination)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -27,27 +36,94 @@ def creer_emprunt():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/emprunts/bulk', methods=['POST'])
+def creer_emprunts_bulk():
+    try:
+        data = request.get_json()
+        demandes = data.get('emprunts') if isinstance(data, dict) else None
+        if not isinstance(demandes, list):
+            return jsonify({'error': 'Le champ emprunts (liste) est requis'}), 400
+        resultats = service.creer_emprunts_bulk(demandes)
+        return jsonify({
+            'resultats': resultats,
+            'crees': sum(r['statut'] == 'cree' for r in resultats)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/emprunts/retours/bulk', methods=['POST'])
+def enregistrer_retours_bulk():
+    try:
+        data = request.get_json()
+        ids = data.get('ids') if isinstance(data, dict) else None
+        if not isinstance(ids, list):
+            return jsonify({'error': 'Le champ ids (liste) est requis'}), 400
+        resultats = service.enregistrer_retours_bulk(ids)
+        return jsonify({
+            'resultats': resultats,
+            'retournes': sum(r['statut'] == 'retourne' for r in resultats)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/emprunts/<id>/retour', methods=['POST'])
 def enregistrer_retour(id):
     try:
         service.enregistrer_retour(id)
         return jsonify({'message': 'Retour enregistré'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/emprunts/en-retard', methods=['GET'])
 def get_retards():
     try:
-        retards = service.get_emprunts_en_retard()
-        return jsonify([{**r, '_id': str(r['_id'])} for r in retards])
+        pagination = parse_pagination()
+        retards = service.get_emprunts_en_retard(**pagination)
+        return reponse_paginee(retards, pagination)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/en-retard/balayage', methods=['GET'])
+def get_balayage_retards():
+    try:
+        return jsonify(retards.lire_metriques()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/archivage', methods=['GET'])
+def get_archivage():
+    try:
+        return jsonify(archives.lire_metriques()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 @bp.route('/emprunts/abonne/<id>', methods=['GET'])
 def get_emprunts_abonne(id):
     try:
-        emprunts = service.get_historique_emprunts_abonne(id)
-        return jsonify([{**e, '_id': str(e['_id'])} for e in emprunts])
+        pagination = parse_pagination()
+        emprunts = service.get_historique_emprunts_abonne(id, **pagination)
+        return reponse_paginee(emprunts, pagination)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+@bp.route('/emprunts/document/<id>', methods=['GET'])
+def get_emprunts_document(id):
+    try:
+        pagination = parse_pagination()
+        emprunts = service.get_historique_emprunts_document(id, **pagination)
+        return reponse_paginee(emprunts, pagination)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -56,5 +132,16 @@ def delete_emprunt(id):
     try:
         service.delete_emprunt(id)
         return jsonify({'message': 'Emprunt supprimé'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/emprunts/export', methods=['GET'])
+def export_emprunts():
+    try:
+        format_export = parse_format()
+        return reponse_export(service.curseur_export(), format_export,
+                              service.COLONNES_EXPORT, 'emprunts')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response, jsonify
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.utils.metriques import exposer
+
+bp = Blueprint('metriques', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    try:
+        return Response(exposer(), content_type=CONTENT_TYPE_LATEST)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from app.services.cumul_service import CumulService, lire_granularite, lire_limite, lire_periode
 from app.services.stats_service import StatsService
+from app.utils.changements import Cadence, ecouteur, format_sse
 
 bp = Blueprint('stats', __name__)
 service = StatsService()
+cumuls = CumulService()
 
 @bp.route('/stats', methods=['GET'])
 def get_stats():
@@ -10,4 +13,63 @@ def get_stats():
         stats = service.get_stats()
         return jsonify(stats), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/timeseries', methods=['GET'])
+def get_timeseries():
+    # Emprunts, retours et retards par jour, semaine ou mois, lus dans les
+    # cumuls (commande cumuler-emprunts), jamais dans la collection emprunts
+    try:
+        granularite = lire_granularite(request.args)
+        series = cumuls.get_series(granularite=granularite, **lire_periode(request.args))
+        return jsonify(series), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/top-documents', methods=['GET'])
+def get_top_documents():
+    try:
+        limite = lire_limite(request.args)
+        top = cumuls.get_top_documents(limite=limite, **lire_periode(request.args))
+        return jsonify(top), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/flux', methods=['GET'])
+def get_flux():
+    # Server-Sent Events : statistiques et disponibilités poussées au client
+    # au lieu d'être relues à intervalle fixe. Chaque connexion occupe un
+    # thread du worker : elle est fermée après FLUX_DUREE_THREAD_SECONDES,
+    # et au-delà de FLUX_CONNEXIONS_THREAD flux ouverts dans le worker, le
+    # client ne reçoit que les statistiques et se reconnecte plus tard
+    # (Last-Event-ID inchangé : aucun événement perdu)
+    config = current_app.config
+    cadence = Cadence(config, config['FLUX_DUREE_THREAD_SECONDES'])
+    dumps = current_app.json.dumps
+    abonnement = ecouteur.abonner(request.headers.get('Last-Event-ID'),
+                                  limite=config['FLUX_CONNEXIONS_THREAD'])
+
+    def generer():
+        yield cadence.entete()
+        if abonnement is None:
+            try:
+                yield format_sse({'type': 'stats', 'data': service.get_stats()}, dumps)
+            except Exception as e:
+                yield format_sse({'type': 'erreur', 'data': {'error': str(e)}}, dumps)
+            return
+        try:
+            while not cadence.terminee():
+                if cadence.stats_dues():
+                    yield format_sse({'type': 'stats', 'data': service.get_stats()}, dumps)
+                yield from cadence.recevoir(abonnement.attendre(cadence.delai()), dumps)
+        except Exception as e:
+            yield format_sse({'type': 'erreur', 'data': {'error': str(e)}}, dumps)
+        finally:
+            ecouteur.desabonner(abonnement)
+
+    return Response(stream_with_context(generer()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
\ No newline at end of file
@@ -1,29 +1,74 @@
 from bson import ObjectId
 from datetime import datetime
 from app import mongo
+from app.models.abonne import Abonne
+from app.utils.pagination import paginer, requete_paginee
+from app.utils.export import TAILLE_LOT
+from app.utils.cache import abonnes_cache, stats_cache
+from app.utils.politiques import ANALYTIQUE, collection
+from app.services.compteur_service import CompteurService
+from app.services.version_service import VersionService
+from config import Config
 
 class AbonneService:
+    COLONNES_EXPORT = ['_id', 'nom', 'prenom', 'email', 'telephone',
+                       'adresse', 'date_inscription']
+
+    def __init__(self):
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+        # Listes et exports en enregistrements décodés du BSON brut
+        self.modele = Abonne if Config.LECTURE_BSON_BRUTE else None
+
     def create(self, abonne_data):
         abonne_data['date_inscription'] = datetime.now()
         abonne_data['emprunts_actuels'] = []
         abonne_data['historique_emprunts'] = []
         result = mongo.db.abonnes.insert_one(abonne_data)
+        self.compteur_service.incrementer({'abonnes_total': 1})
+        self.version_service.incrementer('abonnes')
+        stats_cache.invalidate()
         return str(result.inserted_id)
     
-    def find_all(self):
-        return list(mongo.db.abonnes.find())
+    def find_all(self, **pagination):
+        return paginer(mongo.db.abonnes, modele=self.modele, **pagination)
+    
+    def curseur_export(self, batch_size=TAILLE_LOT, colonnes=None):
+        # colonnes : projection côté serveur (export CSV)
+        curseur = requete_paginee(collection(mongo.db, 'abonnes', ANALYTIQUE),
+                                  fields=colonnes, modele=self.modele)
+        return curseur.batch_size(batch_size)
     
     def find_by_id(self, abonne_id):
-        return mongo.db.abonnes.find_one({'_id': ObjectId(abonne_id)})
+        _id = ObjectId(abonne_id)
+        return self.find_by_ids([_id]).get(_id)
+    
+    def find_by_ids(self, abonne_ids):
+        """Abonnés par _id (dictionnaire), servis depuis le cache d'entités ;
+        les absents sont lus en un seul find $in."""
+        return abonnes_cache.trouver(
+            [ObjectId(i) for i in abonne_ids],
+            lambda ids: mongo.db.abonnes.find({'_id': {'$in': ids}})
+        )
     
     def update(self, abonne_id, data):
-        return mongo.db.abonnes.update_one(
+        result = mongo.db.abonnes.update_one(
             {'_id': ObjectId(abonne_id)},
             {'$set': data}
         )
+        abonnes_cache.invalidate(ObjectId(abonne_id))
+        if result.matched_count:
+            self.version_service.incrementer('abonnes')
+        return result
     
     def delete(self, abonne_id):
-        return mongo.db.abonnes.delete_one({'_id': ObjectId(abonne_id)})
+        result = mongo.db.abonnes.delete_one({'_id': ObjectId(abonne_id)})
+        abonnes_cache.invalidate(ObjectId(abonne_id))
+        self.compteur_service.incrementer({'abonnes_total': -result.deleted_count})
+        if result.deleted_count:
+            self.version_service.incrementer('abonnes')
+        stats_cache.invalidate()
+        return result
     
     def get_emprunts_actuels(self, abonne_id):
         abonne = self.find_by_id(abonne_id)
@@ -0,0 +1,137 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne
+from app import mongo
+from app.indexes import INDEXES_ARCHIVES
+from app.services.compteur_service import CompteurService
+from app.services.cumul_service import ID_CUMULS, jour
+from app.services.version_service import VersionService
+from app.utils.archives import ID_ARCHIVAGE, PREFIXE_ARCHIVES, nom_partition, partitions
+from app.utils.cache import archives_cache
+from app.utils.politiques import ANALYTIQUE, collection
+from app.utils.transactions import executer_transaction
+from config import Config
+
+def a_archiver(limite):
+    # $type repris du filtre partiel de l'index date_retour_effective
+    return {'statut': 'retourne', 'date_retour_effective': {'$type': 'date', '$lt': limite}}
+
+def metriques(total, en_cours, stockage, etat, archives):
+    return {
+        'chaud': {
+            'emprunts': total,
+            'en_cours': en_cours,
+            'retournes': total - en_cours,
+            'octets': stockage.get('size', 0),
+            'octets_index': stockage.get('totalIndexSize', 0)
+        },
+        'archives': archives,
+        'archives_total': sum(archives.values()),
+        'executions': etat.get('executions', 0),
+        'dernier': etat.get('dernier')
+    }
+
+class ArchiveService:
+    """Déplacement des emprunts retournés anciens vers les archives.
+
+    La collection emprunts ne garde que les emprunts en cours et ceux
+    retournés depuis moins de ARCHIVE_AGE_JOURS : sa taille, ses index et
+    les parcours des emprunts en cours ne dépendent plus de l'historique.
+    Les plus anciens sont déplacés par lots de ARCHIVE_TAILLE_LOT vers une
+    collection par année d'emprunt, chaque lot copié puis supprimé dans
+    une transaction (ré-exécutable sans doublon sans transactions : la
+    copie est un upsert par _id). Les historiques d'un abonné ou d'un
+    document relisent les archives par $unionWith.
+    """
+
+    def __init__(self, taille_lot=None):
+        self.age = timedelta(days=Config.ARCHIVE_AGE_JOURS)
+        self.taille_lot = taille_lot or Config.ARCHIVE_TAILLE_LOT
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+
+    def limite(self, maintenant):
+        """Date de retour avant laquelle un emprunt est archivé. Les jours
+        que les cumuls recalculeront encore restent dans emprunts."""
+        limite = maintenant - self.age
+        cumuls = mongo.db.stats.find_one({'_id': ID_CUMULS}, {'filigrane': 1})
+        if cumuls and cumuls.get('filigrane'):
+            limite = min(limite, jour(cumuls['filigrane']))
+        return limite
+
+    def archiver(self, maintenant=None):
+        """Archive les emprunts retournés avant la limite et renvoie le
+        rapport, également enregistré dans la collection stats."""
+        maintenant = maintenant or datetime.now()
+        limite = self.limite(maintenant)
+        debut = time.perf_counter()
+        lots, par_partition = [], defaultdict(int)
+        while True:
+            emprunts = list(mongo.db.emprunts.find(a_archiver(limite)).limit(self.taille_lot))
+            if not emprunts:
+                break
+            lot = defaultdict(list)
+            for emprunt in emprunts:
+                lot[nom_partition(emprunt['date_emprunt'])].append(emprunt)
+            for nom in lot:
+                mongo.db[nom].create_indexes(INDEXES_ARCHIVES)
+            lots.append(executer_transaction(lambda session: self.deplacer(lot, session)))
+            for nom, archives in lot.items():
+                par_partition[nom] += len(archives)
+            if len(emprunts) < self.taille_lot:
+                break
+
+        rapport = {
+            'date': maintenant,
+            'limite': limite,
+            'duree_ms': round((time.perf_counter() - debut) * 1000, 1),
+            'lots': len(lots),
+            'archives': sum(lots),
+            'par_partition': dict(par_partition)
+        }
+        modification = {
+            '$set': {'dernier': rapport},
+            '$inc': {'executions': 1, 'archives_total': rapport['archives']}
+        }
+        if par_partition:
+            premiere = min(int(nom[len(PREFIXE_ARCHIVES):]) for nom in par_partition)
+            modification['$min'] = {'premiere_annee': premiere}
+        mongo.db.stats.update_one({'_id': ID_ARCHIVAGE}, modification, upsert=True)
+        if rapport['archives']:
+            archives_cache.invalidate()
+            self.version_service.incrementer('emprunts')
+        return rapport
+
+    def deplacer(self, lot, session):
+        # Copie puis suppression ; la condition sur le statut garde dans
+        # emprunts un emprunt modifié depuis la lecture du lot
+        for nom, emprunts in lot.items():
+            mongo.db[nom].bulk_write([ReplaceOne({'_id': e['_id']}, e, upsert=True)
+                                      for e in emprunts], ordered=False, session=session)
+        ids = [e['_id'] for archives in lot.values() for e in archives]
+        return mongo.db.emprunts.delete_many({'_id': {'$in': ids}, 'statut': 'retourne'},
+                                             session=session).deleted_count
+
+    def partitions(self):
+        """Partitions à relire pour un historique ; la première année est
+        servie par archives_cache."""
+        premiere = archives_cache.get_or_compute('premiere_annee', self._premiere_annee)[0]
+        return partitions(premiere)
+
+    def _premiere_annee(self):
+        etat = mongo.db.stats.find_one({'_id': ID_ARCHIVAGE}, {'premiere_annee': 1})
+        return etat.get('premiere_annee') if etat else None
+
+    def lire_metriques(self):
+        """Taille de l'ensemble chaud (collection emprunts) et des archives,
+        avec le dernier rapport d'archivage."""
+        emprunts = collection(mongo.db, 'emprunts', ANALYTIQUE)
+        stockage = next(emprunts.aggregate([{'$collStats': {'storageStats': {}}}]))['storageStats']
+        compteurs = self.compteur_service.lire(ANALYTIQUE) or {}
+        etat = mongo.db.stats.find_one({'_id': ID_ARCHIVAGE}, {'_id': 0}) or {}
+        return metriques(emprunts.estimated_document_count(), compteurs.get('emprunts_en_cours', 0),
+                         stockage, etat, {
+                             nom: mongo.db[nom].estimated_document_count()
+                             for nom in partitions(etat.get('premiere_annee'))
+                         })
\ No newline at end of file
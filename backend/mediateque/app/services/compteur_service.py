@@ -0,0 +1,77 @@
+from collections import Counter
+from app import mongo
+from app.utils.politiques import collection
+
+# Document unique de la collection stats portant les compteurs matérialisés
+ID_COMPTEURS = 'compteurs'
+CHAMPS_COMPTEURS = ['documents_total', 'exemplaires_total', 'documents_disponibles',
+                    'documents_empruntes', 'abonnes_total', 'emprunts_en_cours']
+
+def echapper_type(type_doc):
+    # '.' et '$' sont interdits dans un chemin $inc : codage façon URL
+    return str(type_doc).replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+def restaurer_type(cle):
+    return cle.replace('%24', '$').replace('%2E', '.').replace('%25', '%')
+
+def exemplaires(document):
+    """(exemplaires possédés, exemplaires disponibles) d'un document ; un
+    document antérieur à la migration compte un exemplaire, selon disponible."""
+    if 'exemplaires_total' not in document:
+        return 1, int(bool(document.get('disponible')))
+    return document['exemplaires_total'], document.get('exemplaires_disponibles', 0)
+
+def deltas_mouvement(avant=None, apres=None):
+    # documents_* compte les titres ; documents_disponibles et
+    # documents_empruntes comptent les exemplaires
+    deltas = Counter()
+    for document, signe in ((avant, -1), (apres, 1)):
+        if not document:
+            continue
+        total, disponibles = exemplaires(document)
+        deltas['documents_total'] += signe
+        deltas['exemplaires_total'] += signe * total
+        deltas['documents_disponibles'] += signe * disponibles
+        deltas['documents_empruntes'] += signe * (total - disponibles)
+        if document.get('type') is not None:
+            deltas[f"par_type.{echapper_type(document['type'])}"] += signe
+    return deltas
+
+def normaliser(compteurs):
+    # Un document incomplet (compteurs ajoutés depuis) est à recalculer ;
+    # les types dont le compteur est retombé à zéro ne sont pas renvoyés
+    if compteurs is None or any(champ not in compteurs for champ in CHAMPS_COMPTEURS):
+        return None
+    compteurs['par_type'] = {restaurer_type(t): n for t, n in compteurs.get('par_type', {}).items() if n}
+    return compteurs
+
+def document_compteurs(compteurs):
+    par_type = {echapper_type(t): n for t, n in compteurs.get('par_type', {}).items()}
+    return {**compteurs, '_id': ID_COMPTEURS, 'par_type': par_type}
+
+class CompteurService:
+    """Compteurs du tableau de bord tenus à jour par $inc sur les écritures.
+
+    La lecture coûte un find_one par _id, quelle que soit la taille des
+    collections. StatsService.reconcilier_compteurs les recalcule depuis les
+    collections sources et signale les écarts ; tant qu'il n'a pas créé le
+    document, les $inc sont sans effet et la première lecture l'initialise.
+    """
+
+    def incrementer(self, deltas):
+        inc = {champ: n for champ, n in deltas.items() if n}
+        if inc:
+            # Sans upsert : un document partiel partirait de 0, pas des totaux
+            mongo.db.stats.update_one({'_id': ID_COMPTEURS}, {'$inc': inc})
+
+    def mouvement_document(self, avant=None, apres=None):
+        """Répercute l'insertion (apres), la suppression (avant) ou la
+        modification (avant et apres) d'un document du catalogue."""
+        self.incrementer(deltas_mouvement(avant, apres))
+
+    def lire(self, politique=None):
+        stats = collection(mongo.db, 'stats', politique)
+        return normaliser(stats.find_one({'_id': ID_COMPTEURS}))
+
+    def remplacer(self, compteurs):
+        mongo.db.stats.replace_one({'_id': ID_COMPTEURS}, document_compteurs(compteurs), upsert=True)
@@ -0,0 +1,237 @@
+import time
+from datetime import datetime, timedelta
+from app import mongo
+from app.services.document_service import DocumentService
+from app.utils.archives import ID_ARCHIVAGE, partitions, union_archives
+from app.utils.politiques import ANALYTIQUE, collection
+from config import Config
+
+# Document de la collection stats portant le filigrane des cumuls
+ID_CUMULS = 'cumuls_emprunts'
+# Emprunts par jour et par document, et activité par jour et par type
+CUMULS_DOCUMENTS = 'cumuls_documents'
+CUMULS_JOURS = 'cumuls_jours'
+GRANULARITES = {'jour': 'day', 'semaine': 'week', 'mois': 'month'}
+# Classes de retard au retour, en jours après date_retour_prevue : borne
+# haute incluse, None pour la dernière
+CLASSES_RETARD = [('a_temps', 0), ('1_7j', 7), ('8_14j', 14), ('15_30j', 30), ('plus_30j', None)]
+JOUR_MS = 86400000
+TOP_MAX = 100
+
+def jour(date):
+    return date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def lire_periode(args):
+    """Lit debut, fin (dates ISO, fin exclue) et type des paramètres de
+    requête ; par défaut les 30 derniers jours. Lève ValueError."""
+    try:
+        fin = datetime.fromisoformat(args['fin']) if args.get('fin') else jour(datetime.now()) + timedelta(days=1)
+        debut = datetime.fromisoformat(args['debut']) if args.get('debut') else fin - timedelta(days=30)
+    except ValueError:
+        raise ValueError("Les paramètres debut et fin doivent être des dates ISO (AAAA-MM-JJ)")
+    if debut >= fin:
+        raise ValueError("Le paramètre debut doit précéder fin")
+    return {'debut': debut, 'fin': fin, 'type_doc': args.get('type') or None}
+
+def lire_granularite(args):
+    granularite = args.get('granularite', 'jour')
+    if granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue : {granularite} ({', '.join(GRANULARITES)})")
+    return granularite
+
+def lire_limite(args):
+    try:
+        limite = int(args.get('limit', 10))
+    except ValueError:
+        raise ValueError("Le paramètre limit doit être un entier")
+    if not 1 <= limite <= TOP_MAX:
+        raise ValueError(f"Le paramètre limit doit être compris entre 1 et {TOP_MAX}")
+    return limite
+
+def classe_retard(retard_jours):
+    """Expression d'agrégation : nom de la classe d'un retard en jours."""
+    return {'$switch': {
+        'branches': [{'case': {'$lte': [retard_jours, borne]}, 'then': nom}
+                     for nom, borne in CLASSES_RETARD if borne is not None],
+        'default': CLASSES_RETARD[-1][0]
+    }}
+
+def filtre_cumuls(debut, fin, type_doc=None):
+    filtre = {'jour': {'$gte': debut, '$lt': fin}}
+    if type_doc:
+        filtre['type'] = type_doc
+    return filtre
+
+def series(resultats, granularite):
+    """Replie les groupes (période, type) en une entrée par période."""
+    periodes = {}
+    for groupe in resultats:
+        periode = periodes.setdefault(groupe['_id']['periode'], {
+            'periode': groupe['_id']['periode'], 'emprunts': 0, 'retours': 0,
+            'duree_moyenne_jours': None, 'retards': {nom: 0 for nom, _ in CLASSES_RETARD},
+            'par_type': {}, 'duree_totale_jours': 0
+        })
+        periode['emprunts'] += groupe['emprunts']
+        periode['retours'] += groupe['retours']
+        periode['duree_totale_jours'] += groupe['duree_totale_jours']
+        for nom, _ in CLASSES_RETARD:
+            periode['retards'][nom] += groupe[nom]
+        periode['par_type'][groupe['_id']['type']] = {'emprunts': groupe['emprunts'],
+                                                      'retours': groupe['retours']}
+    for periode in periodes.values():
+        duree = periode.pop('duree_totale_jours')
+        if periode['retours']:
+            periode['duree_moyenne_jours'] = round(duree / periode['retours'], 2)
+    return {'granularite': granularite, 'series': [periodes[p] for p in sorted(periodes)]}
+
+def classement(top, documents):
+    # Titre et auteur joints depuis le cache d'entités
+    resultat = []
+    for rang, entree in enumerate(top, 1):
+        document = documents.get(entree['_id']) or {}
+        resultat.append({'rang': rang, 'document_id': entree['_id'], 'emprunts': entree['emprunts'],
+                         **{c: document.get(c) for c in ('titre', 'auteur', 'type')}})
+    return resultat
+
+class CumulService:
+    """Cumuls des emprunts par jour, tenus à jour de façon incrémentale.
+
+    Chaque mise à jour (commande cumuler-emprunts) recalcule les jours
+    compris entre le filigrane et maintenant - CUMULS_MARGE_SECONDES, à
+    partir des seuls emprunts et retours de ces jours (index date_emprunt et
+    date_retour_effective), et les écrit par $merge : un jour recalculé
+    remplace le précédent, une exécution interrompue peut être relancée sans
+    double comptage. Les lectures (séries temporelles, documents les plus
+    empruntés) ne parcourent que les cumuls, jamais l'historique. Une
+    reconstruction relit aussi les partitions d'archives ; l'archivage ne
+    déplace que des jours antérieurs au filigrane.
+    """
+
+    def __init__(self):
+        self.marge = timedelta(seconds=Config.CUMULS_MARGE_SECONDES)
+        self.document_service = DocumentService()
+
+    def pipeline_documents(self, debut=None):
+        # Emprunts par (jour, document), type du document joint au passage
+        pipeline = [{'$match': {'date_emprunt': {'$gte': debut}}}] if debut else []
+        return pipeline + [
+            {'$group': {
+                '_id': {'jour': {'$dateTrunc': {'date': '$date_emprunt', 'unit': 'day'}},
+                        'document_id': '$document_id'},
+                'emprunts': {'$sum': 1}
+            }},
+            {'$lookup': {'from': 'documents', 'localField': '_id.document_id',
+                         'foreignField': '_id', 'pipeline': [{'$project': {'type': 1}}],
+                         'as': 'document'}},
+            {'$project': {'_id': 1, 'jour': '$_id.jour', 'document_id': '$_id.document_id',
+                          'type': {'$ifNull': [{'$first': '$document.type'}, 'inconnu']},
+                          'emprunts': 1}},
+            {'$merge': {'into': CUMULS_DOCUMENTS, 'whenMatched': 'replace'}}
+        ]
+
+    def pipeline_emprunts_jours(self, debut=None):
+        # Emprunts par (jour, type), relus des cumuls par document
+        pipeline = [{'$match': {'jour': {'$gte': debut}}}] if debut else []
+        return pipeline + [
+            {'$group': {'_id': {'jour': '$jour', 'type': '$type'}, 'emprunts': {'$sum': '$emprunts'}}},
+            {'$project': {'_id': 1, 'jour': '$_id.jour', 'type': '$_id.type', 'emprunts': 1}},
+            # Les champs des retours, écrits par pipeline_retours, sont conservés
+            {'$merge': {'into': CUMULS_JOURS, 'whenMatched': 'merge'}}
+        ]
+
+    def pipeline_retours(self, debut=None):
+        # Retours par (jour, type) : durée des prêts et classes de retard
+        # $type repris du filtre partiel de l'index date_retour_effective
+        filtre = {'$type': 'date', '$gte': debut} if debut else {'$type': 'date'}
+        retard = {'$ceil': {'$divide': [
+            {'$subtract': ['$date_retour_effective', '$date_retour_prevue']}, JOUR_MS]}}
+        return [
+            {'$match': {'date_retour_effective': filtre}},
+            {'$lookup': {'from': 'documents', 'localField': 'document_id',
+                         'foreignField': '_id', 'pipeline': [{'$project': {'type': 1}}],
+                         'as': 'document'}},
+            {'$set': {'classe': classe_retard(retard)}},
+            {'$group': {
+                '_id': {'jour': {'$dateTrunc': {'date': '$date_retour_effective', 'unit': 'day'}},
+                        'type': {'$ifNull': [{'$first': '$document.type'}, 'inconnu']}},
+                'retours': {'$sum': 1},
+                'duree_totale_jours': {'$sum': {'$divide': [
+                    {'$subtract': ['$date_retour_effective', '$date_emprunt']}, JOUR_MS]}},
+                **{nom: {'$sum': {'$cond': [{'$eq': ['$classe', nom]}, 1, 0]}}
+                   for nom, _ in CLASSES_RETARD}
+            }},
+            {'$set': {'jour': '$_id.jour', 'type': '$_id.type'}},
+            {'$merge': {'into': CUMULS_JOURS, 'whenMatched': 'merge'}}
+        ]
+
+    def cumuler(self, maintenant=None, reconstruire=False):
+        """Recalcule les cumuls depuis le jour du filigrane (tout
+        l'historique sans filigrane ou si `reconstruire`) et avance le
+        filigrane. Renvoie le rapport, également enregistré dans stats."""
+        borne = (maintenant or datetime.now()) - self.marge
+        etat = mongo.db.stats.find_one({'_id': ID_CUMULS}) or {}
+        debut = None if reconstruire or not etat.get('filigrane') else jour(etat['filigrane'])
+        chrono = time.perf_counter()
+        archives = []
+        if debut is None:
+            # Reconstruction : aucun cumul d'emprunt supprimé ne doit survivre
+            mongo.db[CUMULS_DOCUMENTS].delete_many({})
+            mongo.db[CUMULS_JOURS].delete_many({})
+            archives = union_archives(self.partitions_archives(), [])
+        # Les $merge écrivent côté serveur : aucun emprunt ne transite par l'API
+        mongo.db.emprunts.aggregate(archives + self.pipeline_documents(debut))
+        mongo.db[CUMULS_DOCUMENTS].aggregate(self.pipeline_emprunts_jours(debut))
+        mongo.db.emprunts.aggregate(archives + self.pipeline_retours(debut))
+        rapport = {
+            'filigrane': borne,
+            'depuis': debut,
+            'reconstruction': debut is None,
+            'duree_ms': round((time.perf_counter() - chrono) * 1000, 1)
+        }
+        mongo.db.stats.update_one({'_id': ID_CUMULS}, {
+            '$set': {'filigrane': borne, 'dernier': rapport},
+            '$inc': {'executions': 1}
+        }, upsert=True)
+        return rapport
+
+    def partitions_archives(self):
+        etat = mongo.db.stats.find_one({'_id': ID_ARCHIVAGE}, {'premiere_annee': 1}) or {}
+        return partitions(etat.get('premiere_annee'))
+
+    def lire_filigrane(self):
+        etat = collection(mongo.db, 'stats', ANALYTIQUE).find_one({'_id': ID_CUMULS}, {'filigrane': 1})
+        return etat['filigrane'] if etat else None
+
+    def pipeline_series(self, debut, fin, granularite, type_doc=None):
+        unite = {'date': '$jour', 'unit': GRANULARITES[granularite]}
+        if granularite == 'semaine':
+            unite['startOfWeek'] = 'monday'
+        return [
+            {'$match': filtre_cumuls(debut, fin, type_doc)},
+            {'$group': {
+                '_id': {'periode': {'$dateTrunc': unite}, 'type': '$type'},
+                'emprunts': {'$sum': '$emprunts'},
+                'retours': {'$sum': '$retours'},
+                'duree_totale_jours': {'$sum': '$duree_totale_jours'},
+                **{nom: {'$sum': f'${nom}'} for nom, _ in CLASSES_RETARD}
+            }}
+        ]
+
+    def pipeline_top(self, debut, fin, limite, type_doc=None):
+        return [
+            {'$match': filtre_cumuls(debut, fin, type_doc)},
+            {'$group': {'_id': '$document_id', 'emprunts': {'$sum': '$emprunts'}}},
+            {'$sort': {'emprunts': -1, '_id': 1}},
+            {'$limit': limite}
+        ]
+
+    def get_series(self, debut, fin, granularite='jour', type_doc=None):
+        resultats = collection(mongo.db, CUMULS_JOURS, ANALYTIQUE).aggregate(
+            self.pipeline_series(debut, fin, granularite, type_doc))
+        return {**series(resultats, granularite), 'filigrane': self.lire_filigrane()}
+
+    def get_top_documents(self, debut, fin, limite=10, type_doc=None):
+        top = list(collection(mongo.db, CUMULS_DOCUMENTS, ANALYTIQUE).aggregate(
+            self.pipeline_top(debut, fin, limite, type_doc)))
+        documents = self.document_service.find_by_ids([t['_id'] for t in top])
+        return {'documents': classement(top, documents), 'filigrane': self.lire_filigrane()}
\ No newline at end of file
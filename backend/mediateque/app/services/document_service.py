@@ -1,61 +1,286 @@
 from bson import ObjectId
 from datetime import datetime
 from app import mongo
+from app.models.document import Document
+from app.utils.pagination import decoder_curseur_score, paginer, projection, requete_paginee
+from app.utils.export import TAILLE_LOT
+from app.utils.cache import documents_cache, stats_cache
+from app.utils.politiques import ANALYTIQUE, collection
+from app.services.compteur_service import CompteurService
+from app.services.version_service import VersionService
+from config import Config
+from pymongo import ReturnDocument
+
+# Un emprunt réserve un exemplaire par $inc: -1 sous cette condition ; un
+# retour le rend sans dépasser le nombre d'exemplaires possédés
+EXEMPLAIRE_DISPONIBLE = {'exemplaires_disponibles': {'$gt': 0}}
+EXEMPLAIRE_EN_PRET = {'$expr': {'$lt': ['$exemplaires_disponibles', '$exemplaires_total']}}
+RENDRE_EXEMPLAIRE = {'$inc': {'exemplaires_disponibles': 1}, '$set': {'disponible': True}}
+# Champs modifiés par les seuls emprunts, retours et update_disponibilite
+CHAMPS_DISPONIBILITE = ('disponible', 'exemplaires_disponibles')
+EXEMPLAIRES_EN_PRET = {'$subtract': ['$exemplaires_total', '$exemplaires_disponibles']}
+
+def compte_facette(facettes, nom):
+    return facettes[nom][0]['n'] if facettes[nom] else 0
+
+def alignement_disponible(_id, disponibles):
+    """Filtre et modification qui recalent le drapeau disponible d'un titre
+    sur son compteur d'exemplaires. La condition porte sur le compteur : si
+    un emprunt ou un retour concurrent l'a déjà fait changer de côté de
+    zéro, l'écriture est sans effet et c'est la sienne qui fait foi."""
+    if disponibles:
+        return ({'_id': _id, 'exemplaires_disponibles': {'$gt': 0}, 'disponible': False},
+                {'$set': {'disponible': True}})
+    return ({'_id': _id, 'exemplaires_disponibles': 0, 'disponible': True},
+            {'$set': {'disponible': False}})
+
+def stats_facettes(facettes):
+    exemplaires = facettes['exemplaires'][0] if facettes['exemplaires'] else {}
+    return {
+        'total': compte_facette(facettes, 'total'),
+        'exemplaires': exemplaires.get('n', 0),
+        'disponibles': exemplaires.get('disponibles', 0),
+        'empruntes': exemplaires.get('empruntes', 0),
+        'par_type': {doc['_id']: doc['count'] for doc in facettes['par_type']}
+    }
+
+def sans_disponibilite(data):
+    return {k: v for k, v in data.items() if k not in CHAMPS_DISPONIBILITE}
+
 
 class DocumentService:
-    def create(self, document_data):
+    COLONNES_EXPORT = ['_id', 'titre', 'auteur', 'type', 'isbn', 'date_publication',
+                       'exemplaires_total', 'exemplaires_disponibles', 'disponible', 'date_ajout']
+    # Champs dont la modification déplace les compteurs matérialisés
+    CHAMPS_COMPTES = {'_id': 0, 'type': 1, 'disponible': 1,
+                      'exemplaires_total': 1, 'exemplaires_disponibles': 1}
+
+    def __init__(self):
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+        # Listes et exports en enregistrements décodés du BSON brut
+        self.modele = Document if Config.LECTURE_BSON_BRUTE else None
+
+    def appliquer_defauts(self, document_data):
+        total = Document.nombre_exemplaires(document_data.get('exemplaires_total', 1))
+        document_data['exemplaires_total'] = total
+        document_data['exemplaires_disponibles'] = total
         document_data['disponible'] = True
         document_data['emprunts'] = []
         document_data['date_ajout'] = datetime.now()
+        return document_data
+
+    def create(self, document_data):
+        self.appliquer_defauts(document_data)
         result = mongo.db.documents.insert_one(document_data)
+        self.compteur_service.mouvement_document(apres=document_data)
+        self.version_service.incrementer('documents')
+        stats_cache.invalidate()
         return str(result.inserted_id)
     
-    def find_all(self):
-        return list(mongo.db.documents.find())
+    def find_all(self, **pagination):
+        return paginer(mongo.db.documents, modele=self.modele, **pagination)
+    
+    def curseur_export(self, batch_size=TAILLE_LOT, colonnes=None):
+        # colonnes : projection côté serveur (export CSV)
+        curseur = requete_paginee(collection(mongo.db, 'documents', ANALYTIQUE),
+                                  fields=colonnes, modele=self.modele)
+        return curseur.batch_size(batch_size)
     
     def find_by_id(self, document_id):
-        return mongo.db.documents.find_one({'_id': ObjectId(document_id)})
+        _id = ObjectId(document_id)
+        return self.find_by_ids([_id]).get(_id)
+    
+    def find_by_ids(self, document_ids):
+        """Documents par _id (dictionnaire), servis depuis le cache
+        d'entités ; les absents sont lus en un seul find $in."""
+        return documents_cache.trouver(
+            [ObjectId(i) for i in document_ids],
+            lambda ids: mongo.db.documents.find({'_id': {'$in': ids}})
+        )
     
     def update(self, document_id, data):
-        return mongo.db.documents.update_one(
+        # La disponibilité suit les emprunts et les retours
+        data = sans_disponibilite(data)
+        if 'exemplaires_total' in data:
+            return self.modifier_exemplaires(document_id, data)
+        if not data:
+            return None
+        if 'type' not in data:
+            result = mongo.db.documents.update_one(
+                {'_id': ObjectId(document_id)},
+                {'$set': data}
+            )
+            documents_cache.invalidate(ObjectId(document_id))
+            if result.matched_count:
+                self.version_service.incrementer('documents')
+            return result
+        avant = mongo.db.documents.find_one_and_update(
             {'_id': ObjectId(document_id)},
-            {'$set': data}
+            {'$set': data},
+            projection=self.CHAMPS_COMPTES,
+            return_document=ReturnDocument.BEFORE
         )
+        documents_cache.invalidate(ObjectId(document_id))
+        if avant:
+            self.compteur_service.mouvement_document(avant, {**avant, **data})
+            self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return avant
+    
+    def modifier_exemplaires(self, document_id, data):
+        """Change le nombre d'exemplaires d'un titre (et les autres champs
+        de data) : les exemplaires ajoutés ou retirés le sont du rayon.
+
+        Lève ValueError s'il faudrait retirer des exemplaires en prêt.
+        """
+        _id = ObjectId(document_id)
+        data = dict(data)
+        total = Document.nombre_exemplaires(data.pop('exemplaires_total'))
+        actuel = mongo.db.documents.find_one({'_id': _id}, self.CHAMPS_COMPTES)
+        if not actuel:
+            return None
+        if 'exemplaires_total' not in actuel:
+            raise ValueError("Exemplaires non initialisés : lancer flask migrer-exemplaires")
+        ecart = total - actuel['exemplaires_total']
+        # La condition sur exemplaires_total écarte une modification concurrente
+        avant = mongo.db.documents.find_one_and_update(
+            {'_id': _id, 'exemplaires_total': actuel['exemplaires_total'],
+             'exemplaires_disponibles': {'$gte': -ecart}},
+            {'$set': {**data, 'exemplaires_total': total},
+             '$inc': {'exemplaires_disponibles': ecart}},
+            projection=self.CHAMPS_COMPTES,
+            return_document=ReturnDocument.BEFORE
+        )
+        if not avant:
+            raise ValueError(f"Impossible de passer à {total} exemplaires : "
+                             f"{actuel['exemplaires_total'] - actuel['exemplaires_disponibles']} en prêt")
+        disponibles = avant['exemplaires_disponibles'] + ecart
+        mongo.db.documents.update_one(*alignement_disponible(_id, disponibles))
+        documents_cache.invalidate(_id)
+        self.compteur_service.mouvement_document(avant, {
+            **avant, **data, 'exemplaires_total': total, 'exemplaires_disponibles': disponibles})
+        self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return avant
+    
+    def migrer_exemplaires(self):
+        """Donne un exemplaire aux documents antérieurs au suivi des
+        exemplaires, en rayon ou en prêt selon disponible.
+
+        Idempotent : seuls les documents sans exemplaires_total sont
+        modifiés. Les compteurs matérialisés les comptaient déjà ainsi
+        (compteur_service.exemplaires). Renvoie le nombre de documents migrés.
+        """
+        migres = 0
+        for disponible, disponibles in ((True, 1), (False, 0)):
+            filtre = {'exemplaires_total': {'$exists': False}}
+            filtre['disponible'] = True if disponible else {'$ne': True}
+            resultat = mongo.db.documents.update_many(filtre, {'$set': {
+                'exemplaires_total': 1,
+                'exemplaires_disponibles': disponibles,
+                'disponible': disponible
+            }})
+            migres += resultat.modified_count
+        if migres:
+            documents_cache.vider()
+            self.version_service.incrementer('documents')
+            stats_cache.invalidate()
+        return migres
     
     def delete(self, document_id):
-        return mongo.db.documents.delete_one({'_id': ObjectId(document_id)})
+        avant = mongo.db.documents.find_one_and_delete(
+            {'_id': ObjectId(document_id)},
+            projection=self.CHAMPS_COMPTES
+        )
+        documents_cache.invalidate(ObjectId(document_id))
+        self.compteur_service.mouvement_document(avant=avant)
+        if avant:
+            self.version_service.incrementer('documents')
+        stats_cache.invalidate()
+        return avant
     
-    def search(self, query):
-        return list(mongo.db.documents.find({
-            '$or': [
-                {'titre': {'$regex': query, '$options': 'i'}},
-                {'auteur': {'$regex': query, '$options': 'i'}}
-            ]
-        }))
+    def search(self, query, **pagination):
+        documents = collection(mongo.db, 'documents', ANALYTIQUE)
+        return list(documents.aggregate(self._pipeline_recherche(query, **pagination)))
+    
+    def _pipeline_recherche(self, query, limit=None, after=None, fields=None):
+        # Recherche plein texte servie par l'index recherche_texte (titre,
+        # auteur), classée par pertinence. La saisie n'est jamais interprétée
+        # comme une expression régulière.
+        pipeline = [
+            {'$match': {'$text': {'$search': query}}},
+            {'$addFields': {'score': {'$meta': 'textScore'}}}
+        ]
+        if after:
+            score, _id = decoder_curseur_score(after)
+            pipeline.append({'$match': {'$or': [
+                {'score': {'$lt': score}},
+                {'score': score, '_id': {'$gt': _id}}
+            ]}})
+        pipeline.append({'$sort': {'score': -1, '_id': 1}})
+        if limit:
+            pipeline.append({'$limit': limit})
+        if fields:
+            pipeline.append({'$project': {**projection(fields), 'score': 1}})
+        return pipeline
     
     def update_disponibilite(self, document_id, disponible):
-        return mongo.db.documents.update_one(
-            {'_id': ObjectId(document_id)},
-            {'$set': {'disponible': disponible}}
+        # Tous les exemplaires remis en rayon, ou tous retirés du prêt ; ne
+        # touche les compteurs que si la disponibilité change réellement
+        if disponible:
+            filtre = {'$expr': {'$ne': ['$exemplaires_disponibles', '$exemplaires_total']}}
+        else:
+            filtre = EXEMPLAIRE_DISPONIBLE
+        avant = mongo.db.documents.find_one_and_update(
+            {'_id': ObjectId(document_id), **filtre},
+            [{'$set': {'exemplaires_disponibles': '$exemplaires_total' if disponible else 0,
+                       'disponible': disponible}}],
+            projection=self.CHAMPS_COMPTES,
+            return_document=ReturnDocument.BEFORE
         )
+        if avant:
+            documents_cache.invalidate(avant['_id'])
+            disponibles = avant['exemplaires_total'] if disponible else 0
+            self.compteur_service.mouvement_document(
+                avant, {**avant, 'disponible': disponible, 'exemplaires_disponibles': disponibles})
+            self.version_service.incrementer('documents')
+            stats_cache.invalidate()
+        return avant
     
-    def find_by_type(self, type_doc):
-        return list(mongo.db.documents.find({'type': type_doc}))
+    def find_by_type(self, type_doc, **pagination):
+        return paginer(mongo.db.documents, {'type': type_doc}, self.modele, **pagination)
 
-    def find_by_disponibilite(self, disponible):
-        return list(mongo.db.documents.find({'disponible': disponible}))
+    def find_by_disponibilite(self, disponible, **pagination):
+        return paginer(mongo.db.documents, {'disponible': disponible}, self.modele, **pagination)
 
     def count_total(self):
         return mongo.db.documents.count_documents({})
 
+    def somme_exemplaires(self, champ, expression):
+        # Compteurs matérialisés, ou somme sur les documents à défaut
+        compteurs = self.compteur_service.lire()
+        if compteurs is not None:
+            return compteurs[champ]
+        pipeline = [{'$group': {'_id': None, 'n': {'$sum': expression}}}]
+        resultat = next(mongo.db.documents.aggregate(pipeline), None)
+        return resultat['n'] if resultat else 0
+
     def count_disponibles(self):
-        return mongo.db.documents.count_documents({'disponible': True})
+        """Exemplaires en rayon, tous titres confondus."""
+        return self.somme_exemplaires('documents_disponibles', '$exemplaires_disponibles')
 
     def count_empruntes(self):
-        return mongo.db.documents.count_documents({'disponible': False})
+        """Exemplaires en prêt, tous titres confondus."""
+        return self.somme_exemplaires('documents_empruntes', EXEMPLAIRES_EN_PRET)
 
     def count_par_type(self):
+        compteurs = self.compteur_service.lire()
+        if compteurs is not None:
+            return compteurs['par_type']
         pipeline = [
+            # Le tri sur type permet un parcours couvert de l'index type__id
+            {'$sort': {'type': 1}},
             {'$group': {
                 '_id': '$type',
                 'count': {'$sum': 1}
@@ -64,5 +289,22 @@ class DocumentService:
         result = mongo.db.documents.aggregate(pipeline)
         return {doc['_id']: doc['count'] for doc in result}
 
+    def pipeline_stats(self):
+        # Tous les compteurs du catalogue en une seule agrégation : titres,
+        # puis exemplaires possédés, en rayon et en prêt
+        return [{'$facet': {
+            'total': [{'$count': 'n'}],
+            'exemplaires': [{'$group': {
+                '_id': None,
+                'n': {'$sum': '$exemplaires_total'},
+                'disponibles': {'$sum': '$exemplaires_disponibles'},
+                'empruntes': {'$sum': EXEMPLAIRES_EN_PRET}
+            }}],
+            'par_type': [{'$group': {'_id': '$type', 'count': {'$sum': 1}}}]
+        }}]
+
+    def get_stats(self):
+        return stats_facettes(next(mongo.db.documents.aggregate(self.pipeline_stats())))
+
     def get_types(self):
         return mongo.db.documents.distinct('type')
\ No newline at end of file
@@ -1,25 +1,117 @@
+import logging
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from app import mongo
+from app.utils.pagination import paginer
+from app.utils.export import TAILLE_LOT
+from app.utils.archives import union_archives
+from app.utils.cache import abonnes_cache, documents_cache, stats_cache
+from app.utils.transactions import executer_transaction
+from app.utils.politiques import ANALYTIQUE, CRITIQUE, collection
+from app.services.archive_service import ArchiveService
+from app.services.compteur_service import CompteurService
+from app.services.version_service import VersionService
 from app.services import abonne_service
 from app.services import document_service
+from app.services.document_service import (EXEMPLAIRE_DISPONIBLE, EXEMPLAIRE_EN_PRET,
+                                           RENDRE_EXEMPLAIRE, alignement_disponible,
+                                           compte_facette)
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Emprunts non retournés ; RetardService fait passer les emprunts échus
+# de 'en_cours' à 'retarde'
+STATUTS_ACTIFS = ['en_cours', 'retarde']
+EN_COURS = {'statut': {'$in': STATUTS_ACTIFS}}
+
+def en_retard(maintenant=None):
+    """Emprunts en retard : marqués par RetardService, ou échus depuis son
+    dernier balayage (ou sans balayage du tout). Chaque branche du $or suit
+    un index partiel : statut__id et en_cours_date_retour_prevue."""
+    return {'$or': [
+        {'statut': 'retarde'},
+        {'statut': 'en_cours', 'date_retour_prevue': {'$lt': maintenant or datetime.now()}}
+    ]}
+
+# Collections modifiées par un emprunt ou un retour
+COLLECTIONS_MOUVEMENT = ('documents', 'abonnes', 'emprunts')
+
+def pousser_borne(valeur, taille):
+    """Modificateur $push qui ne garde que les `taille` dernières valeurs."""
+    return {'$each': [valeur], '$slice': -taille}
+
+def invalider_entites(documents=(), abonnes=()):
+    # Disponibilité et historiques embarqués ont changé : fiches à relire
+    documents_cache.invalidate(*documents)
+    abonnes_cache.invalidate(*abonnes)
+
+def ids_joints(emprunts, alias):
+    return {e[alias + '_id'] for e in emprunts if e.get(alias + '_id')}
+
+def joindre(emprunts, alias, entites, champs, fields=None):
+    """Place sous `alias` les champs affichés de l'entité jointe (None si
+    elle n'existe plus), comme le ferait $lookup."""
+    cle = alias + '_id'
+    for emprunt in emprunts:
+        entite = entites.get(ObjectId(emprunt[cle])) if emprunt.get(cle) else None
+        emprunt[alias] = {champ: entite[champ] for champ in champs if champ in entite} if entite else None
+        if fields and cle not in fields:
+            emprunt.pop(cle, None)
+
+def erreur_bulk(index, message):
+    return {'index': index, 'statut': 'erreur', 'error': message}
+
+def erreurs_lot(erreur, ordre):
+    """Message d'erreur par élément de `ordre` refusé dans un lot non ordonné."""
+    return {ordre[e['index']]: e.get('errmsg', 'Écriture refusée')
+            for e in erreur.details.get('writeErrors', [])}
+
+def verifier_taille_lot(demandes):
+    if len(demandes) > Config.BULK_TAILLE_MAX:
+        raise ValueError(f"Au plus {Config.BULK_TAILLE_MAX} demandes par requête")
+
+def executer_bulk(collection, requetes):
+    """bulk_write non ordonné ; renvoie le nombre de documents modifiés,
+    y compris quand certaines opérations du lot échouent."""
+    try:
+        return collection.bulk_write(requetes, ordered=False).modified_count
+    except BulkWriteError as e:
+        return e.details['nModified']
 
 class EmpruntService:
+    # Champs joints renvoyés avec chaque emprunt
+    CHAMPS_ABONNE = ['nom', 'prenom', 'email', 'telephone']
+    CHAMPS_DOCUMENT = ['titre', 'auteur', 'type', 'isbn']
+    COLONNES_EXPORT = ['_id', 'abonne_id', 'document_id', 'date_emprunt',
+                       'date_retour_prevue', 'date_retour_effective', 'statut',
+                       'abonne.nom', 'abonne.prenom', 'document.titre']
+    # Historiques embarqués bornés à HISTORIQUE_EMBARQUE_MAX emprunts récents
+    HISTORIQUES_EMBARQUES = [('abonnes', 'historique_emprunts'), ('documents', 'emprunts')]
+
     def __init__(self):
         self.duree_emprunt = timedelta(days=14)  # Durée par défaut de 14 jours
+        self.historique_max = Config.HISTORIQUE_EMBARQUE_MAX
         self.abonne_service = abonne_service.AbonneService()
         self.document_service = document_service.DocumentService()
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+        self.archive_service = ArchiveService()
+    
+    def critique(self, nom):
+        # Emprunts et retours : primaire, lectures et écritures majoritaires
+        return collection(mongo.db, nom, CRITIQUE)
     
     def creer_emprunt(self, abonne_id, document_id):
-        # Vérifier si le document est disponible
-        document = mongo.db.documents.find_one({'_id': ObjectId(document_id)})
-        if not document or not document.get('disponible'):
-            raise ValueError("Document non disponible")
-        
+        emprunt_id = ObjectId()
         date_emprunt = datetime.now()
         date_retour_prevue = date_emprunt + self.duree_emprunt
         
         emprunt_data = {
+            '_id': emprunt_id,
             'abonne_id': ObjectId(abonne_id),
             'document_id': ObjectId(document_id),
             'date_emprunt': date_emprunt,
@@ -28,114 +120,502 @@ class EmpruntService:
             'statut': 'en_cours'
         }
         
-        # Créer l'emprunt
-        result = mongo.db.emprunts.insert_one(emprunt_data)
-        
-        # Mettre à jour le document
-        mongo.db.documents.update_one(
-            {'_id': ObjectId(document_id)},
-            {
-                '$set': {'disponible': False},
-                '$push': {'emprunts': str(result.inserted_id)}
-            }
-        )
+        def operation(session):
+            # Réserver un exemplaire : le $inc conditionnel est atomique, il
+            # ne peut pas réserver plus d'exemplaires qu'il n'en reste
+            document = self.critique('documents').find_one_and_update(
+                {'_id': ObjectId(document_id), **EXEMPLAIRE_DISPONIBLE},
+                {
+                    '$inc': {'exemplaires_disponibles': -1},
+                    '$push': {'emprunts': pousser_borne(str(emprunt_id), self.historique_max)}
+                },
+                projection={'exemplaires_disponibles': 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if not document:
+                raise ValueError("Document non disponible")
+            try:
+                if not document['exemplaires_disponibles']:
+                    # Dernier exemplaire : le titre n'est plus disponible
+                    self.critique('documents').update_one(
+                        *alignement_disponible(document['_id'], 0), session=session)
+                
+                # Créer l'emprunt
+                self.critique('emprunts').insert_one(emprunt_data, session=session)
+                
+                # Mettre à jour l'abonné
+                abonne = self.critique('abonnes').update_one(
+                    {'_id': ObjectId(abonne_id)},
+                    {
+                        '$push': {
+                            'emprunts_actuels': str(emprunt_id),
+                            'historique_emprunts': pousser_borne(str(emprunt_id), self.historique_max)
+                        }
+                    },
+                    session=session
+                )
+                if not abonne.matched_count:
+                    raise ValueError("Abonné non trouvé")
+            except Exception:
+                if session is None:
+                    # Sans transaction, rien n'est annulé : on défait la réservation
+                    self._annuler_emprunt(emprunt_data)
+                raise
         
-        # Mettre à jour l'abonné
-        mongo.db.abonnes.update_one(
-            {'_id': ObjectId(abonne_id)},
-            {
-                '$push': {
-                    'emprunts_actuels': str(result.inserted_id),
-                    'historique_emprunts': str(result.inserted_id)
-                }
-            }
-        )
+        try:
+            executer_transaction(operation)
+        finally:
+            invalider_entites([ObjectId(document_id)], [ObjectId(abonne_id)])
         
-        return str(result.inserted_id)
+        # Les compteurs sont incrémentés après le commit : dans la transaction,
+        # ce document unique ferait entrer en conflit tous les emprunts
+        self.compteur_service.incrementer({
+            'emprunts_en_cours': 1,
+            'documents_disponibles': -1,
+            'documents_empruntes': 1
+        })
+        self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        stats_cache.invalidate()
+        return str(emprunt_id)
     
+    def _annuler_emprunt(self, emprunt):
+        """Supprime l'emprunt et rend l'exemplaire réservé, une seule fois
+        grâce à la preuve poussée dans documents.emprunts."""
+        self.critique('emprunts').delete_one({'_id': emprunt['_id']})
+        self.critique('documents').update_one(
+            {'_id': emprunt['document_id'], 'emprunts': str(emprunt['_id'])},
+            {**RENDRE_EXEMPLAIRE, '$pull': {'emprunts': str(emprunt['_id'])}})
+        self.critique('abonnes').update_one(
+            {'_id': emprunt['abonne_id']},
+            {'$pull': {'emprunts_actuels': str(emprunt['_id']),
+                       'historique_emprunts': str(emprunt['_id'])}})
+
     def enregistrer_retour(self, emprunt_id):
-        emprunt = mongo.db.emprunts.find_one({'_id': ObjectId(emprunt_id)})
-        if not emprunt:
-            raise ValueError("Emprunt non trouvé")
-        
-        # Mettre à jour l'emprunt
-        mongo.db.emprunts.update_one(
-            {'_id': ObjectId(emprunt_id)},
-            {
-                '$set': {
-                    'date_retour_effective': datetime.now(),
-                    'statut': 'retourne'
-                }
-            }
-        )
+        def operation(session):
+            # Clôturer l'emprunt, sauf s'il l'est déjà
+            emprunt = self.critique('emprunts').find_one_and_update(
+                {'_id': ObjectId(emprunt_id), 'statut': {'$ne': 'retourne'}},
+                {
+                    '$set': {
+                        'date_retour_effective': datetime.now(),
+                        'statut': 'retourne'
+                    }
+                },
+                session=session
+            )
+            if not emprunt:
+                if self.critique('emprunts').find_one({'_id': ObjectId(emprunt_id)}, {'_id': 1},
+                                              session=session):
+                    raise ValueError("Emprunt déjà retourné")
+                raise ValueError("Emprunt non trouvé")
+            
+            # Rendre l'exemplaire au rayon
+            document = self.critique('documents').update_one(
+                {'_id': emprunt['document_id'], **EXEMPLAIRE_EN_PRET},
+                RENDRE_EXEMPLAIRE,
+                session=session
+            )
+            
+            # Mettre à jour l'abonné
+            self.critique('abonnes').update_one(
+                {'_id': emprunt['abonne_id']},
+                {'$pull': {'emprunts_actuels': str(emprunt_id)}},
+                session=session
+            )
+            return document.modified_count, emprunt
         
-        # Mettre à jour le document
-        mongo.db.documents.update_one(
-            {'_id': emprunt['document_id']},
-            {'$set': {'disponible': True}}
-        )
+        liberes, emprunt = executer_transaction(operation)
+        invalider_entites([emprunt['document_id']], [emprunt['abonne_id']])
         
-        # Mettre à jour l'abonné
-        mongo.db.abonnes.update_one(
-            {'_id': emprunt['abonne_id']},
-            {'$pull': {'emprunts_actuels': str(emprunt_id)}}
+        self.compteur_service.incrementer({
+            'emprunts_en_cours': -1,
+            'documents_disponibles': liberes,
+            'documents_empruntes': -liberes
+        })
+        self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        stats_cache.invalidate()
+    
+    def creer_emprunts_bulk(self, demandes):
+        """Crée plusieurs emprunts en un nombre constant d'allers-retours.
+
+        Renvoie un statut par demande, dans l'ordre reçu. Les demandes sont
+        indépendantes : l'échec de l'une n'annule pas les autres, et une
+        demande dont l'emprunt n'a pu être écrit rend son exemplaire.
+        Lève ValueError au-delà de BULK_TAILLE_MAX demandes.
+        """
+        verifier_taille_lot(demandes)
+        resultats = [None] * len(demandes)
+        candidats = {}  # document_id -> (index, abonne_id)
+        for i, demande in enumerate(demandes):
+            try:
+                abonne_id = ObjectId(demande['abonne_id'])
+                document_id = ObjectId(demande['document_id'])
+            except (KeyError, TypeError, InvalidId):
+                resultats[i] = erreur_bulk(i, "abonne_id et document_id valides requis")
+                continue
+            if document_id in candidats:
+                resultats[i] = erreur_bulk(i, "Document demandé plusieurs fois")
+                continue
+            candidats[document_id] = (i, abonne_id)
+
+        # Une lecture $in par collection pour écarter les demandes impossibles
+        disponibles = {d['_id'] for d in self.critique('documents').find(
+            {'_id': {'$in': list(candidats)}, **EXEMPLAIRE_DISPONIBLE}, {'_id': 1})}
+        abonnes = {a['_id'] for a in self.critique('abonnes').find(
+            {'_id': {'$in': list({a for _, a in candidats.values()})}}, {'_id': 1})}
+        for document_id, (i, abonne_id) in list(candidats.items()):
+            if document_id not in disponibles:
+                resultats[i] = erreur_bulk(i, "Document non disponible")
+            elif abonne_id not in abonnes:
+                resultats[i] = erreur_bulk(i, "Abonné non trouvé")
+            else:
+                continue
+            del candidats[document_id]
+        if not candidats:
+            return resultats
+
+        # Réservation conditionnelle d'un exemplaire de chaque document ;
+        # l'identifiant de l'emprunt poussé dans le document sert de preuve
+        emprunts_ids = {document_id: ObjectId() for document_id in candidats}
+        requetes = [UpdateOne(
+            {'_id': document_id, **EXEMPLAIRE_DISPONIBLE},
+            {'$inc': {'exemplaires_disponibles': -1},
+             '$push': {'emprunts': pousser_borne(str(emprunts_ids[document_id]), self.historique_max)}}
+        ) for document_id in candidats]
+        reserves = executer_bulk(self.critique('documents'), requetes)
+        if reserves != len(candidats):
+            # Un emprunt concurrent a pu réserver un document entre-temps
+            confirmes = {d['_id'] for d in self.critique('documents').find(
+                {'_id': {'$in': list(candidats)},
+                 'emprunts': {'$in': [str(e) for e in emprunts_ids.values()]}},
+                {'_id': 1})}
+            for document_id in list(candidats):
+                if document_id not in confirmes:
+                    i, _ = candidats.pop(document_id)
+                    resultats[i] = erreur_bulk(i, "Document non disponible")
+        if not candidats:
+            return resultats
+        # Titres dont le dernier exemplaire vient d'être réservé
+        self.critique('documents').update_many(
+            {'_id': {'$in': list(candidats)}, 'exemplaires_disponibles': 0, 'disponible': True},
+            {'$set': {'disponible': False}}
         )
+
+        date_emprunt = datetime.now()
+        ordre = list(candidats)
+        try:
+            self.critique('emprunts').insert_many([{
+                '_id': emprunts_ids[document_id],
+                'abonne_id': candidats[document_id][1],
+                'document_id': document_id,
+                'date_emprunt': date_emprunt,
+                'date_retour_prevue': date_emprunt + self.duree_emprunt,
+                'date_retour_effective': None,
+                'statut': 'en_cours'
+            } for document_id in ordre], ordered=False)
+        except BulkWriteError as e:
+            self._annuler_reservations(erreurs_lot(e, ordre), candidats, emprunts_ids, resultats)
+        except PyMongoError as e:
+            # Issue incertaine : seuls les emprunts relus ont été écrits
+            ecrits = {d['document_id'] for d in self.critique('emprunts').find(
+                {'_id': {'$in': [emprunts_ids[d] for d in ordre]}}, {'document_id': 1})}
+            self._annuler_reservations({d: str(e) for d in ordre if d not in ecrits},
+                                       candidats, emprunts_ids, resultats)
+
+        ordre = list(candidats)
+        try:
+            self.critique('abonnes').bulk_write([UpdateOne(
+                {'_id': candidats[document_id][1]},
+                {'$push': {
+                    'emprunts_actuels': str(emprunts_ids[document_id]),
+                    'historique_emprunts': pousser_borne(str(emprunts_ids[document_id]),
+                                                         self.historique_max)
+                }}
+            ) for document_id in ordre], ordered=False)
+        except BulkWriteError as e:
+            self._annuler_reservations(erreurs_lot(e, ordre), candidats, emprunts_ids, resultats,
+                                       supprimer=True)
+        except PyMongoError as e:
+            inscrits = {emprunt_id for a in self.critique('abonnes').find(
+                {'emprunts_actuels': {'$in': [str(emprunts_ids[d]) for d in ordre]}},
+                {'emprunts_actuels': 1}) for emprunt_id in a['emprunts_actuels']}
+            self._annuler_reservations({d: str(e) for d in ordre if str(emprunts_ids[d]) not in inscrits},
+                                       candidats, emprunts_ids, resultats, supprimer=True)
+        if not candidats:
+            return resultats
+
+        invalider_entites(candidats, [abonne_id for _, abonne_id in candidats.values()])
+        for document_id, (i, _) in candidats.items():
+            resultats[i] = {'index': i, 'statut': 'cree', 'id': str(emprunts_ids[document_id])}
+        self.compteur_service.incrementer({
+            'emprunts_en_cours': len(candidats),
+            'documents_disponibles': -len(candidats),
+            'documents_empruntes': len(candidats)
+        })
+        self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        stats_cache.invalidate()
+        return resultats
+
+    def _annuler_reservations(self, echecs, candidats, emprunts_ids, resultats, supprimer=False):
+        """Rend l'exemplaire réservé de chaque document de `echecs` (message
+        d'erreur par document_id), supprime au besoin l'emprunt déjà écrit
+        et signale l'échec de la demande."""
+        if not echecs:
+            return
+        if supprimer:
+            self.critique('emprunts').delete_many({'_id': {'$in': [emprunts_ids[d] for d in echecs]}})
+        # La preuve de réservation dans documents.emprunts borne la
+        # restitution à un exemplaire par demande
+        executer_bulk(self.critique('documents'), [UpdateOne(
+            {'_id': document_id, 'emprunts': str(emprunts_ids[document_id])},
+            {**RENDRE_EXEMPLAIRE, '$pull': {'emprunts': str(emprunts_ids[document_id])}}
+        ) for document_id in echecs])
+        invalider_entites(echecs)
+        for document_id, message in echecs.items():
+            i, _ = candidats.pop(document_id)
+            resultats[i] = erreur_bulk(i, f"Emprunt non enregistré : {message}")
+
+    def enregistrer_retours_bulk(self, emprunt_ids):
+        """Enregistre plusieurs retours : une lecture $in puis un bulk_write
+        par collection. Renvoie un statut par identifiant, dans l'ordre reçu.
+        Lève ValueError au-delà de BULK_TAILLE_MAX identifiants."""
+        verifier_taille_lot(emprunt_ids)
+        resultats = [None] * len(emprunt_ids)
+        demandes = {}  # emprunt_id -> index
+        for i, emprunt_id in enumerate(emprunt_ids):
+            try:
+                oid = ObjectId(emprunt_id)
+            except (TypeError, InvalidId):
+                resultats[i] = erreur_bulk(i, "Identifiant invalide")
+                continue
+            if oid in demandes:
+                resultats[i] = erreur_bulk(i, "Emprunt demandé plusieurs fois")
+                continue
+            demandes[oid] = i
+
+        emprunts = {e['_id']: e for e in self.critique('emprunts').find(
+            {'_id': {'$in': list(demandes)}},
+            {'abonne_id': 1, 'document_id': 1, 'statut': 1})}
+        for oid, i in list(demandes.items()):
+            if oid not in emprunts:
+                resultats[i] = erreur_bulk(i, "Emprunt non trouvé")
+            elif emprunts[oid]['statut'] == 'retourne':
+                resultats[i] = erreur_bulk(i, "Emprunt déjà retourné")
+            else:
+                continue
+            del demandes[oid]
+        if not demandes:
+            return resultats
+
+        # La date de retour commune (à la milliseconde, précision BSON)
+        # identifie les emprunts clos par ce lot
+        maintenant = datetime.now()
+        date_retour = maintenant.replace(microsecond=maintenant.microsecond // 1000 * 1000)
+        clos = executer_bulk(self.critique('emprunts'), [UpdateOne(
+            {'_id': oid, 'statut': {'$ne': 'retourne'}},
+            {'$set': {'date_retour_effective': date_retour, 'statut': 'retourne'}}
+        ) for oid in demandes])
+        if clos != len(demandes):
+            confirmes = {e['_id'] for e in self.critique('emprunts').find(
+                {'_id': {'$in': list(demandes)}, 'date_retour_effective': date_retour},
+                {'_id': 1})}
+            for oid in list(demandes):
+                if oid not in confirmes:
+                    i = demandes.pop(oid)
+                    resultats[i] = erreur_bulk(i, "Emprunt déjà retourné")
+        if not demandes:
+            return resultats
+
+        liberes = executer_bulk(self.critique('documents'), [UpdateOne(
+            {'_id': emprunts[oid]['document_id'], **EXEMPLAIRE_EN_PRET},
+            RENDRE_EXEMPLAIRE
+        ) for oid in demandes])
+        executer_bulk(self.critique('abonnes'), [UpdateOne(
+            {'_id': emprunts[oid]['abonne_id']},
+            {'$pull': {'emprunts_actuels': str(oid)}}
+        ) for oid in demandes])
+
+        invalider_entites([emprunts[oid]['document_id'] for oid in demandes],
+                          [emprunts[oid]['abonne_id'] for oid in demandes])
+        for oid, i in demandes.items():
+            resultats[i] = {'index': i, 'statut': 'retourne', 'id': str(oid)}
+        self.compteur_service.incrementer({
+            'emprunts_en_cours': -len(demandes),
+            'documents_disponibles': liberes,
+            'documents_empruntes': -liberes
+        })
+        self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        stats_cache.invalidate()
+        return resultats
     
     def get_emprunts_en_cours(self):
-        return list(mongo.db.emprunts.find({'statut': 'en_cours'}))
+        return list(mongo.db.emprunts.find(EN_COURS))
     
     def get_emprunts_count(self):
-        return mongo.db.emprunts.count_documents({'statut': 'en_cours'})
+        return mongo.db.emprunts.count_documents(EN_COURS)
     
-    def get_emprunts_en_retard(self):
-        return list(mongo.db.emprunts.find({
-            'statut': 'en_cours',
-            'date_retour_prevue': {'$lt': datetime.now()}
-        }))
+    def get_emprunts_en_retard(self, **pagination):
+        # Le balayage n'est pas requis : il ne fait que réduire la branche
+        # des emprunts en cours échus
+        return paginer(mongo.db.emprunts, en_retard(), **pagination)
     
     def get_emprunts_en_retard_count(self):
-        return mongo.db.emprunts.count_documents({
-            'statut': 'en_cours',
-            'date_retour_prevue': {'$lt': datetime.now()}
-            })
+        return collection(mongo.db, 'emprunts', ANALYTIQUE).count_documents(en_retard())
     
-    def get_historique_emprunts_abonne(self, abonne_id):
+    def _pipeline_jointure(self, filtre=None, limit=None, after=None, fields=None, joindre=True):
+        # Jointure côté serveur : un seul aller-retour au lieu de 2N+1 find_one.
+        # Sans `joindre`, les identifiants sont gardés pour _joindre_entites
+        filtre = dict(filtre or {})
+        if after:
+            filtre['_id'] = {'$gt': ObjectId(after)}
+        pipeline = []
+        if filtre:
+            pipeline.append({'$match': filtre})
+        if limit:
+            # La page est découpée avant les $lookup : seule elle est jointe
+            pipeline += [{'$sort': {'_id': 1}}, {'$limit': limit}]
+
+        projection = {
+            '_id': {'$toString': '$_id'},
+            'abonne_id': {'$toString': '$abonne_id'},
+            'document_id': {'$toString': '$document_id'},
+            'date_emprunt': 1,
+            'date_retour_prevue': 1,
+            'date_retour_effective': 1,
+            'statut': 1
+        }
+        jointures = [('abonne', 'abonnes', self.CHAMPS_ABONNE),
+                     ('document', 'documents', self.CHAMPS_DOCUMENT)]
+        gardes = set()
+        for alias, nom_collection, champs in jointures:
+            if fields and alias not in fields:
+                continue
+            if not joindre:
+                gardes.add(alias + '_id')
+                continue
+            pipeline += [
+                {'$lookup': {
+                    'from': nom_collection,
+                    'localField': alias + '_id',
+                    'foreignField': '_id',
+                    'as': alias
+                }},
+                {'$unwind': {'path': '$' + alias, 'preserveNullAndEmptyArrays': True}}
+            ]
+            # Seuls les champs affichés par l'interface sont renvoyés
+            projection[alias] = {'$cond': [
+                {'$ifNull': ['$' + alias, False]},
+                {champ: f'${alias}.{champ}' for champ in champs},
+                None
+            ]}
+
+        if fields:
+            projection = {k: v for k, v in projection.items()
+                          if k == '_id' or k in fields or k in gardes}
+        pipeline.append({'$project': projection})
+        return pipeline
+
+    def _pipeline_historique(self, filtre, partitions, limit=None, after=None, fields=None):
+        # Historique complet : la même page est découpée dans emprunts et
+        # dans chaque partition d'archives, puis fusionnée avant la projection
+        pipeline = self._pipeline_jointure(filtre, limit=limit, after=after, fields=fields,
+                                           joindre=False)
+        if not partitions:
+            return pipeline
+        branche, projection = pipeline[:-1], pipeline[-1]
+        pipeline = branche + union_archives(partitions, branche) + [{'$sort': {'_id': 1}}]
+        if limit:
+            pipeline.append({'$limit': limit})
+        return pipeline + [projection]
+
+    def get_stats(self):
+        # Emprunts en cours et en retard en une seule agrégation, limitée aux
+        # emprunts non retournés par l'index partiel statut__id
+        pipeline = [
+            {'$match': EN_COURS},
+            {'$facet': {
+                'en_cours': [{'$count': 'n'}],
+                'en_retard': [{'$match': en_retard()}, {'$count': 'n'}]
+            }}
+        ]
+        facettes = next(mongo.db.emprunts.aggregate(pipeline))
+        return {
+            'en_cours': compte_facette(facettes, 'en_cours'),
+            'en_retard': compte_facette(facettes, 'en_retard')
+        }
+
+    def jointures_entites(self, fields=None):
+        return [(alias, service, champs) for alias, service, champs in [
+            ('abonne', self.abonne_service, self.CHAMPS_ABONNE),
+            ('document', self.document_service, self.CHAMPS_DOCUMENT)
+        ] if not fields or alias in fields]
+
+    def _joindre_entites(self, emprunts, fields=None):
+        # Les historiques répètent le même abonné (ou document) et souvent
+        # les mêmes documents : jointure depuis les caches d'entités, un
+        # find $in par collection pour les seules entités absentes
+        for alias, service, champs in self.jointures_entites(fields):
+            joindre(emprunts, alias, service.find_by_ids(ids_joints(emprunts, alias)),
+                    champs, fields)
+        return emprunts
+
+    def get_historique_emprunts_abonne(self, abonne_id, **pagination):
         try:
-            emprunts = list(mongo.db.emprunts.find({'abonne_id': ObjectId(abonne_id)}))
-            
-            # get the abonne and document 
-            for emprunt in emprunts:
-                emprunt['abonne'] = self.abonne_service.find_by_id(emprunt['abonne_id'])
-                # remove abonne_id from emprunt['abonne']
-                emprunt['document'] = self.document_service.find_by_id(emprunt['document_id'])
-                if emprunt['abonne']:
-                    del emprunt['abonne']['_id']
-                if emprunt['document']:
-                    del emprunt['document']['_id']
-                
-            return [{**emprunt, '_id': str(emprunt['_id']), 'abonne_id': str(emprunt['abonne_id']), 'document_id': str(emprunt['document_id'])} for emprunt in emprunts]
-        except Exception as e:
-            print(f"Error fetching emprunts: {str(e)}")
+            pipeline = self._pipeline_historique({'abonne_id': ObjectId(abonne_id)},
+                                                 self.archive_service.partitions(), **pagination)
+            emprunts = list(collection(mongo.db, 'emprunts', ANALYTIQUE).aggregate(pipeline))
+            return self._joindre_entites(emprunts, pagination.get('fields'))
+        except Exception:
+            logger.exception("Lecture des emprunts impossible")
             return []
     
-    def get_emprunts(self):
+    def get_historique_emprunts_document(self, document_id, **pagination):
+        # Historique complet d'un document : documents.emprunts n'en garde
+        # que les derniers
         try:
-            emprunts = list(mongo.db.emprunts.find({}))
-            # get the abonne and document 
-            for emprunt in emprunts:
-                emprunt['abonne'] = self.abonne_service.find_by_id(emprunt['abonne_id'])
-                # remove abonne_id from emprunt['abonne']
-                emprunt['document'] = self.document_service.find_by_id(emprunt['document_id'])
-                if emprunt['abonne']:
-                    del emprunt['abonne']['_id']
-                if emprunt['document']:
-                    del emprunt['document']['_id']
-                
-            return [{**emprunt, '_id': str(emprunt['_id']), 'abonne_id': str(emprunt['abonne_id']), 'document_id': str(emprunt['document_id'])} for emprunt in emprunts]
-        except Exception as e:
-            print(f"Error fetching emprunts: {str(e)}")
+            pipeline = self._pipeline_historique({'document_id': ObjectId(document_id)},
+                                                 self.archive_service.partitions(), **pagination)
+            emprunts = list(collection(mongo.db, 'emprunts', ANALYTIQUE).aggregate(pipeline))
+            return self._joindre_entites(emprunts, pagination.get('fields'))
+        except Exception:
+            logger.exception("Lecture des emprunts impossible")
+            return []
+    
+    def get_emprunts(self, **pagination):
+        try:
+            return list(mongo.db.emprunts.aggregate(self._pipeline_jointure(**pagination)))
+        except Exception:
+            logger.exception("Lecture des emprunts impossible")
             return []
         
+    def curseur_export(self, batch_size=TAILLE_LOT):
+        # Emprunts déjà joints, lus lot par lot depuis le curseur d'agrégation
+        emprunts = collection(mongo.db, 'emprunts', ANALYTIQUE)
+        return emprunts.aggregate(self._pipeline_jointure(), batchSize=batch_size)
+
+    def borner_historiques(self, taille=None):
+        """Tronque les historiques embarqués existants à leurs `taille`
+        derniers emprunts (HISTORIQUE_EMBARQUE_MAX par défaut).
+
+        Une mise à jour par pipeline et par collection, limitée aux
+        tableaux trop longs. Renvoie le nombre de documents modifiés.
+        """
+        taille = taille or self.historique_max
+        modifies = {}
+        for nom_collection, champ in self.HISTORIQUES_EMBARQUES:
+            resultat = mongo.db[nom_collection].update_many(
+                {f'{champ}.{taille}': {'$exists': True}},
+                [{'$set': {champ: {'$slice': [f'${champ}', -taille]}}}]
+            )
+            modifies[nom_collection] = resultat.modified_count
+        abonnes_cache.vider()
+        documents_cache.vider()
+        modifiees = [c for c, n in modifies.items() if n]
+        if modifiees:
+            self.version_service.incrementer(*modifiees)
+        return modifies
+
     def delete_emprunt(self, emprunt_id):
         emprunt = mongo.db.emprunts.find_one({'_id': ObjectId(emprunt_id)})
         if not emprunt:
@@ -155,4 +635,9 @@ class EmpruntService:
         
         # Supprimer l'emprunt
         mongo.db.emprunts.delete_one({'_id': ObjectId(emprunt_id)}
-        )
\ No newline at end of file
+        )
+        invalider_entites([emprunt['document_id']], [emprunt['abonne_id']])
+        self.version_service.incrementer(*COLLECTIONS_MOUVEMENT)
+        if emprunt['statut'] != 'retourne':
+            self.compteur_service.incrementer({'emprunts_en_cours': -1})
+        stats_cache.invalidate()
\ No newline at end of file
@@ -0,0 +1,128 @@
+import csv
+import json
+import time
+from collections import Counter
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from app import mongo
+from app.models.document import Document
+from app.services.compteur_service import CompteurService, deltas_mouvement
+from app.services.document_service import DocumentService
+from app.services.version_service import VersionService
+from app.utils.cache import stats_cache
+
+FORMATS_IMPORT = ('csv', 'ndjson')
+# Nombre maximal de rejets détaillés conservés dans le rapport
+MAX_REJETS = 100
+
+def lire_csv(fichier):
+    # line_num : dernière ligne physique lue, en-tête et champs entre
+    # guillemets sur plusieurs lignes compris
+    lecteur = csv.DictReader(fichier)
+    for enregistrement in lecteur:
+        yield lecteur.line_num, enregistrement
+
+class ImportService:
+    """Import en masse du catalogue depuis un fichier CSV ou NDJSON.
+
+    Le fichier est lu ligne à ligne et écrit par lots : la mémoire reste
+    bornée par la taille d'un lot, quelle que soit la taille du fichier.
+    """
+
+    def __init__(self):
+        self.modele = Document
+        self.document_service = DocumentService()
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+
+    def lire(self, fichier, format_import):
+        """Itère sur les couples (ligne du fichier, enregistrement) :
+        dictionnaires pour le CSV, lignes brutes pour le NDJSON (décodées
+        une à une par importer, qui saute les lignes vides)."""
+        if format_import == 'csv':
+            return lire_csv(fichier)
+        if format_import == 'ndjson':
+            return enumerate(fichier, 1)
+        raise ValueError(f"Format d'import inconnu : {format_import}")
+
+    def importer(self, fichier, format_import, taille_lot=1000, progression=None):
+        """Importe un fichier texte ouvert et renvoie un rapport.
+
+        Les notices avec ISBN sont écrites par upsert ($setOnInsert) : une
+        notice déjà présente en base, ou déjà vue dans le fichier, est
+        comptée comme doublon et laissée intacte. `progression` est appelé
+        avec le rapport courant après chaque lot.
+        """
+        rapport = {'lus': 0, 'importes': 0, 'doublons': 0, 'rejets': 0,
+                   'erreurs': [], 'duree': 0.0, 'lignes_par_seconde': 0.0}
+        debut = time.perf_counter()
+        isbn_vus = set()
+        lot, numeros = [], []
+        for numero, enregistrement in self.lire(fichier, format_import):
+            if isinstance(enregistrement, str) and not enregistrement.strip():
+                continue
+            rapport['lus'] += 1
+            try:
+                if isinstance(enregistrement, str):
+                    enregistrement = json.loads(enregistrement)
+                document = self.modele.valider(enregistrement)
+            except (ValueError, AttributeError) as e:
+                self._rejeter(rapport, numero, str(e))
+                continue
+            isbn = document.get('isbn')
+            if isbn:
+                if isbn in isbn_vus:
+                    rapport['doublons'] += 1
+                    continue
+                isbn_vus.add(isbn)
+            lot.append(self.document_service.appliquer_defauts(document))
+            numeros.append(numero)
+            if len(lot) >= taille_lot:
+                self._ecrire_lot(lot, numeros, rapport)
+                lot, numeros = [], []
+                self._avancer(rapport, debut, progression)
+        if lot:
+            self._ecrire_lot(lot, numeros, rapport)
+        self._avancer(rapport, debut, progression)
+        if rapport['importes']:
+            self.version_service.incrementer('documents')
+            stats_cache.invalidate()
+        return rapport
+
+    def _ecrire_lot(self, lot, numeros, rapport):
+        # numeros[i] : ligne du fichier de la notice lot[i]
+        requetes = [
+            UpdateOne({'isbn': d['isbn']}, {'$setOnInsert': d}, upsert=True)
+            if d.get('isbn') else InsertOne(d)
+            for d in lot
+        ]
+        try:
+            resultat = mongo.db.documents.bulk_write(requetes, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            resultat = e.details
+            for erreur in resultat['writeErrors']:
+                self._rejeter(rapport, numeros[erreur['index']], erreur['errmsg'])
+        en_echec = {e['index'] for e in resultat.get('writeErrors', [])}
+        inseres = {u['index'] for u in resultat['upserted']}
+        inseres |= {i for i, d in enumerate(lot) if not d.get('isbn') and i not in en_echec}
+        rapport['importes'] += len(inseres)
+        rapport['doublons'] += sum(1 for i, d in enumerate(lot)
+                                   if d.get('isbn') and i not in inseres and i not in en_echec)
+
+        # Compteurs matérialisés : un seul $inc par lot
+        deltas = Counter()
+        for i in inseres:
+            deltas.update(deltas_mouvement(apres=lot[i]))
+        self.compteur_service.incrementer(deltas)
+
+    def _rejeter(self, rapport, numero, message):
+        rapport['rejets'] += 1
+        if len(rapport['erreurs']) < MAX_REJETS:
+            rapport['erreurs'].append({'ligne': numero, 'error': message})
+
+    def _avancer(self, rapport, debut, progression):
+        rapport['duree'] = round(time.perf_counter() - debut, 3)
+        if rapport['duree']:
+            rapport['lignes_par_seconde'] = round(rapport['lus'] / rapport['duree'], 1)
+        if progression:
+            progression(rapport)
@@ -0,0 +1,101 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from pymongo import UpdateOne
+from app import mongo
+from app.services.version_service import VersionService
+from app.utils.cache import stats_cache
+from config import Config
+
+# Document de la collection stats portant les métriques du balayage
+ID_BALAYAGE = 'balayage_retards'
+
+def a_la_milliseconde(date):
+    # Précision BSON : la date relue doit être égale à celle écrite
+    return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+class RetardService:
+    """Passage des emprunts échus au statut 'retarde'.
+
+    Lancé périodiquement (commande balayer-retards --boucle), le balayage lit
+    les emprunts en cours échus par lots sur l'index partiel
+    en_cours_date_retour_prevue et les marque d'un update_many par lot. Les
+    lectures des retards (voir emprunt_service.en_retard) incluent aussi les
+    emprunts échus pas encore balayés : le worker est facultatif. Chaque lot
+    alimente la file des relances : un document par abonné dans la
+    collection relances, complété tant qu'il n'a pas été envoyé.
+    """
+
+    def __init__(self, taille_lot=None):
+        self.taille_lot = taille_lot or Config.RETARDS_TAILLE_LOT
+        self.version_service = VersionService()
+
+    def balayer(self, maintenant=None):
+        """Marque les emprunts échus à `maintenant` et renvoie le rapport
+        du balayage, également enregistré dans la collection stats."""
+        maintenant = a_la_milliseconde(maintenant or datetime.now())
+        debut = time.perf_counter()
+        lots, relances = [], 0
+        while True:
+            echus = list(mongo.db.emprunts.find(
+                {'statut': 'en_cours', 'date_retour_prevue': {'$lt': maintenant}},
+                {'abonne_id': 1}
+            ).limit(self.taille_lot))
+            if not echus:
+                break
+            ids = [e['_id'] for e in echus]
+            # La condition sur le statut écarte les emprunts retournés entre la
+            # lecture et l'écriture ; date_retard identifie ceux de ce balayage
+            marques = mongo.db.emprunts.update_many(
+                {'_id': {'$in': ids}, 'statut': 'en_cours'},
+                {'$set': {'statut': 'retarde', 'date_retard': maintenant}}
+            ).modified_count
+            if marques != len(ids):
+                confirmes = {e['_id'] for e in mongo.db.emprunts.find(
+                    {'_id': {'$in': ids}, 'date_retard': maintenant}, {'_id': 1})}
+                echus = [e for e in echus if e['_id'] in confirmes]
+            relances += self.mettre_en_file(echus, maintenant)
+            lots.append(marques)
+            if len(ids) < self.taille_lot:
+                break
+
+        rapport = {
+            'date': maintenant,
+            'duree_ms': round((time.perf_counter() - debut) * 1000, 1),
+            'lots': len(lots),
+            'taille_lot': self.taille_lot,
+            'plus_grand_lot': max(lots, default=0),
+            'marques': sum(lots),
+            'relances': relances
+        }
+        mongo.db.stats.update_one({'_id': ID_BALAYAGE}, {
+            '$set': {'dernier': rapport},
+            '$inc': {'executions': 1, 'marques_total': rapport['marques'],
+                     'duree_totale_ms': rapport['duree_ms']}
+        }, upsert=True)
+        if rapport['marques']:
+            self.version_service.incrementer('emprunts')
+            stats_cache.invalidate()
+        return rapport
+
+    def mettre_en_file(self, emprunts, maintenant):
+        """Ajoute les emprunts à la relance en attente de chaque abonné, en
+        un bulk_write. Renvoie le nombre d'abonnés concernés."""
+        par_abonne = defaultdict(list)
+        for emprunt in emprunts:
+            par_abonne[emprunt['abonne_id']].append(str(emprunt['_id']))
+        if not par_abonne:
+            return 0
+        mongo.db.relances.bulk_write([UpdateOne(
+            {'abonne_id': abonne_id, 'statut': 'a_envoyer'},
+            {'$addToSet': {'emprunts': {'$each': ids}},
+             '$set': {'date_maj': maintenant},
+             '$setOnInsert': {'date_creation': maintenant}},
+            upsert=True
+        ) for abonne_id, ids in par_abonne.items()], ordered=False)
+        return len(par_abonne)
+
+    def lire_metriques(self):
+        metriques = mongo.db.stats.find_one({'_id': ID_BALAYAGE}, {'_id': 0})
+        return metriques or {'executions': 0, 'marques_total': 0, 'duree_totale_ms': 0,
+                             'dernier': None}
\ No newline at end of file
@@ -1,30 +1,112 @@
-from app.services.abonne_service import AbonneService
+from datetime import datetime
+from app import mongo
+from app.services.compteur_service import CHAMPS_COMPTEURS, CompteurService
 from app.services.document_service import DocumentService
 from app.services.emprunt_service import EmpruntService
+from app.services.version_service import VersionService
+from app.utils.cache import stats_cache
+
+def fraicheur(horodatage):
+    """Décrit l'âge d'un instantané servi depuis le cache."""
+    return {
+        'snapshotAt': datetime.fromtimestamp(horodatage).isoformat(),
+        'snapshotAgeSeconds': round(datetime.now().timestamp() - horodatage, 3)
+    }
+
+def total_exemplaires(compteurs):
+    # Compteurs antérieurs aux exemplaires : un exemplaire par titre
+    return compteurs.get('exemplaires_total', compteurs['documents_total'])
+
+def comparer_compteurs(reels, stockes):
+    """Écarts entre compteurs stockés et recalculés, par champ."""
+    ecarts = {}
+    for champ in CHAMPS_COMPTEURS:
+        if stockes.get(champ, 0) != reels[champ]:
+            ecarts[champ] = {'stocke': stockes.get(champ, 0), 'reel': reels[champ]}
+    types = set(reels['par_type']) | set(stockes.get('par_type', {}))
+    for type_doc in types:
+        stocke = stockes.get('par_type', {}).get(type_doc, 0)
+        reel = reels['par_type'].get(type_doc, 0)
+        if stocke != reel:
+            ecarts[f'par_type.{type_doc}'] = {'stocke': stocke, 'reel': reel}
+    return ecarts
 
 class StatsService:
+    def __init__(self):
+        self.document_service = DocumentService()
+        self.emprunt_service = EmpruntService()
+        self.compteur_service = CompteurService()
+        self.version_service = VersionService()
+    
+    def lire_compteurs(self):
+        # Un find_one par _id, lu sur le primaire : juste après une écriture
+        # (stats_cache vidé), un secondaire en retard servirait d'anciens
+        # compteurs, mis en cache avec un snapshotAt récent
+        compteurs = self.compteur_service.lire()
+        if compteurs is None:
+            # Premier démarrage, ou compteurs ajoutés depuis : on initialise
+            compteurs = self.reconcilier_compteurs()['compteurs']
+        return compteurs
+    
+    def calculer_stats(self):
+        # Compteurs matérialisés (un find_one) ; seul le retard reste un
+        # comptage, couvert par l'index partiel statut__id
+        compteurs = self.lire_compteurs()
+        return {
+            'empruntsEnCours': compteurs['emprunts_en_cours'],
+            'empruntsEnRetard': self.emprunt_service.get_emprunts_en_retard_count(),
+            'totalDocuments': compteurs['documents_total'],
+            'totalExemplaires': total_exemplaires(compteurs),
+            'totalDocumentsDispo': compteurs['documents_disponibles'],
+            'totalDocumentsEmpruntes': compteurs['documents_empruntes'],
+            'totalAbonnes': compteurs['abonnes_total']
+        }
+    
+    def calculer_stats_documents(self):
+        compteurs = self.lire_compteurs()
+        return {
+            'total': compteurs['documents_total'],
+            'exemplaires': total_exemplaires(compteurs),
+            'disponibles': compteurs['documents_disponibles'],
+            'empruntes': compteurs['documents_empruntes'],
+            'par_type': compteurs['par_type']
+        }
     
     def get_stats(self):
-        documentService = DocumentService()
-        totalDocuments = documentService.count_total()
-        totalDocumentsDispo = documentService.count_disponibles()
-        totalDocumentsEmpruntes = documentService.count_empruntes()
-        
-        abonneService = AbonneService()
-        totalAbonnes = abonneService.get_abonnes_count()
-        
-        empruntService = EmpruntService()
-        empruntsEnCours = empruntService.get_emprunts_count()
-        empruntsEnRetard = empruntService.get_emprunts_en_retard_count()
-        
-        data = {
-            'empruntsEnCours': empruntsEnCours,
-            'empruntsEnRetard': empruntsEnRetard,
-            'totalDocuments': totalDocuments,
-            'totalDocumentsDispo': totalDocumentsDispo,
-            'totalDocumentsEmpruntes': totalDocumentsEmpruntes,
-            'totalAbonnes': totalAbonnes
+        data, horodatage = stats_cache.get_or_compute('dashboard', self.calculer_stats)
+        return {**data, **fraicheur(horodatage)}
+    
+    def get_stats_documents(self):
+        data, horodatage = stats_cache.get_or_compute('documents', self.calculer_stats_documents)
+        return {**data, **fraicheur(horodatage)}
+    
+    def compter_sources(self):
+        """Recalcule les compteurs depuis les collections sources."""
+        documents = self.document_service.get_stats()
+        return {
+            'documents_total': documents['total'],
+            'exemplaires_total': documents['exemplaires'],
+            'documents_disponibles': documents['disponibles'],
+            'documents_empruntes': documents['empruntes'],
+            'abonnes_total': mongo.db.abonnes.count_documents({}),
+            'emprunts_en_cours': self.emprunt_service.get_stats()['en_cours'],
+            'par_type': documents['par_type']
         }
-        
-        return data
-    
\ No newline at end of file
+    
+    def reconcilier_compteurs(self, corriger=True):
+        """Compare les compteurs matérialisés aux collections sources.
+
+        Renvoie les valeurs recalculées et, pour chaque compteur divergent,
+        la valeur stockée et la valeur réelle. Les compteurs sont remplacés
+        sauf si corriger vaut False. Tout est lu sur le primaire : des
+        valeurs en retard d'un secondaire écraseraient des compteurs à jour.
+        """
+        reels = self.compter_sources()
+        stockes = self.compteur_service.lire() or {}
+        ecarts = comparer_compteurs(reels, stockes)
+        if corriger and (ecarts or not stockes):
+            self.compteur_service.remplacer(reels)
+            # /documents/stats sert les compteurs sous la version de documents
+            self.version_service.incrementer('documents')
+            stats_cache.invalidate()
+        return {'compteurs': reels, 'ecarts': ecarts}
\ No newline at end of file
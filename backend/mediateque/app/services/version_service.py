@@ -0,0 +1,32 @@
+from bson import ObjectId
+from app import mongo
+from app.utils.cache import versions_cache
+from app.utils.versions import ID_VERSIONS
+
+class VersionService:
+    """Versions des collections, incrémentées par chaque écriture.
+
+    Un document de la collection stats porte un compteur par collection ;
+    les routes GET en dérivent leur ETag (app.utils.versions). La lecture
+    est servie par versions_cache : invalidé par les écritures du
+    processus et par l'écouteur de change streams, il expire sinon après
+    VERSIONS_CACHE_TTL, ce qui borne la durée pendant laquelle une écriture
+    d'un autre worker peut passer inaperçue.
+    """
+
+    def incrementer(self, *collections):
+        mongo.db.stats.update_one(
+            {'_id': ID_VERSIONS},
+            {'$inc': dict.fromkeys(collections, 1),
+             '$setOnInsert': {'epoque': str(ObjectId())}},
+            upsert=True
+        )
+        versions_cache.invalidate()
+
+    def lire(self):
+        return versions_cache.get_or_compute('versions', self._charger)[0]
+
+    def _charger(self):
+        # Sur le primaire : une version en retard sur les données servirait
+        # un 304 pour une représentation périmée
+        return mongo.db.stats.find_one({'_id': ID_VERSIONS}) or {}
\ No newline at end of file
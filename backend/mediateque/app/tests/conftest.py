@@ -1,5 +1,26 @@
 import os
 import sys
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 # Add the parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
\ No newline at end of file
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Les tests d'intégration tournent contre une vraie instance : MONGO_TEST_URI=mongodb://...
+MONGO_TEST_URI = os.getenv('MONGO_TEST_URI')
+
+
+def client_test(**kwargs):
+    """Ouvre un client vers MONGO_TEST_URI ou saute le test."""
+    if not MONGO_TEST_URI:
+        pytest.skip('MONGO_TEST_URI non défini')
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=2000, **kwargs)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        pytest.skip('MongoDB injoignable')
+    return client
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "flask_seulement: route absente de l'API asyncio (app.aio)")
@@ -0,0 +1,73 @@
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from flask import Flask
+from conftest import client_test
+from app import mongo
+from app.services.emprunt_service import EmpruntService
+from app.utils.cache import stats_cache
+
+NB_CONCURRENTS = 32
+
+
+@pytest.fixture
+def replica_set():
+    client = client_test()
+    if not client.admin.command('hello').get('setName'):
+        pytest.skip('Les transactions exigent un replica set')
+    db = client['mediatheque_test_concurrence']
+    client.drop_database(db.name)
+    anciens = (mongo.cx, mongo.db)
+    mongo.cx, mongo.db = client, db
+    app = Flask(__name__)
+    app.config['MONGO_TRANSACTIONS'] = True
+    yield app, db
+    mongo.cx, mongo.db = anciens
+    stats_cache.invalidate()
+    client.drop_database(db.name)
+    client.close()
+
+
+def test_parallel_checkouts_single_winner(replica_set, record_property):
+    app, db = replica_set
+    document_id = db.documents.insert_one({'titre': 'Exemplaire unique', 'disponible': True,
+                                           'emprunts': []}).inserted_id
+    abonnes = db.abonnes.insert_many([{'nom': f'Abonné {i}', 'emprunts_actuels': [],
+                                       'historique_emprunts': []}
+                                      for i in range(NB_CONCURRENTS)]).inserted_ids
+    service = EmpruntService()
+
+    def emprunter(abonne_id):
+        with app.app_context():
+            try:
+                return service.creer_emprunt(str(abonne_id), str(document_id))
+            except ValueError:
+                return None
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=NB_CONCURRENTS) as executor:
+        resultats = list(executor.map(emprunter, abonnes))
+    duree = time.perf_counter() - debut
+
+    reussis = [r for r in resultats if r]
+    assert len(reussis) == 1
+    assert db.emprunts.count_documents({'document_id': document_id}) == 1
+    document = db.documents.find_one({'_id': document_id})
+    assert document['disponible'] is False
+    assert document['emprunts'] == reussis
+    assert db.abonnes.count_documents({'emprunts_actuels': {'$ne': []}}) == 1
+
+    debit = NB_CONCURRENTS / duree
+    record_property('checkouts_par_seconde', round(debit, 1))
+    print(f'{NB_CONCURRENTS} emprunts concurrents en {duree * 1000:.0f} ms ({debit:.0f}/s)')
+
+
+def test_unknown_subscriber_rolls_back_claim(replica_set):
+    app, db = replica_set
+    document_id = db.documents.insert_one({'titre': 'Livre', 'disponible': True,
+                                           'emprunts': []}).inserted_id
+    with app.app_context(), pytest.raises(ValueError, match='Abonné non trouvé'):
+        EmpruntService().creer_emprunt(str(ObjectId()), str(document_id))
+    assert db.documents.find_one({'_id': document_id})['disponible'] is True
+    assert db.emprunts.count_documents({}) == 0
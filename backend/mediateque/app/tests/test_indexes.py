@@ -0,0 +1,125 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from bson import ObjectId
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+from conftest import client_test
+from app import mongo
+from app.indexes import INDEXES, ensure_indexes
+from app.services.abonne_service import AbonneService
+from app.services.document_service import DocumentService
+from app.services.emprunt_service import EmpruntService
+from app.services.retard_service import RetardService
+
+COMMANDES_EXPLICABLES = ('find', 'aggregate', 'count', 'distinct')
+
+
+class CommandCapture(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in COMMANDES_EXPLICABLES:
+            command = {k: v for k, v in event.command.items()
+                       if k not in ('lsid', '$db', '$clusterTime', '$readPreference')}
+            self.commands.append(command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def collscans(explain):
+    """Parcourt un résultat d'explain() et liste les étapes COLLSCAN retenues."""
+    trouves = []
+    if isinstance(explain, dict):
+        if explain.get('stage') == 'COLLSCAN':
+            trouves.append(explain)
+        for cle, valeur in explain.items():
+            if cle != 'rejectedPlans':
+                trouves += collscans(valeur)
+    elif isinstance(explain, list):
+        for valeur in explain:
+            trouves += collscans(valeur)
+    return trouves
+
+
+@pytest.fixture(scope='module')
+def mongo_reel():
+    capture = CommandCapture()
+    client = client_test(event_listeners=[capture])
+    db = client['mediatheque_test_index']
+    client.drop_database(db.name)
+    ensure_indexes(db)
+
+    # Un peu de volume pour que le planificateur ait un vrai choix
+    abonnes = [{'_id': ObjectId(), 'nom': f'N{i}'} for i in range(50)]
+    documents = [{'_id': ObjectId(), 'titre': f'T{i}', 'type': ['livre', 'dvd'][i % 2],
+                  'disponible': i % 3 != 0} for i in range(200)]
+    maintenant = datetime.now()
+    emprunts = [{'abonne_id': abonnes[i % 50]['_id'], 'document_id': documents[i % 200]['_id'],
+                 'date_emprunt': maintenant - timedelta(days=i % 30),
+                 'date_retour_prevue': maintenant + timedelta(days=14 - i % 30),
+                 'statut': ['en_cours', 'retourne', 'retarde'][i % 3]} for i in range(1000)]
+    db.abonnes.insert_many(abonnes)
+    db.documents.insert_many(documents)
+    db.emprunts.insert_many(emprunts)
+
+    anciens = (mongo.cx, mongo.db)
+    mongo.cx, mongo.db = client, db
+    yield db, capture, abonnes[0]['_id']
+    mongo.cx, mongo.db = anciens
+    client.drop_database(db.name)
+    client.close()
+
+
+def requetes_services(abonne_id):
+    documents = DocumentService()
+    emprunts = EmpruntService()
+    abonnes = AbonneService()
+    return {
+        'emprunts en retard': lambda: emprunts.get_emprunts_en_retard(),
+        'compte en retard': lambda: emprunts.get_emprunts_en_retard_count(),
+        'compte en cours': lambda: emprunts.get_emprunts_count(),
+        'historique abonné': lambda: emprunts.get_historique_emprunts_abonne(abonne_id),
+        'historique document': lambda: emprunts.get_historique_emprunts_document(ObjectId()),
+        'documents par type': lambda: documents.find_by_type('livre'),
+        'documents disponibles': lambda: documents.find_by_disponibilite(True),
+        'compte disponibles': lambda: documents.count_disponibles(),
+        'compte par type': lambda: documents.count_par_type(),
+        'types': lambda: documents.get_types(),
+        'recherche': lambda: documents.search('T1', limit=20),
+        'page documents': lambda: documents.find_all(limit=20, after=None, fields=None),
+        'page abonnés': lambda: abonnes.find_all(limit=20, after=None, fields=None),
+        'page emprunts': lambda: emprunts.get_emprunts(limit=20, after=None, fields=None),
+        # En dernier : le balayage modifie les statuts
+        'balayage retards': lambda: RetardService(taille_lot=50).balayer(),
+    }
+
+
+@pytest.mark.parametrize('nom', list(requetes_services(None)))
+def test_service_query_uses_index(mongo_reel, nom):
+    db, capture, abonne_id = mongo_reel
+    capture.commands.clear()
+    requetes_services(abonne_id)[nom]()
+    assert capture.commands, f'{nom} : aucune commande capturée'
+    for command in capture.commands:
+        explain = db.command('explain', command, verbosity='queryPlanner')
+        assert not collscans(explain), f'{nom} : COLLSCAN pour {command}'
+
+
+def test_ensure_indexes_recreates_conflicting_index():
+    db = {nom: MagicMock() for nom in INDEXES}
+    collection = db['emprunts']
+    collection.create_indexes.side_effect = [
+        OperationFailure('conflict', code=85), ['recree']
+    ]
+    collection.index_information.return_value = {
+        index.document['name']: {} for index in INDEXES['emprunts']
+    }
+    ensure_indexes(db)
+    dropped = [c.args[0] for c in collection.drop_index.call_args_list]
+    assert dropped == [index.document['name'] for index in INDEXES['emprunts']]
@@ -0,0 +1,107 @@
+import pytest
+from flask import Flask
+from pymongo import MongoClient, monitoring
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+from conftest import client_test
+from app import mongo
+from app.indexes import ensure_indexes
+from app.services.abonne_service import AbonneService
+from app.services.document_service import DocumentService
+from app.services.emprunt_service import EmpruntService
+from app.services.stats_service import StatsService
+from app.utils.cache import stats_cache
+from app.utils.politiques import ANALYTIQUE, CRITIQUE, collection
+from config import Config
+
+
+class ServeursCapture(monitoring.CommandListener):
+    """Note le membre du replica set qui a servi chaque commande."""
+
+    def __init__(self):
+        self.commandes = []
+
+    def started(self, event):
+        self.commandes.append((event.command_name, event.connection_id))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def test_policies_applied_to_collections():
+    db = MongoClient(connect=False)['mediatheque']
+    analytique = collection(db, 'emprunts', ANALYTIQUE)
+    assert analytique.read_preference == SecondaryPreferred(
+        max_staleness=Config.MONGO_MAX_STALENESS_SECONDS)
+    critique = collection(db, 'emprunts', CRITIQUE)
+    assert critique.read_preference.mongos_mode == 'primary'
+    assert critique.read_concern.level == 'majority'
+    assert critique.write_concern.document == {'w': 'majority'}
+    assert collection(db, 'emprunts').read_preference == db.read_preference
+
+
+@pytest.fixture
+def replica_set():
+    capture = ServeursCapture()
+    client = client_test(event_listeners=[capture])
+    if not client.admin.command('hello').get('setName'):
+        pytest.skip('Le routage des lectures exige un replica set')
+    if not client.secondaries:
+        pytest.skip('Aucun secondaire joignable')
+    db = client.get_database('mediatheque_test_politiques',
+                             write_concern=WriteConcern(w='majority'))
+    client.drop_database(db.name)
+    ensure_indexes(db)
+    anciens = (mongo.cx, mongo.db)
+    mongo.cx, mongo.db = client, db
+    app = Flask(__name__)
+    app.config['MONGO_TRANSACTIONS'] = True
+    yield app, client, capture
+    mongo.cx, mongo.db = anciens
+    stats_cache.invalidate()
+    client.drop_database(db.name)
+    client.close()
+
+
+def membres(capture, operation):
+    capture.commandes.clear()
+    operation()
+    return {adresse for commande, adresse in capture.commandes
+            if commande not in ('endSessions', 'commitTransaction', 'abortTransaction')}
+
+
+def test_each_query_class_served_by_expected_member(replica_set):
+    app, client, capture = replica_set
+    with app.app_context():
+        document_id = DocumentService().create({'titre': 'Le Petit Prince', 'auteur': 'Saint-Exupéry',
+                                                'type': 'livre'})
+        abonne_id = AbonneService().create({'nom': 'Dupont'})
+        StatsService().reconcilier_compteurs()
+        emprunts = EmpruntService()
+
+        emprunt_id = None
+
+        def emprunter():
+            nonlocal emprunt_id
+            emprunt_id = emprunts.creer_emprunt(abonne_id, document_id)
+
+        critiques = {
+            'emprunt': emprunter,
+            'retour': lambda: emprunts.enregistrer_retour(emprunt_id),
+            # Compteurs du tableau de bord relus juste après les écritures
+            'compteurs': lambda: StatsService().lire_compteurs()
+        }
+        analytiques = {
+            'retards': emprunts.get_emprunts_en_retard_count,
+            'export': lambda: list(DocumentService().curseur_export()),
+            'recherche': lambda: DocumentService().search('prince'),
+            'historique': lambda: emprunts.get_historique_emprunts_abonne(abonne_id)
+        }
+        for nom, operation in critiques.items():
+            assert membres(capture, operation) == {client.primary}, nom
+        for nom, operation in analytiques.items():
+            servis = membres(capture, operation)
+            assert servis and servis <= client.secondaries, nom
\ No newline at end of file
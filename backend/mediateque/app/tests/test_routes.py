@@ -1,22 +1,125 @@
+import asyncio
+import importlib.util
+import io
 import pytest
+from contextlib import contextmanager
 from flask import Flask, json
-from unittest.mock import Mock, patch
-from bson import ObjectId
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from datetime import datetime, timedelta
+from bson import Decimal128, ObjectId
+from pymongo.errors import PyMongoError
+from config import Config
+from app.utils.serialisation import ReponseJSON
 # from app.routes import documents, emprunts, abonnes
-from routes import documents, emprunts, abonnes
+from routes import documents, emprunts, abonnes, metriques, stats
+from app import instrumenter
+
+# Les mêmes tests passent contre l'API Flask et sa variante asyncio (app.aio)
+AIO = importlib.util.find_spec('quart') is not None
+
+
+class ClientSynchrone:
+    """Client de test Quart présenté avec l'interface du client Flask."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def _requete(self, url, **kwargs):
+        response = await self.app.test_client().open(url, **kwargs)
+        return SimpleNamespace(status_code=response.status_code, mimetype=response.mimetype,
+                               headers=response.headers, data=await response.get_data())
+
+    def open(self, url, method='GET', **kwargs):
+        return asyncio.run(self._requete(url, method=method, **kwargs))
+
+    def get(self, url, **kwargs):
+        return self.open(url, 'GET', **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.open(url, 'POST', **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.open(url, 'PUT', **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.open(url, 'DELETE', **kwargs)
+
+
+@contextmanager
+def patch_service(cible):
+    """Remplace une méthode de service Flask et son équivalent asyncio ; le
+    mock asynchrone délègue au mock renvoyé, qui porte les assertions."""
+    with patch(cible) as mock:
+        if not AIO:
+            yield mock
+            return
+        cible_aio = cible.replace('app.services.', 'app.aio.services.', 1)
+        with patch(cible_aio, new_callable=AsyncMock,
+                   side_effect=lambda *args, **kwargs: mock(*args, **kwargs)):
+            yield mock
+
 
 # Fixtures
 @pytest.fixture
 def app():
     app = Flask(__name__)
+    app.json = ReponseJSON(app)
+    app.config.from_object(Config)
     app.register_blueprint(documents.bp)
     app.register_blueprint(emprunts.bp)
     app.register_blueprint(abonnes.bp)
+    app.register_blueprint(stats.bp)
+    app.register_blueprint(metriques.bp)
+    instrumenter(app)
     return app
 
 @pytest.fixture
-def client(app):
-    return app.test_client()
+def app_aio():
+    from quart import Quart
+    from app.aio import instrumenter as instrumenter_aio
+    from app.aio.routes import abonnes as abonnes_aio
+    from app.aio.routes import documents as documents_aio
+    from app.aio.routes import emprunts as emprunts_aio
+    from app.aio.routes import metriques as metriques_aio
+    from app.aio.routes import stats as stats_aio
+    app = Quart(__name__)
+    app.json = ReponseJSON(app)
+    app.config.from_object(Config)
+    app.register_blueprint(documents_aio.bp)
+    app.register_blueprint(emprunts_aio.bp)
+    app.register_blueprint(abonnes_aio.bp)
+    app.register_blueprint(stats_aio.bp)
+    app.register_blueprint(metriques_aio.bp)
+    instrumenter_aio(app)
+    return app
+
+@pytest.fixture(params=['flask', 'quart'])
+def client(request, app):
+    if request.param == 'flask':
+        return app.test_client()
+    if not AIO:
+        pytest.skip('Quart non installé')
+    if request.node.get_closest_marker('flask_seulement'):
+        pytest.skip("Route absente de l'API asyncio")
+    return ClientSynchrone(request.getfixturevalue('app_aio'))
+
+@pytest.fixture(autouse=True)
+def versions():
+    """Versions des collections lues par les routes conditionnelles ; le
+    mock asynchrone délègue au mock synchrone, qui porte les assertions."""
+    from app.utils.cache import versions_cache
+    versions_cache.invalidate()
+    with patch('app.services.version_service.mongo') as mock:
+        mock.db.stats.find_one.return_value = {'epoque': 'e', 'documents': 3, 'abonnes': 2}
+        if not AIO:
+            yield mock
+        else:
+            with patch('app.aio.services.version_service.mongo') as mock_aio:
+                mock_aio.db.stats.find_one = AsyncMock(
+                    side_effect=lambda *args, **kwargs: mock.db.stats.find_one(*args, **kwargs))
+                yield mock
+    versions_cache.invalidate()
 
 @pytest.fixture
 def sample_document():
@@ -40,7 +143,7 @@ def sample_abonne():
 # Document Tests
 class TestDocuments:
     def test_get_documents_success(self, client):
-        with patch('app.services.document_service.DocumentService.find_all') as mock_find_all:
+        with patch_service('app.services.document_service.DocumentService.find_all') as mock_find_all:
             mock_find_all.return_value = [
                 {'_id': ObjectId(), 'titre': 'Test Book', 'auteur': 'Test Author', 'type': 'livre'}
             ]
@@ -52,7 +155,7 @@ class TestDocuments:
             assert 'titre' in data[0]
 
     def test_get_documents_search(self, client):
-        with patch('app.services.document_service.DocumentService.search') as mock_search:
+        with patch_service('app.services.document_service.DocumentService.search') as mock_search:
             mock_search.return_value = [
                 {'_id': ObjectId(), 'titre': 'Search Result', 'auteur': 'Author', 'type': 'livre'}
             ]
@@ -62,8 +165,130 @@ class TestDocuments:
             assert isinstance(data, list)
             assert len(data) > 0
 
+    def test_search_documents_ranked_cursor(self, client):
+        with patch_service('app.services.document_service.DocumentService.search') as mock_search:
+            doc_id = ObjectId()
+            mock_search.return_value = [
+                {'_id': ObjectId(), 'titre': 'Le Petit Prince', 'score': 12.5},
+                {'_id': doc_id, 'titre': 'Le Prince', 'score': 7.25}
+            ]
+            response = client.get('/documents?search=prince&limit=2')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['next_cursor'] == f'7.25_{doc_id}'
+            response = client.get(f"/documents?search=prince&limit=2&after={data['next_cursor']}")
+            assert response.status_code == 200
+            assert client.get(f'/documents?search=prince&after={doc_id}').status_code == 400
+
+    def test_get_documents_paginated(self, client):
+        with patch_service('app.services.document_service.DocumentService.find_all') as mock_find_all:
+            docs = [{'_id': ObjectId(), 'titre': f'Livre {i}'} for i in range(2)]
+            mock_find_all.return_value = docs
+            response = client.get('/documents?limit=2&fields=titre')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert len(data['data']) == 2
+            assert data['next_cursor'] == str(docs[-1]['_id'])
+            mock_find_all.assert_called_once_with(limit=2, after=None, fields=['titre'])
+
+    def test_get_documents_last_page(self, client):
+        with patch_service('app.services.document_service.DocumentService.find_all') as mock_find_all:
+            mock_find_all.return_value = [{'_id': ObjectId(), 'titre': 'Livre'}]
+            after = str(ObjectId())
+            response = client.get(f'/documents?limit=2&after={after}')
+            data = json.loads(response.data)
+            assert data['next_cursor'] is None
+            mock_find_all.assert_called_once_with(limit=2, after=after, fields=None)
+
+    def test_get_documents_invalid_pagination(self, client):
+        assert client.get('/documents?limit=0').status_code == 400
+        assert client.get('/documents?limit=abc').status_code == 400
+        assert client.get('/documents?after=pas-un-id').status_code == 400
+
+    @pytest.mark.flask_seulement
+    def test_export_documents_ndjson(self, client):
+        with patch('app.services.document_service.DocumentService.curseur_export') as mock_export:
+            mock_export.return_value = MagicMock()
+            mock_export.return_value.__iter__.return_value = iter([
+                {'_id': ObjectId(), 'titre': 'Livre 1', 'date_ajout': datetime(2024, 3, 1)},
+                {'_id': ObjectId(), 'titre': 'Livre 2', 'date_ajout': datetime(2024, 3, 2)}
+            ])
+            response = client.get('/documents/export?format=ndjson')
+            assert response.status_code == 200
+            assert response.mimetype == 'application/x-ndjson'
+            lines = response.data.decode().splitlines()
+            assert [json.loads(line)['titre'] for line in lines] == ['Livre 1', 'Livre 2']
+            assert json.loads(lines[0])['date_ajout'] == '2024-03-01T00:00:00'
+            mock_export.return_value.close.assert_called_once()
+
+    @pytest.mark.flask_seulement
+    def test_export_documents_csv(self, client):
+        with patch('app.services.document_service.DocumentService.curseur_export') as mock_export:
+            mock_export.return_value = MagicMock()
+            mock_export.return_value.__iter__.return_value = iter([
+                {'_id': ObjectId(), 'titre': 'Livre, tome 1', 'auteur': 'Auteur', 'disponible': True}
+            ])
+            response = client.get('/documents/export?format=csv')
+            assert response.status_code == 200
+            lines = response.data.decode().splitlines()
+            assert lines[0].startswith('_id,titre,auteur,type')
+            assert '"Livre, tome 1",Auteur' in lines[1]
+            # Seules les colonnes exportées sont lues
+            mock_export.assert_called_once_with(colonnes=documents.service.COLONNES_EXPORT)
+
+    @pytest.mark.flask_seulement
+    def test_export_query_failure_returns_json_error(self, client):
+        with patch('app.services.emprunt_service.EmpruntService.curseur_export') as mock_export:
+            mock_export.return_value = MagicMock()
+            mock_export.return_value.__iter__.side_effect = PyMongoError('connexion perdue')
+            response = client.get('/emprunts/export')
+            assert response.status_code == 500
+            assert json.loads(response.data) == {'error': 'connexion perdue'}
+            mock_export.return_value.close.assert_called_once()
+
+    @pytest.mark.flask_seulement
+    def test_export_unknown_format(self, client):
+        with patch('app.services.document_service.DocumentService.curseur_export') as mock_export:
+            response = client.get('/documents/export?format=xml')
+            assert response.status_code == 400
+            mock_export.assert_not_called()
+
+    @pytest.mark.flask_seulement
+    def test_import_documents_upload(self, client):
+        with patch('app.services.import_service.ImportService.importer') as mock_import:
+            mock_import.return_value = {'lus': 2, 'importes': 2}
+            response = client.post('/documents/import', data={
+                'fichier': (io.BytesIO(b'titre,auteur,type\nA,B,livre\n'), 'catalogue.csv')
+            })
+            assert response.status_code == 201
+            assert json.loads(response.data)['importes'] == 2
+            assert mock_import.call_args[0][1] == 'csv'
+
+    @pytest.mark.flask_seulement
+    def test_import_documents_unknown_format(self, client):
+        response = client.post('/documents/import', data={
+            'fichier': (io.BytesIO(b'<xml/>'), 'catalogue.xml')
+        })
+        assert response.status_code == 400
+
+    def test_get_document_bson_types(self, client):
+        with patch_service('app.services.document_service.DocumentService.find_by_id') as mock_find:
+            doc_id, emprunt_id = ObjectId(), ObjectId()
+            mock_find.return_value = {
+                '_id': doc_id, 'titre': 'Livre', 'prix': Decimal128('12.50'),
+                'date_ajout': datetime(2024, 3, 1, 10, 30),
+                'dernier_emprunt': {'_id': emprunt_id}
+            }
+            response = client.get(f'/documents/{doc_id}')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['_id'] == str(doc_id)
+            assert data['prix'] == '12.50'
+            assert data['date_ajout'] == '2024-03-01T10:30:00+00:00'
+            assert data['dernier_emprunt'] == {'_id': str(emprunt_id)}
+
     def test_create_document_success(self, client, sample_document):
-        with patch('app.services.document_service.DocumentService.create') as mock_create:
+        with patch_service('app.services.document_service.DocumentService.create') as mock_create:
             mock_create.return_value = ObjectId()
             response = client.post('/documents',
                                  json={
@@ -83,7 +308,7 @@ class TestDocuments:
         assert 'required_fields' in data
 
     def test_update_document_success(self, client, sample_document):
-        with patch('app.services.document_service.DocumentService.update') as mock_update:
+        with patch_service('app.services.document_service.DocumentService.update') as mock_update:
             doc_id = sample_document['_id']
             response = client.put(f'/documents/{doc_id}',
                                 json={'titre': 'Updated Title'})
@@ -94,7 +319,7 @@ class TestDocuments:
 # Emprunt Tests
 class TestEmprunts:
     def test_creer_emprunt_success(self, client):
-        with patch('app.services.emprunt_service.EmpruntService.creer_emprunt') as mock_create:
+        with patch_service('app.services.emprunt_service.EmpruntService.creer_emprunt') as mock_create:
             mock_create.return_value = ObjectId()
             response = client.post('/emprunts',
                                  json={
@@ -110,15 +335,51 @@ class TestEmprunts:
         assert response.status_code == 500
 
     def test_enregistrer_retour_success(self, client):
-        with patch('app.services.emprunt_service.EmpruntService.enregistrer_retour') as mock_return:
+        with patch_service('app.services.emprunt_service.EmpruntService.enregistrer_retour') as mock_return:
             emprunt_id = str(ObjectId())
             response = client.post(f'/emprunts/{emprunt_id}/retour')
             assert response.status_code == 200
             data = json.loads(response.data)
             assert data['message'] == 'Retour enregistré'
 
+    @pytest.mark.flask_seulement
+    def test_bulk_retours(self, client):
+        with patch('app.services.emprunt_service.EmpruntService.enregistrer_retours_bulk') as mock_bulk:
+            mock_bulk.return_value = [
+                {'index': 0, 'statut': 'retourne', 'id': 'a'},
+                {'index': 1, 'statut': 'erreur', 'error': 'Emprunt non trouvé'}
+            ]
+            response = client.post('/emprunts/retours/bulk', json={'ids': ['a', 'b']})
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['retournes'] == 1
+            assert len(data['resultats']) == 2
+            mock_bulk.assert_called_once_with(['a', 'b'])
+
+    @pytest.mark.flask_seulement
+    def test_bulk_emprunts_requires_list(self, client):
+        response = client.post('/emprunts/bulk', json={'emprunts': 'x'})
+        assert response.status_code == 400
+
+    @pytest.mark.flask_seulement
+    def test_bulk_emprunts_too_many(self, client):
+        with patch('app.services.emprunt_service.EmpruntService.creer_emprunts_bulk') as mock_bulk:
+            mock_bulk.side_effect = ValueError('Au plus 500 demandes par requête')
+            response = client.post('/emprunts/bulk', json={'emprunts': [{}] * 501})
+            assert response.status_code == 400
+
+    def test_get_emprunts_document_paginated(self, client):
+        with patch_service('app.services.emprunt_service.EmpruntService.get_historique_emprunts_document') as mock_hist:
+            document_id = str(ObjectId())
+            mock_hist.return_value = [{'_id': str(ObjectId()), 'statut': 'retourne'}]
+            response = client.get(f'/emprunts/document/{document_id}?limit=5')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['next_cursor'] is None
+            mock_hist.assert_called_once_with(document_id, limit=5, after=None, fields=None)
+
     def test_get_retards_success(self, client):
-        with patch('app.services.emprunt_service.EmpruntService.get_emprunts_en_retard') as mock_retards:
+        with patch_service('app.services.emprunt_service.EmpruntService.get_emprunts_en_retard') as mock_retards:
             mock_retards.return_value = [
                 {'_id': ObjectId(), 'abonne_id': ObjectId(), 'document_id': ObjectId(), 'date_retour_prevue': '2024-03-01'}
             ]
@@ -126,11 +387,34 @@ class TestEmprunts:
             assert response.status_code == 200
             data = json.loads(response.data)
             assert isinstance(data, list)
+            assert data[0]['abonne_id'] == str(mock_retards.return_value[0]['abonne_id'])
+
+    def test_get_balayage_retards(self, client):
+        with patch_service('app.services.retard_service.RetardService.lire_metriques') as mock_metriques:
+            mock_metriques.return_value = {'executions': 2, 'marques_total': 5,
+                                           'dernier': {'date': datetime(2024, 3, 1), 'lots': 3}}
+            response = client.get('/emprunts/en-retard/balayage')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['marques_total'] == 5
+            assert data['dernier']['date'] == '2024-03-01T00:00:00+00:00'
+
+    def test_get_archivage(self, client):
+        with patch_service('app.services.archive_service.ArchiveService.lire_metriques') as mock_metriques:
+            mock_metriques.return_value = {'chaud': {'emprunts': 10, 'en_cours': 4, 'retournes': 6},
+                                           'archives': {'emprunts_archive_2023': 7},
+                                           'archives_total': 7, 'executions': 1,
+                                           'dernier': {'date': datetime(2024, 3, 1), 'archives': 7}}
+            response = client.get('/emprunts/archivage')
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert data['chaud']['retournes'] == 6
+            assert data['archives'] == {'emprunts_archive_2023': 7}
 
 # Abonné Tests
 class TestAbonnes:
     def test_get_abonnes_success(self, client):
-        with patch('app.services.abonne_service.AbonneService.find_all') as mock_find_all:
+        with patch_service('app.services.abonne_service.AbonneService.find_all') as mock_find_all:
             mock_find_all.return_value = [
                 {'_id': ObjectId(), 'nom': 'Dupont', 'prenom': 'Jean', 'email': 'jean@email.com'}
             ]
@@ -141,7 +425,7 @@ class TestAbonnes:
             assert len(data) > 0
 
     def test_create_abonne_success(self, client, sample_abonne):
-        with patch('app.services.abonne_service.AbonneService.create') as mock_create:
+        with patch_service('app.services.abonne_service.AbonneService.create') as mock_create:
             mock_create.return_value = ObjectId()
             response = client.post('/abonnes',
                                  json={
@@ -154,7 +438,7 @@ class TestAbonnes:
             assert 'id' in data
 
     def test_get_abonne_not_found(self, client):
-        with patch('app.services.abonne_service.AbonneService.find_by_id') as mock_find:
+        with patch_service('app.services.abonne_service.AbonneService.find_by_id') as mock_find:
             mock_find.return_value = None
             response = client.get(f'/abonnes/{str(ObjectId())}')
             assert response.status_code == 404
@@ -162,7 +446,7 @@ class TestAbonnes:
             assert 'error' in data
 
     def test_update_abonne_success(self, client, sample_abonne):
-        with patch('app.services.abonne_service.AbonneService.update') as mock_update:
+        with patch_service('app.services.abonne_service.AbonneService.update') as mock_update:
             abonne_id = sample_abonne['_id']
             response = client.put(f'/abonnes/{abonne_id}',
                                 json={'nom': 'Updated Name'})
@@ -171,9 +455,185 @@ class TestAbonnes:
             assert data['message'] == 'Abonné mis à jour'
 
     def test_delete_abonne_success(self, client):
-        with patch('app.services.abonne_service.AbonneService.delete') as mock_delete:
+        with patch_service('app.services.abonne_service.AbonneService.delete') as mock_delete:
             abonne_id = str(ObjectId())
             response = client.delete(f'/abonnes/{abonne_id}')
             assert response.status_code == 200
             data = json.loads(response.data)
-            assert data['message'] == 'Abonné supprimé'
\ No newline at end of file
+            assert data['message'] == 'Abonné supprimé'
+
+
+# Flux Server-Sent Events
+class TestFlux:
+    def ouvrir(self, client, **headers):
+        config = (client.application if hasattr(client, 'application') else client.app).config
+        config.update(FLUX_DUREE_SECONDES=0.2, FLUX_DUREE_THREAD_SECONDES=0.2,
+                      FLUX_HEARTBEAT_SECONDES=0.05, FLUX_STATS_INTERVALLE_SECONDES=0,
+                      FLUX_RECONNEXION_SECONDES=5)
+        with patch_service('app.services.stats_service.StatsService.get_stats') as mock_stats:
+            mock_stats.return_value = {'empruntsEnCours': 3}
+            response = client.get('/stats/flux', headers=headers)
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            # Flask lit le flux à la demande : tant que le service est remplacé
+            return response.data.decode()
+
+    def test_flux_replays_missed_events_and_pushes_stats(self, client):
+        from app.utils.changements import ecouteur
+        vu, manque = [{'id': str(ObjectId()), 'type': 'disponibilite',
+                       'data': {'collection': 'documents', 'id': 'd1', 'disponible': d}}
+                      for d in (True, False)]
+        ecouteur.diffuser(vu)
+        ecouteur.diffuser(manque)
+        texte = self.ouvrir(client, **{'Last-Event-ID': vu['id']})
+        assert vu['id'] not in texte
+        assert f"id: {manque['id']}\nevent: disponibilite\ndata: " in texte
+        assert '"disponible":false' in texte
+        assert texte.startswith('retry: 5000\n\nevent: stats\ndata: {"empruntsEnCours":3}\n\n')
+        assert ': ping\n\n' in texte
+
+    def test_flux_unknown_last_event_id_resets(self, client):
+        texte = self.ouvrir(client, **{'Last-Event-ID': 'inconnu'})
+        assert 'event: reset\ndata: {}' in texte
+
+    @pytest.mark.flask_seulement
+    def test_flux_over_thread_limit_sends_stats_only(self, client):
+        from app.utils.changements import ecouteur
+        client.application.config['FLUX_CONNEXIONS_THREAD'] = 1
+        ouvert = ecouteur.abonner()
+        try:
+            texte = self.ouvrir(client, **{'Last-Event-ID': 'inconnu'})
+        finally:
+            ecouteur.desabonner(ouvert)
+        # Ni rejeu ni attente : le thread est rendu tout de suite
+        assert texte == 'retry: 5000\n\nevent: stats\ndata: {"empruntsEnCours":3}\n\n'
+
+
+# Cumuls d'emprunts
+class TestCumuls:
+    def test_timeseries_reads_rollups_for_period(self, client):
+        with patch_service('app.services.cumul_service.CumulService.get_series') as mock_series:
+            mock_series.return_value = {'granularite': 'semaine', 'series': [], 'filigrane': None}
+            response = client.get('/stats/timeseries?debut=2024-01-01&fin=2024-02-01'
+                                  '&granularite=semaine&type=livre')
+            assert response.status_code == 200
+            mock_series.assert_called_once_with(granularite='semaine', debut=datetime(2024, 1, 1),
+                                                fin=datetime(2024, 2, 1), type_doc='livre')
+
+    @pytest.mark.parametrize('requete', ['/stats/timeseries?granularite=heure',
+                                         '/stats/timeseries?debut=hier',
+                                         '/stats/timeseries?debut=2024-02-01&fin=2024-01-01',
+                                         '/stats/top-documents?limit=1000'])
+    def test_invalid_parameters_rejected(self, client, requete):
+        with patch_service('app.services.cumul_service.CumulService.get_series') as mock_series, \
+                patch_service('app.services.cumul_service.CumulService.get_top_documents') as mock_top:
+            assert client.get(requete).status_code == 400
+            mock_series.assert_not_called()
+            mock_top.assert_not_called()
+
+    def test_top_documents_defaults_to_last_30_days(self, client):
+        document_id = ObjectId()
+        with patch_service('app.services.cumul_service.CumulService.get_top_documents') as mock_top:
+            mock_top.return_value = {'documents': [{'rang': 1, 'document_id': document_id,
+                                                    'emprunts': 4}], 'filigrane': None}
+            response = client.get('/stats/top-documents?limit=5')
+            assert response.status_code == 200
+            assert json.loads(response.data)['documents'][0]['document_id'] == str(document_id)
+            appel = mock_top.call_args[1]
+            assert appel['limite'] == 5 and appel['type_doc'] is None
+            assert appel['fin'] - appel['debut'] == timedelta(days=30)
+
+
+# Métriques Prometheus
+class TestMetriques:
+    def test_metrics_exposes_route_latency_and_serialisation(self, client, sample_document):
+        with patch_service('app.services.document_service.DocumentService.find_by_id') as mock_find:
+            mock_find.return_value = sample_document
+            assert client.get(f"/documents/{sample_document['_id']}").status_code == 200
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        texte = response.data.decode()
+        assert ('mediateque_http_requete_secondes_count{endpoint="documents.get_document",'
+                'methode="GET",statut="200"}') in texte
+        assert 'mediateque_serialisation_secondes_count{endpoint="documents.get_document"}' in texte
+
+
+# GET conditionnels
+ROUTES_CONDITIONNELLES = [
+    ('/documents', 'app.services.document_service.DocumentService.find_all', [], '"e.3"'),
+    ('/documents/types', 'app.services.document_service.DocumentService.get_types', ['livre'], '"e.3"'),
+    ('/documents/stats', 'app.services.stats_service.StatsService.get_stats_documents',
+     {'total': 1}, '"e.3"'),
+    ('/abonnes', 'app.services.abonne_service.AbonneService.find_all', [], '"e.2"'),
+]
+
+class TestConditionnel:
+    @pytest.mark.parametrize('url,cible,retour,etag', ROUTES_CONDITIONNELLES)
+    def test_get_sets_strong_etag(self, client, url, cible, retour, etag):
+        with patch_service(cible) as mock:
+            mock.return_value = retour
+            response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers['ETag'] == etag
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    @pytest.mark.parametrize('url,cible,retour,etag', ROUTES_CONDITIONNELLES)
+    def test_not_modified_runs_no_database_command(self, client, versions, url, cible, retour, etag):
+        with patch_service(cible) as mock:
+            mock.return_value = retour
+            tag = client.get(url).headers['ETag']
+            versions.reset_mock()
+            mock.reset_mock()
+            response = client.get(url, headers={'If-None-Match': tag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == tag
+        # Ni requête (service, versions en cache) ni sérialisation
+        mock.assert_not_called()
+        assert versions.mock_calls == []
+
+    def test_write_elsewhere_changes_etag(self, client, versions):
+        from app.utils.cache import versions_cache
+        with patch_service('app.services.document_service.DocumentService.find_all') as mock:
+            mock.return_value = []
+            tag = client.get('/documents').headers['ETag']
+            versions.db.stats.find_one.return_value = {'epoque': 'e', 'documents': 4, 'abonnes': 2}
+            # Invalidation par l'écouteur de change streams (ou expiration)
+            versions_cache.invalidate()
+            response = client.get('/documents', headers={'If-None-Match': tag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] == '"e.4"'
+        assert mock.call_count == 2
+
+    @pytest.mark.flask_seulement
+    def test_not_modified_runs_no_command_against_mongodb(self, client, app):
+        # Intégration : les commandes sont comptées par EcouteurCommandes
+        from prometheus_client import REGISTRY
+        from app import mongo
+        from app.utils.cache import versions_cache
+        from app.utils.metriques import EcouteurCommandes
+        from conftest import client_test
+
+        def commandes():
+            return sum(echantillon.value for metrique in REGISTRY.collect()
+                       if metrique.name == 'mediateque_mongo_commande_secondes'
+                       for echantillon in metrique.samples if echantillon.name.endswith('_count'))
+
+        client_mongo = client_test(event_listeners=[EcouteurCommandes()])
+        db = client_mongo['mediatheque_test_etag']
+        anciens = (mongo.cx, mongo.db)
+        mongo.cx, mongo.db = client_mongo, db
+        try:
+            with patch('app.services.version_service.mongo', mongo):
+                db.documents.insert_one({'titre': 'Titre', 'disponible': True})
+                versions_cache.invalidate()
+                premiere = client.get('/documents')
+                avant = commandes()
+                response = client.get('/documents', headers={'If-None-Match': premiere.headers['ETag']})
+                assert response.status_code == 304
+                assert commandes() == avant
+        finally:
+            mongo.cx, mongo.db = anciens
+            client_mongo.drop_database(db.name)
+            client_mongo.close()
\ No newline at end of file
@@ -0,0 +1,1121 @@
+import asyncio
+import importlib.util
+import io
+import bson
+import mongomock
+import orjson
+import pytest
+from flask import Flask
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from app.models.abonne import Abonne
+from app.models.document import Document
+from app.models.enregistrement import OPTIONS_BRUTES
+from app.services.document_service import DocumentService
+from app.services.emprunt_service import EmpruntService
+from app.utils.export import flux_csv, flux_ndjson
+from app.utils.pagination import paginer
+from app.utils.serialisation import encoder_bson
+
+
+def collections_par_nom(mock):
+    # collection(db, nom, politique) passe par get_collection, ou db[nom]
+    # sans politique : on renvoie le même mock que mongo.db.<nom> pour
+    # garder les assertions lisibles
+    mock.db.get_collection.side_effect = lambda nom, **options: getattr(mock.db, nom)
+    mock.db.__getitem__.side_effect = lambda nom: getattr(mock.db, nom)
+    return mock
+
+
+@pytest.fixture
+def mock_mongo():
+    with patch('app.services.emprunt_service.mongo') as mock:
+        yield collections_par_nom(mock)
+
+
+@pytest.fixture(autouse=True)
+def versions():
+    # Versions des collections incrémentées par les écritures (ETag)
+    with patch('app.services.version_service.mongo') as mock:
+        if importlib.util.find_spec('quart') is None:
+            yield mock
+            return
+        with patch('app.aio.services.version_service.mongo') as mock_aio:
+            mock_aio.db.stats.update_one = AsyncMock()
+            yield mock
+
+
+@pytest.fixture(autouse=True)
+def archives():
+    # Partitions d'archives relues par les historiques : aucune par défaut
+    from app.utils.cache import archives_cache
+    archives_cache.invalidate()
+    with patch('app.services.archive_service.mongo') as mock:
+        mock.db.stats.find_one.return_value = None
+        yield mock
+    archives_cache.invalidate()
+
+
+@pytest.fixture
+def sans_transaction():
+    app = Flask(__name__)
+    app.config['MONGO_TRANSACTIONS'] = False
+    with app.app_context(), patch('app.services.compteur_service.mongo'):
+        yield
+
+
+class TestEmpruntService:
+    def test_get_emprunts_single_aggregation(self, mock_mongo):
+        mock_mongo.db.emprunts.aggregate.return_value = iter([{'_id': str(ObjectId())}])
+        result = EmpruntService().get_emprunts()
+        assert len(result) == 1
+        mock_mongo.db.emprunts.aggregate.assert_called_once()
+        mock_mongo.db.emprunts.find.assert_not_called()
+        mock_mongo.db.abonnes.find_one.assert_not_called()
+        mock_mongo.db.documents.find_one.assert_not_called()
+
+    def test_historique_matches_abonne_first(self, mock_mongo):
+        mock_mongo.db.emprunts.aggregate.return_value = iter([])
+        abonne_id = ObjectId()
+        EmpruntService().get_historique_emprunts_abonne(str(abonne_id))
+        pipeline = mock_mongo.db.emprunts.aggregate.call_args[0][0]
+        assert pipeline[0] == {'$match': {'abonne_id': abonne_id}}
+        # Abonné et document sont joints depuis les caches d'entités
+        assert [list(stage)[0] for stage in pipeline[1:]] == ['$project']
+
+    def test_historique_joins_entities_from_cache(self):
+        from app.utils.cache import abonnes_cache, documents_cache
+        abonnes_cache.vider()
+        documents_cache.vider()
+        db = mongomock.MongoClient().db
+        abonne_id = db.abonnes.insert_one({'nom': 'Nom', 'prenom': 'Prénom'}).inserted_id
+        documents = db.documents.insert_many([{'titre': 'Titre', 'isbn': '1'},
+                                              {'titre': 'Autre'}]).inserted_ids
+        db.emprunts.insert_many([{'abonne_id': abonne_id, 'document_id': documents[i % 2],
+                                  'statut': 'retourne'} for i in range(4)])
+        mock = MagicMock(db=db)
+        with patch('app.services.emprunt_service.mongo', mock), \
+                patch('app.services.abonne_service.mongo', mock), \
+                patch('app.services.document_service.mongo', mock):
+            service = EmpruntService()
+            emprunts = service.get_historique_emprunts_abonne(str(abonne_id))
+            assert [e['document'] for e in emprunts[:2]] == [{'titre': 'Titre', 'isbn': '1'},
+                                                             {'titre': 'Autre'}]
+            assert emprunts[0]['abonne'] == {'nom': 'Nom', 'prenom': 'Prénom'}
+            # Deuxième lecture : entités servies par le cache
+            mock.db = MagicMock(emprunts=db.emprunts, get_collection=db.get_collection)
+            partiels = service.get_historique_emprunts_abonne(str(abonne_id), limit=None,
+                                                              after=None, fields=['document'])
+            mock.db.documents.find.assert_not_called()
+            assert partiels[0] == {'_id': str(emprunts[0]['_id']),
+                                   'document': {'titre': 'Titre', 'isbn': '1'}}
+        # Un identifiant par document distinct de la page
+        assert documents_cache.compteurs()['hits'] == 2
+        abonnes_cache.vider()
+        documents_cache.vider()
+
+
+    def test_creer_emprunt_claims_available_document(self, mock_mongo, sans_transaction):
+        document_id, abonne_id = ObjectId(), ObjectId()
+        emprunt_id = EmpruntService().creer_emprunt(str(abonne_id), str(document_id))
+        claim = mock_mongo.db.documents.find_one_and_update.call_args
+        assert claim[0][0] == {'_id': document_id, 'exemplaires_disponibles': {'$gt': 0}}
+        assert claim[0][1]['$inc'] == {'exemplaires_disponibles': -1}
+        inserted = mock_mongo.db.emprunts.insert_one.call_args[0][0]
+        assert str(inserted['_id']) == emprunt_id
+        mock_mongo.db.documents.find_one.assert_not_called()
+
+    def test_copies_claimed_until_none_left_then_returned(self, sans_transaction):
+        db = mongomock.MongoClient().db
+        document_id = db.documents.insert_one({'exemplaires_total': 2, 'exemplaires_disponibles': 2,
+                                               'disponible': True, 'emprunts': []}).inserted_id
+        abonne_id = db.abonnes.insert_one({'emprunts_actuels': []}).inserted_id
+        with patch('app.services.emprunt_service.mongo', MagicMock(db=db)):
+            service = EmpruntService()
+            emprunts = [service.creer_emprunt(str(abonne_id), str(document_id)) for _ in range(2)]
+            with pytest.raises(ValueError, match='Document non disponible'):
+                service.creer_emprunt(str(abonne_id), str(document_id))
+            document = db.documents.find_one({'_id': document_id})
+            assert (document['exemplaires_disponibles'], document['disponible']) == (0, False)
+            service.enregistrer_retour(emprunts[0])
+            document = db.documents.find_one({'_id': document_id})
+            assert (document['exemplaires_disponibles'], document['disponible']) == (1, True)
+            service.enregistrer_retour(emprunts[1])
+            assert db.documents.find_one({'_id': document_id})['exemplaires_disponibles'] == 2
+
+    def test_unknown_subscriber_releases_copy_without_transaction(self, sans_transaction):
+        db = mongomock.MongoClient().db
+        document_id = db.documents.insert_one({'exemplaires_total': 1, 'exemplaires_disponibles': 1,
+                                               'disponible': True, 'emprunts': []}).inserted_id
+        with patch('app.services.emprunt_service.mongo', MagicMock(db=db)):
+            with pytest.raises(ValueError, match='Abonné non trouvé'):
+                EmpruntService().creer_emprunt(str(ObjectId()), str(document_id))
+        document = db.documents.find_one({'_id': document_id})
+        assert (document['exemplaires_disponibles'], document['disponible']) == (1, True)
+        assert document['emprunts'] == []
+        assert db.emprunts.count_documents({}) == 0
+
+    def test_creer_emprunt_caps_embedded_history(self, mock_mongo, sans_transaction):
+        service = EmpruntService()
+        emprunt_id = service.creer_emprunt(str(ObjectId()), str(ObjectId()))
+        borne = {'$each': [emprunt_id], '$slice': -service.historique_max}
+        claim = mock_mongo.db.documents.find_one_and_update.call_args
+        assert claim[0][1]['$push'] == {'emprunts': borne}
+        abonne = mock_mongo.db.abonnes.update_one.call_args[0][1]['$push']
+        assert abonne == {'emprunts_actuels': emprunt_id, 'historique_emprunts': borne}
+
+    def test_borner_historiques_truncates_long_arrays(self):
+        db = mongomock.MongoClient().db
+        db.abonnes.insert_many([{'_id': 1, 'historique_emprunts': list(range(30))},
+                                {'_id': 2, 'historique_emprunts': [1, 2]}])
+        db.documents.insert_one({'_id': 3, 'emprunts': list(range(25))})
+        with patch('app.services.emprunt_service.mongo') as mock:
+            mock.db = db
+            modifies = EmpruntService().borner_historiques(taille=10)
+        assert modifies == {'abonnes': 1, 'documents': 1}
+        assert db.abonnes.find_one({'_id': 1})['historique_emprunts'] == list(range(20, 30))
+        assert db.abonnes.find_one({'_id': 2})['historique_emprunts'] == [1, 2]
+        assert db.documents.find_one({'_id': 3})['emprunts'] == list(range(15, 25))
+
+    def test_creer_emprunt_document_already_claimed(self, mock_mongo, sans_transaction):
+        mock_mongo.db.documents.find_one_and_update.return_value = None
+        with pytest.raises(ValueError, match='Document non disponible'):
+            EmpruntService().creer_emprunt(str(ObjectId()), str(ObjectId()))
+        mock_mongo.db.emprunts.insert_one.assert_not_called()
+        mock_mongo.db.abonnes.update_one.assert_not_called()
+
+    def test_creer_emprunt_runs_in_transaction(self, mock_mongo):
+        app = Flask(__name__)
+        app.config['MONGO_TRANSACTIONS'] = True
+        with app.app_context(), patch('app.utils.transactions.mongo') as mock_tx, \
+                patch('app.services.compteur_service.mongo'):
+            session = mock_tx.cx.start_session.return_value.__enter__.return_value
+            session.with_transaction.side_effect = lambda operation, **kwargs: operation(session)
+            EmpruntService().creer_emprunt(str(ObjectId()), str(ObjectId()))
+            assert mock_mongo.db.documents.find_one_and_update.call_args[1]['session'] is session
+            assert mock_mongo.db.emprunts.insert_one.call_args[1]['session'] is session
+            assert mock_mongo.db.abonnes.update_one.call_args[1]['session'] is session
+
+    def test_retour_already_returned(self, mock_mongo, sans_transaction):
+        mock_mongo.db.emprunts.find_one_and_update.return_value = None
+        mock_mongo.db.emprunts.find_one.return_value = {'_id': ObjectId()}
+        with pytest.raises(ValueError, match='déjà retourné'):
+            EmpruntService().enregistrer_retour(str(ObjectId()))
+        mock_mongo.db.documents.update_one.assert_not_called()
+
+
+    def test_bulk_checkout_per_item_status(self, mock_mongo, sans_transaction):
+        abonne = ObjectId()
+        libre, pris, inconnu = ObjectId(), ObjectId(), ObjectId()
+        mock_mongo.db.documents.find.return_value = [{'_id': libre}, {'_id': inconnu}]
+        mock_mongo.db.abonnes.find.return_value = [{'_id': abonne}]
+        mock_mongo.db.documents.bulk_write.return_value.modified_count = 1
+        resultats = EmpruntService().creer_emprunts_bulk([
+            {'abonne_id': str(abonne), 'document_id': str(libre)},
+            {'abonne_id': str(abonne), 'document_id': str(pris)},
+            {'abonne_id': str(ObjectId()), 'document_id': str(inconnu)},
+            {'abonne_id': str(abonne), 'document_id': str(libre)},
+            {'abonne_id': 'x'}
+        ])
+        assert [r['statut'] for r in resultats] == ['cree', 'erreur', 'erreur', 'erreur', 'erreur']
+        assert resultats[1]['error'] == 'Document non disponible'
+        assert resultats[2]['error'] == 'Abonné non trouvé'
+        assert resultats[3]['error'] == 'Document demandé plusieurs fois'
+        mock_mongo.db.documents.bulk_write.assert_called_once()
+        assert mock_mongo.db.documents.bulk_write.call_args[1] == {'ordered': False}
+        mock_mongo.db.emprunts.insert_many.assert_called_once()
+        mock_mongo.db.abonnes.bulk_write.assert_called_once()
+        mock_mongo.db.documents.find_one_and_update.assert_not_called()
+
+    def test_bulk_checkout_releases_claims_of_failed_inserts(self, mock_mongo, sans_transaction):
+        from pymongo.errors import BulkWriteError
+        abonne = ObjectId()
+        documents = [ObjectId(), ObjectId()]
+        mock_mongo.db.documents.find.return_value = [{'_id': d} for d in documents]
+        mock_mongo.db.abonnes.find.return_value = [{'_id': abonne}]
+        mock_mongo.db.documents.bulk_write.return_value.modified_count = 2
+        mock_mongo.db.emprunts.insert_many.side_effect = BulkWriteError({
+            'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'E11000 duplicate key'}],
+            'nInserted': 1})
+        service = EmpruntService()
+        with patch.object(service.compteur_service, 'incrementer') as incrementer:
+            resultats = service.creer_emprunts_bulk([
+                {'abonne_id': str(abonne), 'document_id': str(d)} for d in documents])
+        assert [r['statut'] for r in resultats] == ['cree', 'erreur']
+        assert resultats[1]['error'] == 'Emprunt non enregistré : E11000 duplicate key'
+        # Exemplaire rendu au seul document dont l'emprunt a échoué
+        liberation = mock_mongo.db.documents.bulk_write.call_args_list[1][0][0]
+        assert len(liberation) == 1
+        assert liberation[0]._filter['_id'] == documents[1]
+        assert liberation[0]._doc['$inc'] == {'exemplaires_disponibles': 1}
+        assert liberation[0]._filter['emprunts'] == liberation[0]._doc['$pull']['emprunts']
+        assert len(mock_mongo.db.abonnes.bulk_write.call_args[0][0]) == 1
+        assert incrementer.call_args[0][0]['emprunts_en_cours'] == 1
+
+    def test_bulk_checkout_rolls_back_when_subscribers_write_fails(self, mock_mongo, sans_transaction):
+        from pymongo.errors import AutoReconnect
+        abonne, document = ObjectId(), ObjectId()
+        mock_mongo.db.documents.find.return_value = [{'_id': document}]
+        mock_mongo.db.abonnes.find.side_effect = [[{'_id': abonne}], []]
+        mock_mongo.db.documents.bulk_write.return_value.modified_count = 1
+        mock_mongo.db.abonnes.bulk_write.side_effect = AutoReconnect('connexion perdue')
+        resultats = EmpruntService().creer_emprunts_bulk([
+            {'abonne_id': str(abonne), 'document_id': str(document)}])
+        assert resultats[0]['statut'] == 'erreur'
+        supprimes = mock_mongo.db.emprunts.delete_many.call_args[0][0]['_id']['$in']
+        assert supprimes == [mock_mongo.db.emprunts.insert_many.call_args[0][0][0]['_id']]
+        assert mock_mongo.db.documents.bulk_write.call_count == 2
+
+    def test_bulk_rejects_oversized_batches(self, mock_mongo):
+        from config import Config
+        with pytest.raises(ValueError):
+            EmpruntService().creer_emprunts_bulk([{}] * (Config.BULK_TAILLE_MAX + 1))
+        with pytest.raises(ValueError):
+            EmpruntService().enregistrer_retours_bulk(['x'] * (Config.BULK_TAILLE_MAX + 1))
+        mock_mongo.db.documents.find.assert_not_called()
+
+    def test_bulk_returns_single_read_and_one_write_per_collection(self, mock_mongo, sans_transaction):
+        ouverts = [ObjectId(), ObjectId()]
+        rendu = ObjectId()
+        mock_mongo.db.emprunts.find.return_value = [
+            {'_id': oid, 'abonne_id': ObjectId(), 'document_id': ObjectId(), 'statut': 'en_cours'}
+            for oid in ouverts
+        ] + [{'_id': rendu, 'abonne_id': ObjectId(), 'document_id': ObjectId(), 'statut': 'retourne'}]
+        mock_mongo.db.emprunts.bulk_write.return_value.modified_count = 2
+        mock_mongo.db.documents.bulk_write.return_value.modified_count = 2
+        ids = [str(o) for o in ouverts] + [str(rendu), str(ObjectId())]
+        resultats = EmpruntService().enregistrer_retours_bulk(ids)
+        assert [r['statut'] for r in resultats] == ['retourne', 'retourne', 'erreur', 'erreur']
+        assert resultats[2]['error'] == 'Emprunt déjà retourné'
+        assert resultats[3]['error'] == 'Emprunt non trouvé'
+        mock_mongo.db.emprunts.find.assert_called_once()
+        for collection in ('emprunts', 'documents', 'abonnes'):
+            getattr(mock_mongo.db, collection).bulk_write.assert_called_once()
+
+
+class TestPagination:
+    def test_paginer_keyset_on_id(self):
+        collection = MagicMock()
+        after = ObjectId()
+        paginer(collection, {'type': 'livre'}, limit=10, after=str(after), fields=['titre'])
+        collection.find.assert_called_once_with(
+            {'type': 'livre', '_id': {'$gt': after}}, {'titre': 1})
+        collection.find.return_value.sort.assert_called_once_with('_id', 1)
+        collection.find.return_value.sort.return_value.limit.assert_called_once_with(10)
+        collection.find.return_value.skip.assert_not_called()
+
+    def test_paginer_without_limit_returns_everything(self):
+        collection = MagicMock()
+        collection.find.return_value = iter([{'_id': 1}, {'_id': 2}])
+        assert len(paginer(collection)) == 2
+        collection.find.assert_called_once_with({}, None)
+
+    def test_paginer_raw_decodes_projected_fields(self):
+        collection = MagicMock()
+        brute = collection.with_options.return_value
+        _id = ObjectId()
+        brute.find.return_value = iter([RawBSONDocument(bson.encode(
+            {'_id': _id, 'titre': 'Titre', 'emprunts': ['e1']}))])
+        documents = paginer(collection, modele=Document, fields=['titre'])
+        assert collection.with_options.call_args.kwargs['codec_options'] is OPTIONS_BRUTES
+        brute.find.assert_called_once_with({}, {'titre': 1})
+        assert documents == [Document(titre='Titre')]
+
+    def test_paginer_raw_projects_model_fields_by_default(self):
+        collection = MagicMock()
+        collection.with_options.return_value.find.return_value = iter([])
+        paginer(collection, modele=Abonne)
+        projection = collection.with_options.return_value.find.call_args[0][1]
+        assert set(projection) == set(Abonne.CHAMPS)
+
+
+class TestEnregistrement:
+    DOCUMENT = {'_id': ObjectId(), 'titre': 'Titre', 'auteur': 'Auteur', 'type': 'livre',
+                'disponible': True, 'emprunts': ['e1', 'e2'], 'inconnu': {'a': 1}}
+
+    def test_depuis_bson_decodes_model_fields(self):
+        document = Document.depuis_bson(RawBSONDocument(bson.encode(self.DOCUMENT)))
+        assert document.vers_dict() == {k: v for k, v in self.DOCUMENT.items() if k != 'inconnu'}
+        assert document['emprunts'] == ['e1', 'e2']
+        assert not hasattr(document, '__dict__')
+
+    def test_depuis_bson_only_requested_fields(self):
+        document = Document.depuis_bson(bson.encode(self.DOCUMENT), ['titre', 'inconnu', 'isbn'])
+        assert document.vers_dict() == {'titre': 'Titre'}
+        assert document.get('emprunts') is None
+        with pytest.raises(KeyError):
+            document['isbn']
+
+    def test_records_serialize_like_documents(self):
+        document = Document.depuis_bson(bson.encode(self.DOCUMENT), ['_id', 'titre'])
+        attendu = {'_id': str(self.DOCUMENT['_id']), 'titre': 'Titre'}
+        assert orjson.loads(orjson.dumps([document], default=encoder_bson)) == [attendu]
+        ligne = next(flux_ndjson([document]))
+        assert orjson.loads(ligne) == attendu
+        assert ''.join(flux_csv([document], ['titre', 'auteur'])) == 'titre,auteur\r\nTitre,\r\n'
+
+
+class TestDocumentService:
+    def test_search_uses_text_index_not_regex(self):
+        with patch('app.services.document_service.mongo') as mock_mongo:
+            collections_par_nom(mock_mongo)
+            mock_mongo.db.documents.aggregate.return_value = iter([])
+            after = ObjectId()
+            DocumentService().search('(a+)+$', limit=5, after=f'3.5_{after}')
+            pipeline = mock_mongo.db.documents.aggregate.call_args[0][0]
+            assert pipeline[0] == {'$match': {'$text': {'$search': '(a+)+$'}}}
+            assert '$regex' not in str(pipeline)
+            assert pipeline[2] == {'$match': {'$or': [
+                {'score': {'$lt': 3.5}},
+                {'score': 3.5, '_id': {'$gt': after}}
+            ]}}
+            assert pipeline[-1] == {'$limit': 5}
+
+
+    def test_migrer_exemplaires_gives_legacy_documents_one_copy(self):
+        db = mongomock.MongoClient().db
+        db.documents.insert_many([
+            {'_id': 1, 'disponible': True},
+            {'_id': 2, 'disponible': False},
+            {'_id': 3, 'disponible': True, 'exemplaires_total': 4, 'exemplaires_disponibles': 3}
+        ])
+        with patch('app.services.document_service.mongo', MagicMock(db=db)):
+            service = DocumentService()
+            assert service.migrer_exemplaires() == 2
+            assert service.migrer_exemplaires() == 0
+        exemplaires = {d['_id']: (d['exemplaires_total'], d['exemplaires_disponibles'])
+                       for d in db.documents.find()}
+        assert exemplaires == {1: (1, 1), 2: (1, 0), 3: (4, 3)}
+
+    def test_modifier_exemplaires_keeps_copies_on_loan(self):
+        db = mongomock.MongoClient().db
+        db.documents.insert_one({'_id': ObjectId(), 'type': 'livre', 'disponible': True,
+                                 'exemplaires_total': 3, 'exemplaires_disponibles': 1})
+        document_id = str(db.documents.find_one()['_id'])
+        with patch('app.services.document_service.mongo', MagicMock(db=db)), \
+                patch('app.services.compteur_service.mongo') as compteurs:
+            service = DocumentService()
+            with pytest.raises(ValueError, match='2 en prêt'):
+                service.update(document_id, {'exemplaires_total': 1})
+            service.update(document_id, {'exemplaires_total': 2, 'disponible': False})
+            document = db.documents.find_one()
+            assert (document['exemplaires_total'], document['exemplaires_disponibles'],
+                    document['disponible']) == (2, 0, False)
+            inc = compteurs.db.stats.update_one.call_args[0][1]['$inc']
+            assert inc == {'exemplaires_total': -1, 'documents_disponibles': -1}
+            with pytest.raises(ValueError, match="Nombre d'exemplaires invalide"):
+                service.update(document_id, {'exemplaires_total': 0})
+
+class TestStatsService:
+    def test_stats_cached_until_invalidated(self):
+        from app.services.stats_service import StatsService
+        from app.utils.cache import stats_cache
+        stats_cache.invalidate()
+        service = StatsService()
+        with patch.object(service, 'calculer_stats', return_value={'totalDocuments': 3}) as calcul:
+            assert service.get_stats()['totalDocuments'] == 3
+            data = service.get_stats()
+            assert calcul.call_count == 1
+            assert 'snapshotAt' in data and data['snapshotAgeSeconds'] >= 0
+            stats_cache.invalidate()
+            service.get_stats()
+            assert calcul.call_count == 2
+        stats_cache.invalidate()
+
+    def test_ttl_cache_expires(self):
+        from app.utils.cache import TTLCache
+        cache = TTLCache(ttl=0)
+        calcul = MagicMock(side_effect=[1, 2])
+        assert cache.get_or_compute('cle', calcul)[0] == 1
+        assert cache.get_or_compute('cle', calcul)[0] == 2
+
+    def test_ttl_cache_invalidation_during_compute_is_not_cached(self):
+        from app.utils.cache import TTLCache
+        cache = TTLCache(ttl=60)
+
+        def calcul():
+            # Écriture concurrente pendant le calcul de l'instantané
+            cache.invalidate()
+            return 'perime'
+
+        assert cache.get_or_compute('cle', calcul)[0] == 'perime'
+        assert cache.get_or_compute('cle', lambda: 'frais')[0] == 'frais'
+
+    def test_document_counters_single_facet(self):
+        db = mongomock.MongoClient().db
+        db.documents.insert_many([
+            {'type': 'livre', 'exemplaires_total': 3, 'exemplaires_disponibles': 1},
+            {'type': 'livre', 'exemplaires_total': 1, 'exemplaires_disponibles': 0},
+            {'type': 'dvd', 'exemplaires_total': 2, 'exemplaires_disponibles': 2}
+        ])
+        with patch('app.services.document_service.mongo') as mock_mongo:
+            mock_mongo.db.documents = MagicMock(wraps=db.documents)
+            stats = DocumentService().get_stats()
+            assert stats == {'total': 3, 'exemplaires': 6, 'disponibles': 3, 'empruntes': 3,
+                             'par_type': {'livre': 2, 'dvd': 1}}
+            mock_mongo.db.documents.aggregate.assert_called_once()
+            mock_mongo.db.documents.count_documents.assert_not_called()
+
+
+class TestCumulService:
+    @pytest.fixture
+    def mock_mongo(self):
+        with patch('app.services.cumul_service.mongo') as mock:
+            mock.db.__getitem__.side_effect = lambda nom: getattr(mock.db, nom)
+            yield collections_par_nom(mock)
+
+    def test_cumuler_recomputes_days_from_watermark(self, mock_mongo):
+        from datetime import datetime
+        from app.services.cumul_service import CumulService
+        mock_mongo.db.stats.find_one.return_value = {'filigrane': datetime(2024, 3, 5, 14, 30)}
+        maintenant = datetime(2024, 3, 6, 9, 0)
+        service = CumulService()
+        rapport = service.cumuler(maintenant)
+        depuis = datetime(2024, 3, 5)
+        documents, retours = [c[0][0] for c in mock_mongo.db.emprunts.aggregate.call_args_list]
+        assert documents[0] == {'$match': {'date_emprunt': {'$gte': depuis}}}
+        assert documents[-1] == {'$merge': {'into': 'cumuls_documents', 'whenMatched': 'replace'}}
+        assert retours[0] == {'$match': {'date_retour_effective': {'$type': 'date', '$gte': depuis}}}
+        # Emprunts par type relus des cumuls par document, pas des emprunts
+        jours = mock_mongo.db.cumuls_documents.aggregate.call_args[0][0]
+        assert jours[0] == {'$match': {'jour': {'$gte': depuis}}}
+        assert jours[-1]['$merge']['into'] == retours[-1]['$merge']['into'] == 'cumuls_jours'
+        mock_mongo.db.cumuls_documents.delete_many.assert_not_called()
+        assert rapport['filigrane'] == maintenant - service.marge
+        assert mock_mongo.db.stats.update_one.call_args[0][1]['$set']['filigrane'] == rapport['filigrane']
+
+    def test_cumuler_without_watermark_rebuilds(self, mock_mongo):
+        from app.services.cumul_service import CumulService
+        mock_mongo.db.stats.find_one.return_value = None
+        rapport = CumulService().cumuler()
+        assert rapport['reconstruction'] and rapport['depuis'] is None
+        mock_mongo.db.cumuls_documents.delete_many.assert_called_once_with({})
+        mock_mongo.db.cumuls_jours.delete_many.assert_called_once_with({})
+        documents, retours = [c[0][0] for c in mock_mongo.db.emprunts.aggregate.call_args_list]
+        assert '$group' in documents[0]
+        assert retours[0] == {'$match': {'date_retour_effective': {'$type': 'date'}}}
+
+    def test_rebuild_reads_archive_partitions(self, mock_mongo):
+        from datetime import datetime
+        from app.services.cumul_service import CumulService
+        from app.utils.archives import ID_ARCHIVAGE
+        mock_mongo.db.stats.find_one.side_effect = lambda filtre, *args: (
+            {'premiere_annee': 2023} if filtre['_id'] == ID_ARCHIVAGE else None)
+        with patch('app.utils.archives.datetime') as horloge:
+            horloge.now.return_value.year = 2024
+            CumulService().cumuler(datetime(2024, 6, 1))
+        documents, retours = [c[0][0] for c in mock_mongo.db.emprunts.aggregate.call_args_list]
+        union = [{'$unionWith': {'coll': f'emprunts_archive_{annee}', 'pipeline': []}}
+                 for annee in (2023, 2024)]
+        assert documents[:2] == retours[:2] == union
+        assert '$group' in documents[2]
+
+    def test_series_fold_types_per_period(self):
+        from datetime import datetime
+        from app.services.cumul_service import series
+        semaine = datetime(2024, 3, 4)
+        groupes = [
+            {'_id': {'periode': semaine, 'type': 'livre'}, 'emprunts': 5, 'retours': 2,
+             'duree_totale_jours': 20, 'a_temps': 1, '1_7j': 1, '8_14j': 0, '15_30j': 0, 'plus_30j': 0},
+            {'_id': {'periode': semaine, 'type': 'dvd'}, 'emprunts': 1, 'retours': 2,
+             'duree_totale_jours': 10, 'a_temps': 2, '1_7j': 0, '8_14j': 0, '15_30j': 0, 'plus_30j': 0},
+            {'_id': {'periode': datetime(2024, 2, 26), 'type': 'dvd'}, 'emprunts': 3, 'retours': 0,
+             'duree_totale_jours': 0, 'a_temps': 0, '1_7j': 0, '8_14j': 0, '15_30j': 0, 'plus_30j': 0}
+        ]
+        resultat = series(groupes, 'semaine')
+        precedente, courante = resultat['series']
+        assert precedente['periode'] == datetime(2024, 2, 26)
+        assert precedente['duree_moyenne_jours'] is None
+        assert (courante['emprunts'], courante['retours'], courante['duree_moyenne_jours']) == (6, 4, 7.5)
+        assert courante['retards'] == {'a_temps': 3, '1_7j': 1, '8_14j': 0, '15_30j': 0, 'plus_30j': 0}
+        assert courante['par_type'] == {'livre': {'emprunts': 5, 'retours': 2},
+                                        'dvd': {'emprunts': 1, 'retours': 2}}
+
+
+class TestArchiveService:
+    def test_archiver_moves_old_returned_loans_behind_rollup_watermark(self, archives, sans_transaction):
+        from datetime import datetime
+        from app.services.archive_service import ArchiveService
+        from app.services.cumul_service import ID_CUMULS
+        db = mongomock.MongoClient().db
+        archives.db = db
+        maintenant = datetime(2025, 6, 1)
+        db.stats.insert_one({'_id': ID_CUMULS, 'filigrane': datetime(2024, 3, 10, 15, 0)})
+
+        def emprunt(emprunt, retour, statut='retourne'):
+            return {'_id': ObjectId(), 'abonne_id': ObjectId(), 'document_id': ObjectId(),
+                    'date_emprunt': emprunt, 'date_retour_effective': retour, 'statut': statut}
+        anciens = [emprunt(datetime(2022, 12, 20), datetime(2023, 1, 5)),
+                   emprunt(datetime(2023, 2, 1), datetime(2023, 2, 10)),
+                   emprunt(datetime(2023, 5, 1), datetime(2023, 5, 20))]
+        gardes = [emprunt(datetime(2023, 1, 1), None, 'retarde'),
+                  # Après ARCHIVE_AGE_JOURS, mais après le jour du filigrane
+                  emprunt(datetime(2024, 3, 1), datetime(2024, 3, 10, 9, 0)),
+                  emprunt(datetime(2025, 5, 1), datetime(2025, 5, 10))]
+        db.emprunts.insert_many(anciens + gardes)
+
+        def copier(partition, requetes, **options):
+            # Le ReplaceOne de pymongo 4.x n'est pas rejoué par mongomock
+            for requete in requetes:
+                partition.replace_one(requete._filter, requete._doc, upsert=requete._upsert)
+        service = ArchiveService(taille_lot=2)
+        with patch('mongomock.collection.Collection.bulk_write', copier):
+            rapport = service.archiver(maintenant)
+        assert rapport['limite'] == datetime(2024, 3, 10)
+        assert (rapport['archives'], rapport['lots']) == (3, 2)
+        assert rapport['par_partition'] == {'emprunts_archive_2022': 1, 'emprunts_archive_2023': 2}
+        assert sorted(e['_id'] for e in db.emprunts.find()) == sorted(e['_id'] for e in gardes)
+        assert db.emprunts_archive_2023.find_one({'_id': anciens[2]['_id']}) == anciens[2]
+        assert 'abonne_id__id' in db.emprunts_archive_2022.index_information()
+        # Ré-exécution : rien à déplacer, la première année reste 2022
+        assert service.archiver(maintenant)['archives'] == 0
+        etat = db.stats.find_one({'_id': 'archivage_emprunts'})
+        assert (etat['executions'], etat['archives_total'], etat['premiere_annee']) == (2, 3, 2022)
+        assert service.partitions()[:3] == ['emprunts_archive_2022', 'emprunts_archive_2023',
+                                            'emprunts_archive_2024']
+
+    def test_historique_unions_archive_partitions(self, mock_mongo, archives):
+        archives.db.stats.find_one.return_value = {'premiere_annee': 2024}
+        mock_mongo.db.emprunts.aggregate.return_value = iter([])
+        abonne_id = ObjectId()
+        with patch('app.utils.archives.datetime') as horloge:
+            horloge.now.return_value.year = 2025
+            EmpruntService().get_historique_emprunts_abonne(str(abonne_id), limit=20)
+        pipeline = mock_mongo.db.emprunts.aggregate.call_args[0][0]
+        branche = [{'$match': {'abonne_id': abonne_id}}, {'$sort': {'_id': 1}}, {'$limit': 20}]
+        assert pipeline[:3] == branche
+        # La page est découpée dans chaque partition puis dans leur union
+        assert pipeline[3:5] == [{'$unionWith': {'coll': f'emprunts_archive_{annee}', 'pipeline': branche}}
+                                 for annee in (2024, 2025)]
+        assert [list(stage)[0] for stage in pipeline[5:]] == ['$sort', '$limit', '$project']
+
+
+class TestEntiteCache:
+    def cache(self, taille=10, ttl=60):
+        from app.utils.cache import EntiteCache
+        return EntiteCache('test', taille, ttl)
+
+    def test_reads_missing_entities_in_one_batch(self):
+        cache = self.cache()
+        ids = [ObjectId() for _ in range(3)]
+        charger = MagicMock(side_effect=lambda manquants: [{'_id': i} for i in manquants])
+        assert set(cache.trouver(ids[:2], charger)) == set(ids[:2])
+        assert set(cache.trouver(ids, charger)) == set(ids)
+        assert [c[0][0] for c in charger.call_args_list] == [ids[:2], ids[2:]]
+        assert cache.compteurs() == {'taille': 3, 'hits': 2, 'misses': 3}
+
+    def test_lru_eviction_and_ttl(self):
+        cache = self.cache(taille=2)
+        ids = [ObjectId() for _ in range(3)]
+        charger = MagicMock(side_effect=lambda manquants: [{'_id': i} for i in manquants])
+        cache.trouver(ids[:2], charger)
+        cache.trouver(ids[:1], charger)  # ids[0] devient le plus récent
+        cache.trouver(ids[2:], charger)
+        assert cache.trouver(ids[:1], charger) and charger.call_count == 2
+        cache.trouver(ids[1:2], charger)  # évincé par ids[2]
+        assert charger.call_count == 3
+        expire = self.cache(ttl=0)
+        expire.trouver(ids[:1], charger)
+        expire.trouver(ids[:1], charger)
+        assert charger.call_count == 5
+
+    def test_invalidation_during_read_is_not_cached(self):
+        cache = self.cache()
+        _id = ObjectId()
+
+        def charger(manquants):
+            # Écriture concurrente entre la lecture en base et le remplissage
+            cache.invalidate(_id)
+            return [{'_id': _id, 'disponible': True}]
+
+        assert cache.trouver([_id], charger)[_id]['disponible'] is True
+        assert cache.compteurs()['taille'] == 0
+
+    def test_write_paths_invalidate_entities(self, sans_transaction):
+        from app.utils.cache import abonnes_cache, documents_cache
+        from app.services.abonne_service import AbonneService
+        db = mongomock.MongoClient().db
+        abonne_id = db.abonnes.insert_one({'nom': 'Nom', 'emprunts_actuels': [],
+                                           'historique_emprunts': []}).inserted_id
+        document_id = db.documents.insert_one({'titre': 'Titre', 'disponible': True,
+                                               'exemplaires_total': 1, 'exemplaires_disponibles': 1,
+                                               'emprunts': []}).inserted_id
+        mock = MagicMock(db=db)
+        with patch('app.services.emprunt_service.mongo', mock), \
+                patch('app.services.abonne_service.mongo', mock), \
+                patch('app.services.document_service.mongo', mock):
+            abonnes, documents = AbonneService(), DocumentService()
+            assert documents.find_by_id(document_id)['disponible'] is True
+            assert abonnes.get_emprunts_actuels(abonne_id) == []
+            emprunt_id = EmpruntService().creer_emprunt(str(abonne_id), str(document_id))
+            assert documents.find_by_id(document_id)['disponible'] is False
+            assert abonnes.get_emprunts_actuels(abonne_id) == [emprunt_id]
+            EmpruntService().enregistrer_retour(emprunt_id)
+            assert documents.find_by_id(document_id)['disponible'] is True
+            assert abonnes.get_emprunts_actuels(abonne_id) == []
+            abonnes.update(str(abonne_id), {'nom': 'Autre'})
+            assert abonnes.find_by_id(abonne_id)['nom'] == 'Autre'
+            documents.delete(str(document_id))
+            assert documents.find_by_id(document_id) is None
+        abonnes_cache.vider()
+        documents_cache.vider()
+
+
+class TestVersions:
+    def test_writes_bump_versions_and_reset_cache(self, versions, sans_transaction):
+        from app.services.version_service import VersionService
+        from app.utils.cache import versions_cache
+        versions.db.stats.find_one.return_value = {'epoque': 'e', 'documents': 4}
+        service = VersionService()
+        versions_cache.invalidate()
+        assert service.lire() == service.lire() == {'epoque': 'e', 'documents': 4}
+        versions.db.stats.find_one.assert_called_once()
+
+        with patch('app.services.emprunt_service.mongo') as mock:
+            collections_par_nom(mock)
+            EmpruntService().creer_emprunt(str(ObjectId()), str(ObjectId()))
+        filtre, modification = versions.db.stats.update_one.call_args[0]
+        assert filtre == {'_id': 'versions'}
+        assert modification['$inc'] == {'documents': 1, 'abonnes': 1, 'emprunts': 1}
+        assert 'epoque' in modification['$setOnInsert']
+        service.lire()
+        assert versions.db.stats.find_one.call_count == 2
+        versions_cache.invalidate()
+
+    def test_etag_changes_with_read_collections_only(self):
+        from app.utils.versions import etag
+        avant = {'epoque': 'e', 'documents': 4, 'abonnes': 2}
+        assert etag(avant, ['documents']) == 'e.4'
+        assert etag({**avant, 'abonnes': 3}, ['documents']) == 'e.4'
+        assert etag({**avant, 'documents': 5}, ['documents']) == 'e.5'
+        # Base recréée : les compteurs repartent de zéro sous une autre époque
+        assert etag({'epoque': 'f', 'documents': 4}, ['documents']) != 'e.4'
+        assert etag({}, ['documents']) == '0.0'
+
+
+class TestCompteurs:
+    def test_mouvement_document_type_change(self):
+        from app.services.compteur_service import CompteurService
+        service = CompteurService()
+        with patch.object(service, 'incrementer') as incrementer:
+            service.mouvement_document({'type': 'livre', 'disponible': True},
+                                       {'type': 'dvd', 'disponible': False})
+            deltas = incrementer.call_args[0][0]
+            assert deltas['documents_total'] == 0
+            assert deltas['documents_disponibles'] == -1
+            assert deltas['documents_empruntes'] == 1
+            assert deltas['par_type.livre'] == -1
+            assert deltas['par_type.dvd'] == 1
+
+    def test_mouvement_document_counts_copies(self):
+        from app.services.compteur_service import deltas_mouvement
+        avant = {'type': 'livre', 'exemplaires_total': 3, 'exemplaires_disponibles': 1}
+        deltas = deltas_mouvement(avant, {**avant, 'exemplaires_total': 5,
+                                          'exemplaires_disponibles': 3})
+        assert deltas['exemplaires_total'] == 2
+        assert deltas['documents_disponibles'] == 2
+        assert deltas['documents_empruntes'] == 0
+        assert deltas_mouvement(apres=avant)['documents_empruntes'] == 2
+
+    def test_incrementer_single_inc(self):
+        from app.services.compteur_service import CompteurService
+        with patch('app.services.compteur_service.mongo') as mock_mongo:
+            CompteurService().incrementer({'abonnes_total': 1, 'emprunts_en_cours': 0})
+            mock_mongo.db.stats.update_one.assert_called_once_with(
+                {'_id': 'compteurs'}, {'$inc': {'abonnes_total': 1}})
+
+    def test_first_write_then_read_seeds_counters_from_sources(self):
+        from app.services.abonne_service import AbonneService
+        from app.services.stats_service import StatsService
+        from app.utils.cache import stats_cache
+        db = mongomock.MongoClient().db
+        db.abonnes.insert_many([{'nom': 'A'}, {'nom': 'B'}])
+        db.documents.insert_one({'type': 'b.d', 'exemplaires_total': 2, 'exemplaires_disponibles': 1})
+        mock = MagicMock(db=db)
+        stats_cache.invalidate()
+        with patch('app.services.compteur_service.mongo', mock), \
+                patch('app.services.stats_service.mongo', mock), \
+                patch('app.services.abonne_service.mongo', mock), \
+                patch('app.services.document_service.mongo', mock), \
+                patch('app.services.emprunt_service.mongo', mock):
+            # Première écriture sur une base peuplée : pas de document partiel
+            AbonneService().create({'nom': 'C', 'prenom': 'P', 'email': 'c@exemple.fr'})
+            assert db.stats.find_one({'_id': 'compteurs'}) is None
+            service = StatsService()
+            assert service.calculer_stats()['totalAbonnes'] == 3
+            service.compteur_service.mouvement_document(apres={'type': 'b.d', 'exemplaires_total': 1,
+                                                               'exemplaires_disponibles': 1})
+            stats = service.calculer_stats_documents()
+        assert (stats['total'], stats['exemplaires'], stats['disponibles']) == (2, 3, 2)
+        # Type contenant un point : clé échappée dans le chemin $inc
+        assert stats['par_type'] == {'b.d': 2}
+        assert db.stats.find_one({'_id': 'compteurs'})['par_type'] == {'b%2Ed': 2}
+        stats_cache.invalidate()
+
+    def test_partial_counters_are_reconciled(self):
+        from app.services.compteur_service import normaliser
+        assert normaliser({'_id': 'compteurs', 'abonnes_total': 1}) is None
+
+    def test_reconcilier_reports_drift(self):
+        from app.services.stats_service import StatsService
+        service = StatsService()
+        reels = {'documents_total': 4, 'exemplaires_total': 4, 'documents_disponibles': 3,
+                 'documents_empruntes': 1, 'abonnes_total': 2, 'emprunts_en_cours': 1, 'par_type': {'livre': 4}}
+        stockes = {**reels, 'documents_total': 5, 'par_type': {'livre': 4, 'dvd': 1}}
+        with patch.object(service, 'compter_sources', return_value=reels), \
+             patch.object(service.compteur_service, 'lire', return_value=stockes), \
+             patch.object(service.compteur_service, 'remplacer') as remplacer:
+            resultat = service.reconcilier_compteurs()
+            assert resultat['ecarts'] == {
+                'documents_total': {'stocke': 5, 'reel': 4},
+                'par_type.dvd': {'stocke': 1, 'reel': 0}
+            }
+            remplacer.assert_called_once_with(reels)
+
+
+class TestRetardService:
+    def test_balayer_marks_overdue_in_batches_and_queues_reminders(self):
+        from datetime import datetime, timedelta
+        from app.services.retard_service import RetardService
+        db = mongomock.MongoClient().db
+        maintenant = datetime(2024, 3, 1, 12, 0)
+        abonnes = [ObjectId(), ObjectId()]
+        echus = [{'_id': ObjectId(), 'abonne_id': abonnes[i % 2], 'statut': 'en_cours',
+                  'date_retour_prevue': maintenant - timedelta(days=i + 1)} for i in range(5)]
+        db.emprunts.insert_many(echus + [
+            {'abonne_id': abonnes[0], 'statut': 'en_cours',
+             'date_retour_prevue': maintenant + timedelta(days=1)},
+            {'abonne_id': abonnes[0], 'statut': 'retourne',
+             'date_retour_prevue': maintenant - timedelta(days=1)}
+        ])
+        with patch('app.services.retard_service.mongo') as mock:
+            mock.db.emprunts, mock.db.stats = db.emprunts, db.stats
+            rapport = RetardService(taille_lot=2).balayer(maintenant)
+            assert RetardService().balayer(maintenant)['marques'] == 0
+            metriques = RetardService().lire_metriques()
+
+        assert (rapport['marques'], rapport['lots'], rapport['plus_grand_lot']) == (5, 3, 2)
+        assert db.emprunts.count_documents({'statut': 'retarde'}) == 5
+        assert db.emprunts.count_documents({'statut': 'en_cours'}) == 1
+        # Un bulk_write par lot, une relance (upsert) par abonné du lot
+        lots = [c.args[0] for c in mock.db.relances.bulk_write.call_args_list]
+        assert [len(lot) for lot in lots] == [2, 2, 1]
+        relances = {}
+        for requete in (r for lot in lots for r in lot):
+            assert requete._upsert and requete._filter['statut'] == 'a_envoyer'
+            relances.setdefault(requete._filter['abonne_id'], []).extend(
+                requete._doc['$addToSet']['emprunts']['$each'])
+        assert sorted(relances[abonnes[0]]) == sorted(str(e['_id']) for e in echus[0::2])
+        assert sorted(relances[abonnes[1]]) == sorted(str(e['_id']) for e in echus[1::2])
+        assert metriques['executions'] == 2
+        assert metriques['marques_total'] == 5
+        assert metriques['dernier']['marques'] == 0
+
+    def test_overdue_reads_include_unswept_loans(self, mock_mongo):
+        mock_mongo.db.emprunts.count_documents.return_value = 3
+        assert EmpruntService().get_emprunts_en_retard_count() == 3
+        retarde, echus = mock_mongo.db.emprunts.count_documents.call_args.args[0]['$or']
+        assert retarde == {'statut': 'retarde'}
+        assert echus['statut'] == 'en_cours' and '$lt' in echus['date_retour_prevue']
+        EmpruntService().get_emprunts_count()
+        assert mock_mongo.db.emprunts.count_documents.call_args.args[0] == {
+            'statut': {'$in': ['en_cours', 'retarde']}}
+
+    def test_overdue_without_sweeper(self):
+        from datetime import datetime, timedelta
+        db = mongomock.MongoClient().db
+        hier, demain = datetime.now() - timedelta(days=1), datetime.now() + timedelta(days=1)
+        db.emprunts.insert_many([
+            {'statut': 'en_cours', 'date_retour_prevue': hier},
+            {'statut': 'retarde', 'date_retour_prevue': hier},
+            {'statut': 'en_cours', 'date_retour_prevue': demain},
+            {'statut': 'retourne', 'date_retour_prevue': hier}
+        ])
+        with patch('app.services.emprunt_service.mongo', MagicMock(db=db)):
+            service = EmpruntService()
+            assert service.get_emprunts_en_retard_count() == 2
+            assert len(service.get_emprunts_en_retard(limit=10)) == 2
+            assert service.get_stats() == {'en_cours': 3, 'en_retard': 2}
+
+    def test_retour_of_overdue_loan(self):
+        from datetime import datetime
+        db = mongomock.MongoClient().db
+        document_id, abonne_id = ObjectId(), ObjectId()
+        emprunt_id = db.emprunts.insert_one({
+            'abonne_id': abonne_id, 'document_id': document_id, 'statut': 'retarde',
+            'date_retour_prevue': datetime(2024, 1, 1)}).inserted_id
+        db.documents.insert_one({'_id': document_id, 'disponible': False,
+                                 'exemplaires_total': 1, 'exemplaires_disponibles': 0})
+        app = Flask(__name__)
+        app.config['MONGO_TRANSACTIONS'] = False
+        with app.app_context(), patch('app.services.emprunt_service.mongo') as mock, \
+                patch('app.services.compteur_service.mongo'):
+            mock.db = db
+            EmpruntService().enregistrer_retour(str(emprunt_id))
+        assert db.emprunts.find_one({'_id': emprunt_id})['statut'] == 'retourne'
+        assert db.documents.find_one({'_id': document_id})['disponible'] is True
+
+
+class TestEcouteurChangements:
+    def change(self, **kwargs):
+        return {'_id': {'_data': str(ObjectId())}, 'ns': {'coll': 'documents'},
+                'operationType': 'update', 'documentKey': {'_id': ObjectId()}, **kwargs}
+
+    def test_versions_change_resets_etags_without_broadcast(self):
+        from app.utils.cache import versions_cache
+        from app.utils.changements import EcouteurChangements
+        ecouteur = EcouteurChangements()
+        abonnement = ecouteur.abonner()
+        versions_cache.get_or_compute('versions', lambda: {'documents': 1})
+        ecouteur.traiter(self.change(ns={'coll': 'stats'}, documentKey={'_id': 'versions'}))
+        assert versions_cache._lire('versions')[0] is None
+        assert abonnement.vider() == []
+
+    def test_traiter_invalidates_cache_and_publishes_availability(self):
+        from app.utils.cache import documents_cache, stats_cache
+        from app.utils.changements import EcouteurChangements
+        ecouteur = EcouteurChangements()
+        abonnement = ecouteur.abonner()
+        stats_cache.get_or_compute('dashboard', lambda: {'empruntsEnCours': 1})
+        change = self.change(updateDescription={'updatedFields': {'disponible': False}})
+        document_id = change['documentKey']['_id']
+        documents_cache.trouver([document_id], lambda ids: [{'_id': document_id}])
+        ecouteur.traiter(change)
+        assert stats_cache._lire('dashboard')[0] is None
+        assert documents_cache.compteurs()['taille'] == 0
+        [evenement] = abonnement.vider()
+        assert evenement['id'] == change['_id']['_data']
+        assert evenement['type'] == 'disponibilite'
+        assert evenement['data']['disponible'] is False
+        ecouteur.traiter(self.change(ns={'coll': 'abonnes'}, operationType='insert'))
+        assert abonnement.vider()[0]['type'] == 'changement'
+        # Un client qui se reconnecte avec un identifiant trop ancien relit tout
+        assert ecouteur.abonner('inconnu').vider() == [{'type': 'reset', 'data': {}}]
+
+    def test_listener_resumes_from_persisted_token_and_saves_new_one(self):
+        from app.utils.changements import EcouteurChangements
+        ecouteur = EcouteurChangements()
+        abonnement = ecouteur.abonner()
+        db = MagicMock()
+        db.stats.find_one.return_value = {'resume_token': {'_data': '01'}}
+        flux = db.watch.return_value.__enter__.return_value
+        flux.resume_token = {'_data': '02'}
+        changes = [self.change(), None]
+
+        def suivant():
+            if not changes:
+                ecouteur._arret.set()
+            return changes.pop(0) if changes else None
+        flux.try_next.side_effect = suivant
+        ecouteur._ecouter(db)
+        assert db.watch.call_args.kwargs['resume_after'] == {'_data': '01'}
+        assert len(abonnement.vider()) == 1
+        db.stats.update_one.assert_called_once()
+        filtre, mise_a_jour = db.stats.update_one.call_args.args
+        assert filtre == {'_id': 'flux_changements'}
+        assert mise_a_jour['$set']['resume_token'] == {'_data': '02'}
+
+    def test_listener_stops_without_replica_set(self):
+        from pymongo.errors import OperationFailure
+        from app.utils.changements import EcouteurChangements
+        db = MagicMock()
+        db.stats.find_one.return_value = None
+        db.watch.side_effect = OperationFailure('replica set requis', code=40573)
+        EcouteurChangements()._ecouter(db)
+        db.watch.assert_called_once()
+
+
+class TestEcouteurCommandes:
+    def evenement(self, **kwargs):
+        from types import SimpleNamespace
+        return SimpleNamespace(**{'connection_id': ('localhost', 27017), 'request_id': 7,
+                                  'command_name': 'find', 'database_name': 'mediatheque', **kwargs})
+
+    def mesure(self, nom, commande='find'):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(nom, {'collection': 'emprunts', 'commande': commande}) or 0
+
+    def test_command_timings_and_slow_query_log(self, caplog):
+        from app.utils.metriques import EcouteurCommandes
+        ecouteur = EcouteurCommandes(seuil_lent_ms=2)
+        avant = (self.mesure('mediateque_mongo_commande_secondes_count'),
+                 self.mesure('mediateque_mongo_documents_total'))
+        ecouteur.started(self.evenement(command={'find': 'emprunts', 'filter': {'statut': 'retarde'},
+                                                 'lsid': {'id': 'session'}}))
+        ecouteur.succeeded(self.evenement(duration_micros=2500,
+                                          reply={'cursor': {'firstBatch': [{}, {}, {}]}}))
+        assert self.mesure('mediateque_mongo_commande_secondes_count') == avant[0] + 1
+        assert self.mesure('mediateque_mongo_documents_total') == avant[1] + 3
+        [message] = [r.getMessage() for r in caplog.records if 'Requête lente' in r.getMessage()]
+        assert 'find sur emprunts en 2.5 ms, 3 documents' in message
+        assert "'statut': 'retarde'" in message and 'lsid' not in message
+        assert not ecouteur._en_vol
+
+    def test_failed_command_counted(self):
+        from app.utils.metriques import EcouteurCommandes
+        ecouteur = EcouteurCommandes()
+        avant = self.mesure('mediateque_mongo_echecs_total', 'update')
+        ecouteur.started(self.evenement(command_name='update', command={'update': 'emprunts'}))
+        ecouteur.failed(self.evenement(command_name='update', duration_micros=100))
+        assert self.mesure('mediateque_mongo_echecs_total', 'update') == avant + 1
+
+
+class TestImportService:
+    def test_import_csv_validates_dedups_and_batches(self):
+        from app.services.import_service import ImportService
+        fichier = io.StringIO(
+            'titre,auteur,type,isbn,date_publication\n'
+            'Livre A,Auteur,livre,111,2020-01-01\n'
+            'Livre B,Auteur,livre,,\n'
+            'Sans auteur,,livre,222,\n'
+            'Livre A bis,Auteur,livre,111,\n'
+            'Livre C,Auteur,dvd,333,pas-une-date\n'
+            'Livre D,Auteur,dvd,444,\n'
+        )
+        with patch('app.services.import_service.mongo') as mock_mongo, \
+             patch('app.services.compteur_service.mongo'):
+            lot_1, lot_2 = MagicMock(), MagicMock()
+            lot_1.bulk_api_result = {'upserted': [{'index': 0, '_id': ObjectId()}]}
+            lot_2.bulk_api_result = {'upserted': []}
+            mock_mongo.db.documents.bulk_write.side_effect = [lot_1, lot_2]
+            rapport = ImportService().importer(fichier, 'csv', taille_lot=2)
+            assert rapport['lus'] == 6
+            assert rapport['rejets'] == 2
+            # Lignes du fichier, en-tête compris
+            assert [e['ligne'] for e in rapport['erreurs']] == [4, 6]
+            # 111 vu deux fois dans le fichier ; 444 déjà présent en base (lot 2)
+            assert rapport['doublons'] == 2
+            assert rapport['importes'] == 2
+            lots = mock_mongo.db.documents.bulk_write.call_args_list
+            assert len(lots) == 2
+            premier = lots[0][0][0][0]
+            assert premier._filter == {'isbn': '111'}
+            document = premier._doc['$setOnInsert']
+            assert document['disponible'] is True and document['emprunts'] == []
+            assert document['date_publication'].year == 2020
+
+    def test_import_ndjson_rejects_bad_lines(self):
+        from app.services.import_service import ImportService
+        fichier = io.StringIO('{"titre": "A", "auteur": "B", "type": "livre"}\n\n{oops\n\n')
+        with patch('app.services.import_service.mongo') as mock_mongo, \
+             patch('app.services.compteur_service.mongo'):
+            mock_mongo.db.documents.bulk_write.return_value.bulk_api_result = {'upserted': []}
+            rapport = ImportService().importer(fichier, 'ndjson')
+            assert rapport['lus'] == 2
+            assert rapport['importes'] == 1
+            assert rapport['rejets'] == 1
+            # Numéro de la ligne physique, lignes vides comprises
+            assert [e['ligne'] for e in rapport['erreurs']] == [3]
+
+    def test_import_bulk_write_rejects_point_at_source_lines(self):
+        from pymongo.errors import BulkWriteError
+        from app.services.import_service import ImportService
+        fichier = io.StringIO(
+            'titre,auteur,type,isbn\n'
+            '"Livre A,\nsur deux lignes",Auteur,livre,111\n'
+            'Livre B,Auteur,livre,222\n'
+            'Livre C,Auteur,livre,333\n'
+        )
+        with patch('app.services.import_service.mongo') as mock_mongo, \
+             patch('app.services.compteur_service.mongo'):
+            lot_2 = MagicMock()
+            lot_2.bulk_api_result = {'upserted': [{'index': 0, '_id': ObjectId()}]}
+            mock_mongo.db.documents.bulk_write.side_effect = [BulkWriteError({
+                'writeErrors': [{'index': 1, 'code': 121, 'errmsg': 'validation'}],
+                'upserted': [{'index': 0, '_id': ObjectId()}],
+            }), lot_2]
+            rapport = ImportService().importer(fichier, 'csv', taille_lot=2)
+            assert rapport['importes'] == 2
+            # Livre B : 2e notice du premier lot, ligne 4 (Livre A en occupe deux)
+            assert rapport['erreurs'] == [{'ligne': 4, 'error': 'validation'}]
+
+
+def requete_lente(suivi, resultat=None):
+    """Requête asynchrone factice qui note le nombre d'appels simultanés."""
+    async def requete(*args, **kwargs):
+        suivi['en_vol'] += 1
+        suivi['max'] = max(suivi['max'], suivi['en_vol'])
+        await asyncio.sleep(0.01)
+        suivi['en_vol'] -= 1
+        return resultat
+    return requete
+
+
+class TestServicesAsync:
+    @pytest.fixture(autouse=True)
+    def quart(self):
+        pytest.importorskip('quart')
+
+    def test_stats_queries_run_concurrently(self):
+        from app.aio.services.stats_service import StatsService
+        suivi = {'en_vol': 0, 'max': 0}
+        compteurs = {'documents_total': 3, 'exemplaires_total': 3, 'documents_disponibles': 2,
+                     'documents_empruntes': 1, 'abonnes_total': 4, 'emprunts_en_cours': 1}
+        with patch('app.aio.services.compteur_service.mongo') as mongo_compteurs, \
+                patch('app.aio.services.emprunt_service.mongo') as mongo_emprunts:
+            collections_par_nom(mongo_compteurs)
+            collections_par_nom(mongo_emprunts)
+            mongo_compteurs.db.stats.find_one = requete_lente(suivi, compteurs)
+            mongo_emprunts.db.emprunts.count_documents = requete_lente(suivi, 1)
+            stats = asyncio.run(StatsService().calculer_stats())
+        assert stats['empruntsEnRetard'] == 1
+        assert stats['totalAbonnes'] == 4
+        assert suivi['max'] == 2
+
+    def test_creer_emprunt_writes_in_parallel_after_claim(self):
+        from quart import Quart
+        from app.aio.services.emprunt_service import EmpruntService
+        suivi = {'en_vol': 0, 'max': 0}
+        app = Quart(__name__)
+        app.config['MONGO_TRANSACTIONS'] = False
+
+        async def creer():
+            async with app.app_context():
+                return await EmpruntService().creer_emprunt(str(ObjectId()), str(ObjectId()))
+
+        with patch('app.aio.services.emprunt_service.mongo') as mock, \
+                patch('app.aio.services.compteur_service.mongo') as compteurs:
+            collections_par_nom(mock)
+            compteurs.db.stats.update_one = AsyncMock()
+            mock.db.documents.find_one_and_update = AsyncMock(return_value={'_id': 1, 'exemplaires_disponibles': 2})
+            mock.db.emprunts.insert_one = requete_lente(suivi)
+            mock.db.abonnes.update_one = requete_lente(suivi, MagicMock(matched_count=1))
+            emprunt_id = asyncio.run(creer())
+
+            assert ObjectId.is_valid(emprunt_id)
+            assert suivi['max'] == 2
+            mock.db.abonnes.update_one = AsyncMock(return_value=MagicMock(matched_count=0))
+            mock.db.emprunts.delete_one = AsyncMock()
+            mock.db.documents.update_one = AsyncMock()
+            with pytest.raises(ValueError, match='Abonné non trouvé'):
+                asyncio.run(creer())
+            # Sans transaction : emprunt supprimé et exemplaire rendu
+            mock.db.emprunts.delete_one.assert_awaited_once()
+            rendu = mock.db.documents.update_one.call_args[0]
+            assert rendu[1]['$inc'] == {'exemplaires_disponibles': 1}
+            assert rendu[0]['emprunts'] == rendu[1]['$pull']['emprunts']
+
+    def test_retour_invalidates_dashboard_without_extra_count(self):
+        from quart import Quart
+        from app.aio.services.emprunt_service import EmpruntService
+        from app.utils.cache import stats_cache
+        app = Quart(__name__)
+        app.config['MONGO_TRANSACTIONS'] = False
+        stats_cache.get_or_compute('dashboard', lambda: {'empruntsEnCours': 1})
+
+        async def rendre():
+            async with app.app_context():
+                return await EmpruntService().enregistrer_retour(str(ObjectId()))
+
+        with patch('app.aio.services.emprunt_service.mongo') as mock, \
+                patch('app.aio.services.compteur_service.mongo') as compteurs:
+            collections_par_nom(mock)
+            compteurs.db.stats.update_one = AsyncMock()
+            mock.db.emprunts.find_one_and_update = AsyncMock(
+                return_value={'document_id': ObjectId(), 'abonne_id': ObjectId()})
+            mock.db.documents.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+            mock.db.abonnes.update_one = AsyncMock()
+            assert asyncio.run(rendre()) is None
+            mock.db.emprunts.count_documents.assert_not_called()
+        assert stats_cache._lire('dashboard')[0] is None
@@ -0,0 +1,32 @@
+"""Partitions d'archives des emprunts retournés (ArchiveService).
+
+Les emprunts retournés depuis plus de ARCHIVE_AGE_JOURS quittent la
+collection emprunts pour une collection par année d'emprunt. Les lectures
+de l'historique complet (historiques d'un abonné ou d'un document,
+reconstruction des cumuls) ajoutent à leur pipeline une étape $unionWith
+par partition, de la première année archivée à l'année en cours.
+"""
+from datetime import datetime
+
+# Document de la collection stats portant les métriques de l'archivage
+ID_ARCHIVAGE = 'archivage_emprunts'
+# emprunts_archive_2023, emprunts_archive_2024...
+PREFIXE_ARCHIVES = 'emprunts_archive_'
+
+
+def nom_partition(date_emprunt):
+    return f'{PREFIXE_ARCHIVES}{date_emprunt.year}'
+
+
+def partitions(premiere_annee, maintenant=None):
+    """Noms des partitions, de la plus ancienne à l'année en cours ; une
+    partition jamais écrite est lue comme vide."""
+    if premiere_annee is None:
+        return []
+    derniere = (maintenant or datetime.now()).year
+    return [f'{PREFIXE_ARCHIVES}{annee}' for annee in range(premiere_annee, derniere + 1)]
+
+
+def union_archives(noms, branche):
+    """Étapes $unionWith appliquant `branche` à chaque partition."""
+    return [{'$unionWith': {'coll': nom, 'pipeline': branche}} for nom in noms]
\ No newline at end of file
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from app.utils.metriques import CACHE
+
+
+class TTLCache:
+    """Cache clé/valeur en mémoire dont les entrées expirent après `ttl` secondes.
+
+    Chaque valeur est conservée avec l'heure de son calcul pour que
+    l'appelant puisse indiquer la fraîcheur de la donnée servie.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entrees = {}
+        # Incrémentée à chaque invalidation : un calcul commencé avant
+        # n'écrit pas dans le cache une valeur peut-être déjà périmée
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _lire(self, cle):
+        """Renvoie (entrée valide ou None, génération)."""
+        with self._lock:
+            entree = self._entrees.get(cle)
+            generation = self._generation
+        if entree and time.time() - entree[1] < self.ttl:
+            return entree, generation
+        return None, generation
+
+    def _ecrire(self, cle, valeur, generation):
+        entree = (valeur, time.time())
+        with self._lock:
+            if generation == self._generation:
+                self._entrees[cle] = entree
+        return entree
+
+    def get_or_compute(self, cle, calcul):
+        """Renvoie (valeur, horodatage du calcul) en recalculant si expiré."""
+        entree, generation = self._lire(cle)
+        return entree or self._ecrire(cle, calcul(), generation)
+
+    async def get_or_compute_async(self, cle, calcul):
+        """Variante asyncio : calcul est une fonction coroutine."""
+        entree, generation = self._lire(cle)
+        return entree or self._ecrire(cle, await calcul(), generation)
+
+    def invalidate(self, cle=None):
+        with self._lock:
+            self._generation += 1
+            if cle is None:
+                self._entrees.clear()
+            else:
+                self._entrees.pop(cle, None)
+
+
+class EntiteCache:
+    """Cache LRU d'entités lues par _id, dont les entrées expirent après
+    `ttl` secondes.
+
+    Les services lisent au travers (trouver, trouver_async) et invalident
+    les entités qu'ils modifient ; l'écouteur de change streams invalide
+    celles modifiées par les autres processus, le TTL borne sinon leur
+    fraîcheur. Les entités servies sont des copies superficielles, à ne pas
+    modifier en profondeur.
+    """
+
+    def __init__(self, nom, taille, ttl):
+        self.nom = nom
+        self.taille = taille
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._entrees = OrderedDict()
+        # Incrémentée à chaque invalidation : une lecture commencée avant
+        # n'écrit pas dans le cache une entité peut-être déjà périmée
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _lire(self, ids):
+        """Renvoie (entités en cache par _id, _id manquants, génération)."""
+        trouves, manquants = {}, []
+        maintenant = time.monotonic()
+        with self._lock:
+            for _id in ids:
+                entree = self._entrees.get(_id)
+                if entree and maintenant - entree[1] < self.ttl:
+                    self._entrees.move_to_end(_id)
+                    trouves[_id] = dict(entree[0])
+                elif _id not in trouves and _id not in manquants:
+                    manquants.append(_id)
+            self.hits += len(trouves)
+            self.misses += len(manquants)
+            generation = self._generation
+        CACHE.labels(self.nom, 'hit').inc(len(trouves))
+        CACHE.labels(self.nom, 'miss').inc(len(manquants))
+        return trouves, manquants, generation
+
+    def _ecrire(self, entites, generation):
+        maintenant = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                return
+            for entite in entites:
+                self._entrees[entite['_id']] = (entite, maintenant)
+                self._entrees.move_to_end(entite['_id'])
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+
+    def trouver(self, ids, charger):
+        """Entités par _id ; `charger(ids)` lit celles absentes du cache."""
+        trouves, manquants, generation = self._lire(ids)
+        if manquants:
+            entites = list(charger(manquants))
+            self._ecrire(entites, generation)
+            trouves.update((e['_id'], dict(e)) for e in entites)
+        return trouves
+
+    async def trouver_async(self, ids, charger):
+        """Variante asyncio : charger est une fonction coroutine."""
+        trouves, manquants, generation = self._lire(ids)
+        if manquants:
+            entites = await charger(manquants)
+            self._ecrire(entites, generation)
+            trouves.update((e['_id'], dict(e)) for e in entites)
+        return trouves
+
+    def invalidate(self, *ids):
+        with self._lock:
+            self._generation += 1
+            for _id in ids:
+                self._entrees.pop(_id, None)
+
+    def vider(self):
+        with self._lock:
+            self._generation += 1
+            self._entrees.clear()
+
+    def compteurs(self):
+        with self._lock:
+            return {'taille': len(self._entrees), 'hits': self.hits, 'misses': self.misses}
+
+
+# Instantané partagé des compteurs du tableau de bord
+stats_cache = TTLCache(Config.STATS_CACHE_TTL)
+
+# Versions des collections, dont dérivent les ETag des routes GET
+versions_cache = TTLCache(Config.VERSIONS_CACHE_TTL)
+
+# Première année archivée, dont dérivent les partitions relues par les historiques
+archives_cache = TTLCache(Config.VERSIONS_CACHE_TTL)
+
+# Entités lues par _id (fiches, jointures des historiques)
+abonnes_cache = EntiteCache('abonnes', Config.ENTITES_CACHE_TAILLE, Config.ENTITES_CACHE_TTL)
+documents_cache = EntiteCache('documents', Config.ENTITES_CACHE_TAILLE, Config.ENTITES_CACHE_TTL)
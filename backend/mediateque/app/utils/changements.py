@@ -0,0 +1,278 @@
+"""Flux de modifications (change streams) de documents, abonnes et emprunts.
+
+Un écouteur par processus suit les trois collections sur un seul curseur
+$changeStream. Chaque modification invalide les caches du processus, y
+compris celles écrites par les autres workers, puis est diffusée aux
+abonnements ouverts par les routes Server-Sent Events (/api/stats/flux).
+
+Le jeton de reprise est enregistré dans la collection stats : après un
+redémarrage, l'écoute reprend là où elle s'était arrêtée. Les derniers
+événements restent en mémoire pour qu'un client qui se reconnecte avec
+Last-Event-ID reçoive ceux qu'il a manqués.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pymongo.errors import OperationFailure, PyMongoError
+from app.utils.cache import abonnes_cache, documents_cache, stats_cache, versions_cache
+from app.utils.versions import ID_VERSIONS
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ['documents', 'abonnes', 'emprunts']
+# Caches d'entités tenus à jour par l'écouteur
+CACHES_ENTITES = {'documents': documents_cache, 'abonnes': abonnes_cache}
+# Document de la collection stats portant le jeton de reprise
+ID_FLUX = 'flux_changements'
+# $changeStream refusé hors replica set
+CHANGE_STREAM_NON_SUPPORTE = 40573
+
+# Seuls les champs utiles aux événements diffusés sont transmis. Les
+# versions des collections (stats) sont suivies pour les ETag, sans être
+# diffusées
+PIPELINE = [
+    {'$match': {'$or': [{'ns.coll': {'$in': COLLECTIONS}},
+                        {'ns.coll': 'stats', 'documentKey._id': ID_VERSIONS}],
+                'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}},
+    {'$project': {'ns': 1, 'operationType': 1, 'documentKey': 1,
+                  'fullDocument.disponible': 1,
+                  'fullDocument.exemplaires_disponibles': 1,
+                  'updateDescription.updatedFields.disponible': 1,
+                  'updateDescription.updatedFields.exemplaires_disponibles': 1}}
+]
+
+def evenement_changement(change):
+    """Traduit une modification en événement diffusé : 'disponibilite' quand
+    la disponibilité d'un document ou son nombre d'exemplaires en rayon est
+    connu, 'changement' sinon."""
+    collection = change['ns']['coll']
+    data = {'collection': collection, 'operation': change['operationType'],
+            'id': str(change['documentKey']['_id'])}
+    champs = {**(change.get('updateDescription') or {}).get('updatedFields', {}),
+              **(change.get('fullDocument') or {})}
+    disponible = champs.get('disponible')
+    exemplaires = champs.get('exemplaires_disponibles')
+    if collection == 'documents' and exemplaires is not None:
+        data['exemplaires_disponibles'] = exemplaires
+        if disponible is None:
+            disponible = exemplaires > 0
+    if collection == 'documents' and disponible is not None:
+        return {'id': change['_id']['_data'], 'type': 'disponibilite',
+                'data': {**data, 'disponible': disponible}}
+    return {'id': change['_id']['_data'], 'type': 'changement', 'data': data}
+
+def format_sse(evenement, dumps):
+    """Sérialise un événement au format text/event-stream."""
+    lignes = [f"id: {evenement['id']}"] if evenement.get('id') else []
+    lignes.append(f"event: {evenement['type']}")
+    # JSON indenté en debug : une ligne data: par ligne
+    lignes += [f'data: {ligne}' for ligne in dumps(evenement['data']).splitlines()]
+    return '\n'.join(lignes) + '\n\n'
+
+class Abonnement:
+    """File des événements d'un client SSE, alimentée par le thread de
+    l'écouteur. `reveil` est appelé après chaque ajout (réveil d'une boucle
+    asyncio) ; les clients synchrones attendent avec attendre()."""
+
+    def __init__(self, rattrapage=None, reveil=None):
+        self._evenements = deque(rattrapage or [])
+        self._condition = threading.Condition()
+        self._reveil = reveil
+
+    def publier(self, evenement):
+        with self._condition:
+            self._evenements.append(evenement)
+            self._condition.notify()
+        if self._reveil:
+            self._reveil()
+
+    def vider(self):
+        with self._condition:
+            evenements = list(self._evenements)
+            self._evenements.clear()
+        return evenements
+
+    def attendre(self, delai):
+        with self._condition:
+            self._condition.wait_for(lambda: self._evenements, delai)
+        return self.vider()
+
+class EcouteurChangements:
+    def __init__(self, historique=None):
+        self._abonnements = set()
+        self._historique = deque(maxlen=historique or Config.FLUX_HISTORIQUE)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._arret = threading.Event()
+        # Jeton de reprise courant, et celui lu au démarrage
+        self._reprise = self._depart = None
+
+    def demarrer(self, db):
+        """Lance le thread d'écoute s'il ne tourne pas déjà ; idempotent."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._ecouter, args=(db,),
+                                            name='ecouteur-changements', daemon=True)
+            self._thread.start()
+
+    def arreter(self, delai=5):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._arret.set()
+            thread.join(delai)
+
+    def abonner(self, dernier_id=None, reveil=None, limite=None):
+        """Ouvre un abonnement. Avec `dernier_id` (Last-Event-ID), les
+        événements suivants encore en mémoire sont rejoués ; s'il est inconnu,
+        un événement 'reset' demande au client de tout relire. Renvoie None
+        si `limite` abonnements sont déjà ouverts."""
+        with self._lock:
+            if limite is not None and len(self._abonnements) >= limite:
+                return None
+            historique = list(self._historique)
+            rattrapage = []
+            if dernier_id:
+                ids = [e['id'] for e in historique]
+                if dernier_id in ids:
+                    rattrapage = historique[ids.index(dernier_id) + 1:]
+                elif self._depart and dernier_id == self._depart['_data']:
+                    # Dernier événement vu avant le redémarrage de l'écouteur
+                    rattrapage = historique
+                else:
+                    rattrapage = [{'type': 'reset', 'data': {}}]
+            abonnement = Abonnement(rattrapage, reveil)
+            self._abonnements.add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._lock:
+            self._abonnements.discard(abonnement)
+
+    def diffuser(self, evenement):
+        with self._lock:
+            if evenement.get('id'):
+                self._historique.append(evenement)
+            abonnements = list(self._abonnements)
+        for abonnement in abonnements:
+            abonnement.publier(evenement)
+
+    def traiter(self, change):
+        if change['ns']['coll'] == 'stats':
+            # Versions incrémentées, peut-être par un autre worker
+            versions_cache.invalidate()
+            return
+        # Les compteurs lus par le tableau de bord ont pu changer, et
+        # l'entité modifiée, peut-être par un autre worker
+        stats_cache.invalidate()
+        cache = CACHES_ENTITES.get(change['ns']['coll'])
+        if cache:
+            cache.invalidate(change['documentKey']['_id'])
+        self.diffuser(evenement_changement(change))
+
+    def _ecouter(self, db):
+        attente, charge = 1, False
+        while not self._arret.is_set():
+            try:
+                if not charge:
+                    etat = db.stats.find_one({'_id': ID_FLUX}) or {}
+                    self._reprise = self._depart = etat.get('resume_token')
+                    charge = True
+                self._suivre(db)
+                attente = 1
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_NON_SUPPORTE:
+                    logger.warning("Change streams indisponibles (replica set requis) : "
+                                   "les caches n'expirent que par leur TTL")
+                    return
+                # Jeton de reprise sorti de l'oplog ou flux invalidé : on
+                # repart du présent et les clients relisent tout
+                logger.warning("Flux de modifications réinitialisé : %s", e)
+                self._reprise = None
+                stats_cache.invalidate()
+                for cache in CACHES_ENTITES.values():
+                    cache.vider()
+                self.diffuser({'type': 'reset', 'data': {}})
+                self._arret.wait(attente)
+                attente = min(attente * 2, 30)
+            except PyMongoError as e:
+                logger.warning("Flux de modifications interrompu : %s", e)
+                self._arret.wait(attente)
+                attente = min(attente * 2, 30)
+
+    def _suivre(self, db):
+        sauvegarde, traites = time.monotonic(), 0
+        with db.watch(PIPELINE, resume_after=self._reprise, max_await_time_ms=1000) as flux:
+            while flux.alive and not self._arret.is_set():
+                change = flux.try_next()
+                if change is not None:
+                    self.traiter(change)
+                    traites += 1
+                # Jeton enregistré au plus une fois par seconde après des
+                # modifications, toutes les minutes sinon (l'oplog avance)
+                ecoule = time.monotonic() - sauvegarde
+                if flux.resume_token and (ecoule >= 60 or (traites and ecoule >= 1)):
+                    self._sauver(db, flux.resume_token)
+                    sauvegarde, traites = time.monotonic(), 0
+            if flux.resume_token:
+                self._sauver(db, flux.resume_token)
+
+    def _sauver(self, db, token):
+        if token == self._reprise:
+            return
+        db.stats.update_one({'_id': ID_FLUX},
+                            {'$set': {'resume_token': token, 'date': datetime.now()}},
+                            upsert=True)
+        self._reprise = token
+
+class Cadence:
+    """Rythme d'une connexion SSE : statistiques à l'ouverture puis au plus
+    toutes les FLUX_STATS_INTERVALLE_SECONDES après des modifications,
+    commentaire de maintien sans activité, fin après `duree` secondes
+    (FLUX_DUREE_SECONDES par défaut)."""
+
+    def __init__(self, config, duree=None):
+        self.fin = time.monotonic() + (config['FLUX_DUREE_SECONDES'] if duree is None else duree)
+        self.reconnexion = config['FLUX_RECONNEXION_SECONDES']
+        self.heartbeat = config['FLUX_HEARTBEAT_SECONDES']
+        self.intervalle = config['FLUX_STATS_INTERVALLE_SECONDES']
+        self.prochaines_stats = 0
+        self.stats_en_attente = True
+
+    def entete(self):
+        """Délai de reconnexion du navigateur, envoyé à l'ouverture."""
+        return f'retry: {int(self.reconnexion * 1000)}\n\n'
+
+    def terminee(self):
+        return time.monotonic() >= self.fin
+
+    def stats_dues(self):
+        maintenant = time.monotonic()
+        if not self.stats_en_attente or maintenant < self.prochaines_stats:
+            return False
+        self.prochaines_stats = maintenant + self.intervalle
+        self.stats_en_attente = False
+        return True
+
+    def delai(self):
+        maintenant = time.monotonic()
+        echeance = min(self.fin, maintenant + self.heartbeat)
+        if self.stats_en_attente:
+            echeance = min(echeance, self.prochaines_stats)
+        return max(echeance - maintenant, 0)
+
+    def recevoir(self, evenements, dumps):
+        """Morceaux text/event-stream à envoyer pour les événements reçus."""
+        if evenements:
+            self.stats_en_attente = True
+            return [format_sse(e, dumps) for e in evenements]
+        return [] if self.stats_en_attente else [': ping\n\n']
+
+
+# Écouteur partagé du processus
+ecouteur = EcouteurChangements()
\ No newline at end of file
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from itertools import chain
+from datetime import date, datetime
+from bson import ObjectId
+from flask import Response, request
+from app.models.enregistrement import Enregistrement
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+TAILLE_LOT = 1000
+
+
+def encoder_valeur(valeur):
+    if isinstance(valeur, Enregistrement):
+        return valeur.vers_dict()
+    if isinstance(valeur, ObjectId):
+        return str(valeur)
+    if isinstance(valeur, (datetime, date)):
+        return valeur.isoformat()
+    raise TypeError(f"Type non sérialisable : {type(valeur).__name__}")
+
+
+def _valeur_csv(document, colonne):
+    # Les colonnes pointées ('abonne.nom') lisent les sous-documents joints
+    valeur = document
+    for cle in colonne.split('.'):
+        if not isinstance(valeur, (dict, Enregistrement)):
+            return ''
+        valeur = valeur.get(cle)
+    if valeur is None:
+        return ''
+    if isinstance(valeur, (ObjectId, datetime, date)):
+        return encoder_valeur(valeur)
+    return valeur
+
+
+def _fermer_apres(curseur, lignes):
+    try:
+        yield from lignes
+    finally:
+        curseur.close()
+
+
+def flux_ndjson(curseur):
+    for document in curseur:
+        yield json.dumps(document, default=encoder_valeur, ensure_ascii=False) + '\n'
+
+
+def flux_csv(curseur, colonnes):
+    tampon = io.StringIO()
+    writer = csv.writer(tampon)
+    writer.writerow(colonnes)
+    for i, document in enumerate(curseur, 1):
+        writer.writerow([_valeur_csv(document, c) for c in colonnes])
+        # Un morceau par lot pour ne pas multiplier les petites écritures
+        if i % TAILLE_LOT == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
+
+
+def parse_format():
+    format_export = request.args.get('format', 'ndjson')
+    if format_export not in FORMATS:
+        raise ValueError(f"Format d'export inconnu : {format_export}")
+    return format_export
+
+
+def reponse_export(curseur, format_export, colonnes, nom, modele=None):
+    """Diffuse un curseur PyMongo sans jamais matérialiser la collection.
+
+    Chaque document est encodé au moment où le curseur le renvoie ; la
+    mémoire consommée reste bornée par la taille d'un lot du curseur. Avec
+    un modèle, le curseur renvoie des RawBSONDocument : l'export CSV ne
+    décode que ses colonnes. Le premier morceau est produit avant la
+    réponse : une erreur de la requête remonte encore à la route.
+    """
+    documents = curseur
+    if modele is not None:
+        champs = colonnes if format_export == 'csv' else None
+        documents = (modele.depuis_bson(brut, champs) for brut in curseur)
+    if format_export == 'csv':
+        lignes = flux_csv(documents, colonnes)
+    else:
+        lignes = flux_ndjson(documents)
+    lignes = _fermer_apres(curseur, lignes)
+    premier = next(lignes, '')
+    return Response(
+        chain([premier], lignes),
+        mimetype=FORMATS[format_export],
+        headers={'Content-Disposition': f'attachment; filename={nom}.{format_export}'}
+    )
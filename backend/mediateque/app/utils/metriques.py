@@ -0,0 +1,107 @@
+"""Instrumentation : latence des routes, commandes MongoDB, requêtes lentes.
+
+Les métriques (prometheus_client) sont exposées au format texte de
+Prometheus par /api/metrics. Sous gunicorn et hypercorn, chaque worker écrit
+les siennes dans PROMETHEUS_MULTIPROC_DIR et l'exposition agrège tous les
+workers ; sans cette variable, ce sont celles du processus.
+"""
+import logging
+import os
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from pymongo import monitoring
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bornes en secondes : du find_one par _id (la milliseconde) aux exports
+SEUILS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+REQUETES = Histogram('mediateque_http_requete_secondes', 'Durée des requêtes HTTP par route',
+                     ['endpoint', 'methode', 'statut'], buckets=SEUILS)
+SERIALISATION = Histogram('mediateque_serialisation_secondes',
+                          'Durée de la sérialisation JSON des réponses, par route',
+                          ['endpoint'], buckets=SEUILS)
+COMMANDES = Histogram('mediateque_mongo_commande_secondes', 'Durée des commandes MongoDB',
+                      ['collection', 'commande'], buckets=SEUILS)
+DOCUMENTS = Counter('mediateque_mongo_documents', 'Documents renvoyés ou écrits par les commandes MongoDB',
+                    ['collection', 'commande'])
+ECHECS = Counter('mediateque_mongo_echecs', 'Commandes MongoDB en échec',
+                 ['collection', 'commande'])
+CACHE = Counter('mediateque_cache_entites', "Lectures des caches d'entités, servies (hit) ou non (miss)",
+                ['cache', 'resultat'])
+
+# Champs omis du journal des requêtes lentes : métadonnées du pilote et
+# documents écrits (volumineux)
+CHAMPS_OMIS = {'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber',
+               'documents', 'updates', 'deletes'}
+
+def nom_collection(commande, corps):
+    if not corps:
+        return ''
+    if commande == 'getMore':
+        return corps.get('collection', '')
+    cible = corps.get(commande)
+    return cible if isinstance(cible, str) else ''
+
+def documents_reponse(reponse):
+    """Documents renvoyés (lot du curseur) ou écrits (n) par une commande."""
+    curseur = reponse.get('cursor')
+    if curseur:
+        return len(curseur.get('firstBatch') or curseur.get('nextBatch') or [])
+    n = reponse.get('n', 0)
+    return n if isinstance(n, int) else 0
+
+def observer_requete(endpoint, methode, statut, duree, serialisation=None):
+    endpoint = endpoint or 'inconnu'
+    REQUETES.labels(endpoint, methode, str(statut)).observe(duree)
+    if serialisation is not None:
+        SERIALISATION.labels(endpoint).observe(serialisation)
+
+def configurer_journal(niveau):
+    # Sans effet si la journalisation est déjà configurée (gunicorn, tests)
+    logging.basicConfig(level=niveau, format='%(asctime)s %(levelname)s %(name)s : %(message)s')
+
+def exposer():
+    """Métriques au format texte de Prometheus, tous workers confondus."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registre = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registre)
+        return generate_latest(registre)
+    return generate_latest(REGISTRY)
+
+class EcouteurCommandes(monitoring.CommandListener):
+    """Durée, collection et volume de chaque commande MongoDB.
+
+    Passé aux clients PyMongo (event_listeners) ; les commandes plus longues
+    que MONGO_SLOW_MS sont journalisées avec leur filtre ou leur pipeline.
+    """
+
+    def __init__(self, seuil_lent_ms=None):
+        self.seuil_lent = (seuil_lent_ms if seuil_lent_ms is not None
+                           else Config.MONGO_SLOW_MS) / 1000
+        # Corps des commandes en vol, pour la collection et le journal
+        self._en_vol = {}
+
+    def started(self, event):
+        self._en_vol[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        corps = self._en_vol.pop((event.connection_id, event.request_id), None)
+        collection = nom_collection(event.command_name, corps)
+        duree = event.duration_micros / 1e6
+        COMMANDES.labels(collection, event.command_name).observe(duree)
+        documents = documents_reponse(event.reply)
+        if documents:
+            DOCUMENTS.labels(collection, event.command_name).inc(documents)
+        if duree >= self.seuil_lent:
+            resume = {k: v for k, v in (corps or {}).items() if k not in CHAMPS_OMIS}
+            logger.warning('Requête lente : %s sur %s en %.1f ms, %d documents : %.500s',
+                           event.command_name, collection or event.database_name,
+                           duree * 1000, documents, resume)
+
+    def failed(self, event):
+        corps = self._en_vol.pop((event.connection_id, event.request_id), None)
+        collection = nom_collection(event.command_name, corps)
+        COMMANDES.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        ECHECS.labels(collection, event.command_name).inc()
\ No newline at end of file
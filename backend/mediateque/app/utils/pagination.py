@@ -0,0 +1,117 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import request, jsonify
+from app.models.enregistrement import OPTIONS_BRUTES
+
+LIMITE_MAX = 1000
+LIMITE_DEFAUT = 100
+
+
+def encoder_curseur_score(document):
+    return f"{document['score']!r}_{document['_id']}"
+
+
+def decoder_curseur_score(after):
+    """Décode un curseur de recherche « score_id » en (score, ObjectId)."""
+    try:
+        score, _id = after.split('_', 1)
+        return float(score), ObjectId(_id)
+    except (ValueError, InvalidId, TypeError):
+        raise ValueError("Curseur after invalide")
+
+
+def parse_pagination(par_score=False, args=None):
+    """Lit les paramètres limit, after et fields de la requête courante.
+
+    La pagination est par curseur (keyset) sur _id : `after` est le dernier
+    _id de la page précédente, jamais un offset. Les résultats de recherche,
+    triés par pertinence, utilisent un curseur composé (score, _id).
+    `args` remplace request.args hors d'une requête Flask (API asyncio).
+    """
+    if args is None:
+        args = request.args
+    limit = args.get('limit')
+    after = args.get('after')
+    fields = args.get('fields')
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("Le paramètre limit doit être un entier")
+        if not 1 <= limit <= LIMITE_MAX:
+            raise ValueError(f"Le paramètre limit doit être compris entre 1 et {LIMITE_MAX}")
+    elif after is not None:
+        limit = LIMITE_DEFAUT
+
+    if after is not None and par_score:
+        decoder_curseur_score(after)
+    elif after is not None:
+        try:
+            ObjectId(after)
+        except (InvalidId, TypeError):
+            raise ValueError("Curseur after invalide")
+
+    if fields is not None:
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+        if not fields or any(f.startswith('$') for f in fields):
+            raise ValueError("Paramètre fields invalide")
+
+    return {'limit': limit, 'after': after, 'fields': fields}
+
+
+def projection(fields):
+    if not fields:
+        return None
+    return {field: 1 for field in fields}
+
+
+def requete_paginee(collection, filtre=None, limit=None, after=None, fields=None, modele=None):
+    """Prépare le find() paginé par _id croissant avec projection optionnelle.
+
+    Avec un modèle (app/models), le curseur renvoie des RawBSONDocument
+    limités aux champs demandés, ou à ceux du modèle.
+    """
+    filtre = dict(filtre or {})
+    if after:
+        filtre['_id'] = {'$gt': ObjectId(after)}
+    if modele is not None:
+        collection = collection.with_options(codec_options=OPTIONS_BRUTES)
+        fields = fields or modele.CHAMPS
+    curseur = collection.find(filtre, projection(fields))
+    if limit:
+        curseur = curseur.sort('_id', 1).limit(limit)
+    return curseur
+
+
+def paginer(collection, filtre=None, modele=None, **pagination):
+    """Page de documents, ou d'enregistrements du modèle décodés depuis le
+    BSON brut : seuls les champs projetés sont décodés."""
+    curseur = requete_paginee(collection, filtre, modele=modele, **pagination)
+    if modele is None:
+        return list(curseur)
+    fields = pagination.get('fields')
+    return [modele.depuis_bson(brut, fields) for brut in curseur]
+
+
+async def paginer_async(collection, filtre=None, modele=None, **pagination):
+    """Variante de paginer pour une collection du pilote asyncio."""
+    curseur = requete_paginee(collection, filtre, modele=modele, **pagination)
+    if modele is None:
+        return await curseur.to_list()
+    fields = pagination.get('fields')
+    return [modele.depuis_bson(brut, fields) async for brut in curseur]
+
+
+def page(items, pagination, curseur=lambda item: str(item['_id'])):
+    """Enveloppe une page avec son curseur suivant, ou renvoie la liste brute
+    lorsque la pagination n'a pas été demandée (compatibilité)."""
+    limit = pagination['limit']
+    if not limit:
+        return items
+    next_cursor = curseur(items[-1]) if len(items) == limit else None
+    return {'data': items, 'next_cursor': next_cursor}
+
+
+def reponse_paginee(items, pagination, curseur=lambda item: str(item['_id'])):
+    return jsonify(page(items, pagination, curseur))
@@ -0,0 +1,36 @@
+"""Politiques de lecture et d'écriture par classe d'opération.
+
+Les services ne règlent jamais read_preference ni les niveaux de
+concordance eux-mêmes : ils demandent leur collection à collection(), qui
+applique la politique de la classe d'opération. Une collection demandée
+sans politique garde les réglages du client (primaire).
+"""
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+from config import Config
+
+# Statistiques, exports, recherche et historiques : servis par un secondaire
+# dont le retard ne dépasse pas MONGO_MAX_STALENESS_SECONDS, le primaire
+# à défaut
+ANALYTIQUE = 'analytique'
+# Emprunts et retours : primaire, lectures et écritures majoritaires
+CRITIQUE = 'critique'
+
+POLITIQUES = {
+    ANALYTIQUE: {
+        'read_preference': SecondaryPreferred(max_staleness=Config.MONGO_MAX_STALENESS_SECONDS)
+    },
+    CRITIQUE: {
+        'read_preference': Primary(),
+        'read_concern': ReadConcern('majority'),
+        'write_concern': WriteConcern(w='majority')
+    }
+}
+
+
+def collection(db, nom, politique=None):
+    """Collection `nom` de db (PyMongo ou pilote asyncio) sous une politique."""
+    if politique is None:
+        return db[nom]
+    return db.get_collection(nom, **POLITIQUES[politique])
\ No newline at end of file
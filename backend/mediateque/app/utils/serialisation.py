@@ -0,0 +1,54 @@
+import decimal
+import time
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import JSONProvider
+from app.models.enregistrement import Enregistrement
+
+# Les dates naïves (datetime.now()) sont émises en UTC explicite, comme le
+# faisait le fournisseur JSON par défaut de Flask
+OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def encoder_bson(valeur):
+    """Types BSON inconnus d'orjson, à toute profondeur du document."""
+    if isinstance(valeur, Enregistrement):
+        return valeur.vers_dict()
+    if isinstance(valeur, ObjectId):
+        return str(valeur)
+    if isinstance(valeur, Decimal128):
+        return str(valeur.to_decimal())
+    if isinstance(valeur, decimal.Decimal):
+        return str(valeur)
+    raise TypeError(f"Type non sérialisable : {type(valeur).__name__}")
+
+
+class ReponseJSON(JSONProvider):
+    """Fournisseur JSON de l'application, basé sur orjson.
+
+    Les documents MongoDB sont sérialisés tels quels (ObjectId et
+    Decimal128 en chaînes, dates ISO 8601) : les routes n'ont plus à copier
+    chaque résultat pour convertir son _id. Sert aussi l'API asyncio, dont
+    le fournisseur JSON a la même interface.
+    """
+
+    def options(self):
+        # Sortie indentée en debug, comme le fournisseur par défaut
+        return OPTIONS | orjson.OPT_INDENT_2 if self._app.debug else OPTIONS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=encoder_bson, option=self.options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Les octets d'orjson vont directement dans la réponse, sans passer par str
+        obj = self._prepare_response_obj(args, kwargs)
+        debut = time.perf_counter()
+        corps = orjson.dumps(obj, default=encoder_bson,
+                             option=self.options() | orjson.OPT_APPEND_NEWLINE)
+        response = self._app.response_class(corps, mimetype='application/json')
+        # Relevé par l'instrumentation des routes (app/utils/metriques.py)
+        response.duree_serialisation = time.perf_counter() - debut
+        return response
\ No newline at end of file
@@ -0,0 +1,25 @@
+from flask import current_app
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+from app import mongo
+
+
+def executer_transaction(operation):
+    """Exécute operation(session) dans une transaction multi-documents.
+
+    with_transaction relance l'opération entière sur TransientTransactionError
+    (conflit d'écriture entre deux emprunts concurrents par exemple) et le
+    commit sur UnknownTransactionCommitResult. Une exception levée par
+    l'opération annule la transaction et est propagée telle quelle.
+
+    Les transactions exigent un replica set ; MONGO_TRANSACTIONS=false les
+    désactive (instance autonome, mongomock) et l'opération reçoit None.
+    """
+    if not current_app.config['MONGO_TRANSACTIONS']:
+        return operation(None)
+    with mongo.cx.start_session() as session:
+        return session.with_transaction(
+            operation,
+            read_concern=ReadConcern('snapshot'),
+            write_concern=WriteConcern('majority')
+        )
@@ -0,0 +1,57 @@
+"""GET conditionnels : ETag dérivé des versions des collections.
+
+Chaque écriture incrémente la version des collections qu'elle modifie
+(VersionService). Une route déclare les collections dont elle lit les
+données ; tant que leurs versions ne bougent pas, sa réponse est la même
+et un client qui présente l'ETag reçu reçoit un 304, sans requête MongoDB
+ni sérialisation : les versions sont servies par versions_cache.
+"""
+import logging
+from functools import wraps
+from flask import current_app, make_response, request
+
+logger = logging.getLogger(__name__)
+
+# Document de la collection stats portant les versions des collections
+ID_VERSIONS = 'versions'
+
+
+def etag(versions, collections):
+    # L'époque, tirée à la création du document, distingue deux bases
+    # (ou une base recréée) dont les compteurs repartent de zéro
+    return '.'.join([versions.get('epoque', '0')] +
+                    [str(versions.get(collection, 0)) for collection in collections])
+
+
+def non_modifie(tag):
+    reponse = current_app.response_class(status=304)
+    reponse.set_etag(tag)
+    reponse.headers['Cache-Control'] = 'no-cache'
+    return reponse
+
+
+def etiqueter(reponse, tag):
+    if reponse.status_code == 200:
+        reponse.set_etag(tag)
+        # Le navigateur revalide à chaque affichage avec If-None-Match
+        reponse.headers['Cache-Control'] = 'no-cache'
+    return reponse
+
+
+def conditionnel(versions, *collections):
+    """Décore une route GET dont la réponse ne dépend que de `collections`
+    (et de l'URL) : 304 si If-None-Match porte l'ETag courant, réponse
+    étiquetée sinon. `versions` est un VersionService."""
+    def decorateur(vue):
+        @wraps(vue)
+        def route(*args, **kwargs):
+            try:
+                tag = etag(versions.lire(), collections)
+            except Exception:
+                logger.exception("Versions illisibles : réponse sans ETag")
+                return vue(*args, **kwargs)
+            if request.if_none_match.contains(tag):
+                return non_modifie(tag)
+            return etiqueter(make_response(vue(*args, **kwargs)), tag)
+        return route
+    return decorateur
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""Lectures des emprunts en cours et des historiques, avant et après archivage.
+
+    python -m benchmarks.bench_archives [--echelle 100k] [--graine 42] [--generer]
+        [--age 30] [--repetitions 5]
+
+Sur le jeu de benchmarks.generateur (recréé par --generer), mesure le
+comptage et la pagination des emprunts en retard, les statistiques
+d'emprunts et l'historique d'un abonné, puis archive les emprunts retournés
+depuis plus de --age jours (le jeu ne couvre que quelques mois) et refait
+les mêmes mesures. Les emprunts archivés sont ensuite remis dans emprunts.
+Les historiques relisent les archives par $unionWith : MongoDB requis, pas
+de --memoire.
+"""
+from datetime import timedelta
+
+from benchmarks.common import afficher_tableau, build_app, chronometrer, parser
+from benchmarks.generateur import ID_JEU, generer
+from app import mongo
+from app.services.archive_service import ArchiveService
+from app.services.emprunt_service import EmpruntService
+from app.utils.archives import ID_ARCHIVAGE
+from app.utils.cache import archives_cache
+
+
+def mesurer(service, abonne_id, repetitions):
+    mesures = [
+        ('emprunts en retard, comptage', service.get_emprunts_en_retard_count),
+        ('emprunts en retard, page de 50', lambda: service.get_emprunts_en_retard(limit=50)),
+        ('statistiques des emprunts', service.get_stats),
+        ('historique abonné, page de 50',
+         lambda: service.get_historique_emprunts_abonne(abonne_id, limit=50)),
+    ]
+    return {nom: chronometrer(lire, repetitions) for nom, lire in mesures}
+
+
+def restaurer(archives):
+    # Les emprunts archivés retournent dans emprunts, partitions supprimées
+    for nom in archives.partitions():
+        mongo.db[nom].aggregate([{'$merge': {'into': 'emprunts', 'whenMatched': 'keepExisting'}}])
+        mongo.db[nom].drop()
+    mongo.db.stats.delete_one({'_id': ID_ARCHIVAGE})
+    archives_cache.invalidate()
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--echelle', default='100k')
+    args.add_argument('--graine', type=int, default=42)
+    args.add_argument('--generer', action='store_true', help='recréer le jeu dans MongoDB')
+    args.add_argument('--age', type=int, default=30, help='âge en jours des retours archivés')
+    args.add_argument('--repetitions', type=int, default=5)
+    args = args.parse_args()
+    if args.memoire:
+        raise SystemExit('Les historiques utilisent $unionWith : MongoDB requis')
+
+    app = build_app()
+    with app.app_context():
+        if args.generer:
+            generer(args.echelle, args.graine)
+        if not mongo.db.stats.find_one({'_id': ID_JEU}):
+            raise SystemExit('Aucun jeu de données : lancer benchmarks.generateur ou passer --generer')
+        service = EmpruntService()
+        abonne_id = str(mongo.db.abonnes.find_one({}, {'_id': 1})['_id'])
+        avant = mesurer(service, abonne_id, args.repetitions), mongo.db.emprunts.estimated_document_count()
+
+        archives = ArchiveService()
+        archives.age = timedelta(days=args.age)
+        rapport = archives.archiver()
+        archives_cache.invalidate()
+        apres = mesurer(service, abonne_id, args.repetitions), mongo.db.emprunts.estimated_document_count()
+        restaurer(archives)
+
+    print(f"{rapport['archives']} emprunts archivés en {rapport['lots']} lots "
+          f"({rapport['duree_ms']:.0f} ms) ; emprunts : {avant[1]} avant, {apres[1]} après")
+    afficher_tableau(['lecture', 'avant (ms)', 'après (ms)'],
+                     [[nom, f'{avant[0][nom]:.1f}', f'{apres[0][nom]:.1f}'] for nom in avant[0]])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Latence des services synchrones (Flask) et asyncio (app.aio).
+
+    python -m benchmarks.bench_async [--repetitions 50] [--latence 2] [--clients 32]
+
+Mesure la durée moyenne de chaque opération, puis le temps de N cycles
+emprunt/retour simultanés (threads côté Flask, tâches côté asyncio).
+--latence ajoute un délai (ms) avant chaque aller-retour MongoDB pour
+simuler un serveur distant : c'est là que les requêtes lancées ensemble
+par gather font la différence. Nécessite le MongoDB désigné par MONGO_URI
+(le pilote asyncio n'a pas d'équivalent mongomock).
+"""
+import asyncio
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (afficher_tableau, build_app, compter_requetes,
+                               parser, vider)
+from app import mongo
+from app.aio import create_async_app
+from app.aio import mongo as mongo_aio
+from app.aio.services.abonne_service import AbonneService as AbonneServiceAio
+from app.aio.services.emprunt_service import EmpruntService as EmpruntServiceAio
+from app.aio.services.stats_service import StatsService as StatsServiceAio
+from app.services.abonne_service import AbonneService
+from app.services.emprunt_service import EmpruntService
+from app.services.stats_service import StatsService
+
+
+class _CollectionRalentie:
+    def __init__(self, collection, latence):
+        self._collection = collection
+        self._latence = latence
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def appel(*args, **kwargs):
+            await asyncio.sleep(self._latence)
+            return await attr(*args, **kwargs)
+        return appel
+
+
+class _BaseRalentie:
+    def __init__(self, db, latence):
+        self._db = db
+        self._latence = latence
+
+    def __getattr__(self, name):
+        return _CollectionRalentie(self._db[name], self._latence)
+
+    def get_collection(self, name, **options):
+        return _CollectionRalentie(self._db.get_collection(name, **options), self._latence)
+
+
+def preparer(clients):
+    vider('documents', 'abonnes', 'emprunts', 'stats')
+    documents = mongo.db.documents.insert_many(
+        [{'titre': f'Titre {i}', 'exemplaires_total': 1, 'exemplaires_disponibles': 1,
+          'disponible': True, 'emprunts': []}
+         for i in range(clients)]).inserted_ids
+    abonnes = mongo.db.abonnes.insert_many(
+        [{'nom': f'Nom {i}', 'emprunts_actuels': [], 'historique_emprunts': []}
+         for i in range(clients)]).inserted_ids
+    StatsService().reconcilier_compteurs()
+    return [(str(a), str(d)) for a, d in zip(abonnes, documents)]
+
+
+def mesurer_sync(app, args, paires):
+    emprunts, abonnes, stats = EmpruntService(), AbonneService(), StatsService()
+    abonne_id, document_id = paires[0]
+
+    def cycle(paire):
+        with app.app_context():
+            emprunts.enregistrer_retour(emprunts.creer_emprunt(*paire))
+
+    operations = {
+        'fiche abonné': lambda: abonnes.find_by_id(abonne_id),
+        'stats': stats.calculer_stats,
+        'emprunt + retour': lambda: cycle((abonne_id, document_id))
+    }
+    resultats = {}
+    with app.app_context(), compter_requetes(args.latence / 1000):
+        for nom, fn in operations.items():
+            debut = time.perf_counter()
+            for _ in range(args.repetitions):
+                fn()
+            resultats[nom] = (time.perf_counter() - debut) * 1000 / args.repetitions
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as executor:
+            list(executor.map(cycle, paires))
+        resultats['concurrence'] = (time.perf_counter() - debut) * 1000
+    return resultats
+
+
+async def mesurer_async(args, paires):
+    app = create_async_app({'MONGO_AUTO_INDEX': False})
+    await app.startup()
+    db = mongo_aio.db
+    mongo_aio.db = _BaseRalentie(db, args.latence / 1000)
+    emprunts, abonnes, stats = EmpruntServiceAio(), AbonneServiceAio(), StatsServiceAio()
+    abonne_id, document_id = paires[0]
+
+    async def cycle(paire):
+        await emprunts.enregistrer_retour(await emprunts.creer_emprunt(*paire))
+
+    operations = {
+        'fiche abonné': lambda: abonnes.find_by_id(abonne_id),
+        'stats': stats.calculer_stats,
+        'emprunt + retour': lambda: cycle((abonne_id, document_id))
+    }
+    resultats = {}
+    try:
+        async with app.app_context():
+            for nom, fn in operations.items():
+                debut = time.perf_counter()
+                for _ in range(args.repetitions):
+                    await fn()
+                resultats[nom] = (time.perf_counter() - debut) * 1000 / args.repetitions
+            debut = time.perf_counter()
+            await asyncio.gather(*(cycle(paire) for paire in paires))
+            resultats['concurrence'] = (time.perf_counter() - debut) * 1000
+    finally:
+        mongo_aio.db = db
+        await app.shutdown()
+    return resultats
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--repetitions', type=int, default=50)
+    args.add_argument('--latence', type=float, default=0, help='délai simulé par aller-retour (ms)')
+    args.add_argument('--clients', type=int, default=32)
+    args = args.parse_args()
+    if args.memoire:
+        raise SystemExit("Le pilote asyncio n'a pas d'équivalent mongomock : lancer contre MONGO_URI")
+
+    app = build_app()
+    with app.app_context():
+        paires = preparer(args.clients)
+    synchrone = mesurer_sync(app, args, paires)
+    asynchrone = asyncio.run(mesurer_async(args, paires))
+    with app.app_context():
+        vider('documents', 'abonnes', 'emprunts', 'stats')
+
+    lignes = [[nom, f'{synchrone[nom]:.2f}', f'{asynchrone[nom]:.2f}',
+               f'{synchrone[nom] / asynchrone[nom]:.1f}x']
+              for nom in ['fiche abonné', 'stats', 'emprunt + retour']]
+    lignes.append([f'{args.clients} cycles simultanés', f"{synchrone['concurrence']:.0f}",
+                   f"{asynchrone['concurrence']:.0f}",
+                   f"{synchrone['concurrence'] / asynchrone['concurrence']:.1f}x"])
+    print(f'Latence simulée : {args.latence:g} ms par aller-retour')
+    afficher_tableau(['opération', 'flask ms', 'asyncio ms', 'gain'], lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare les retours un par un et POST /api/emprunts/retours/bulk.
+
+    python -m benchmarks.bench_bulk [--tailles 100 500]
+
+Nécessite un vrai MongoDB (MONGO_URI) : le bulk_write de mongomock n'est
+pas compatible avec les versions récentes de PyMongo.
+"""
+import time
+
+from benchmarks.common import (afficher_tableau, build_app, compter_requetes,
+                               parser, vider)
+from app import mongo
+from app.services.emprunt_service import EmpruntService
+
+
+def preparer(taille):
+    vider('documents', 'abonnes', 'emprunts', 'stats')
+    documents = mongo.db.documents.insert_many(
+        [{'titre': f'Titre {i}', 'exemplaires_total': 1, 'exemplaires_disponibles': 1,
+          'disponible': True, 'emprunts': []}
+         for i in range(taille)]).inserted_ids
+    abonnes = mongo.db.abonnes.insert_many(
+        [{'nom': f'Nom {i}', 'emprunts_actuels': [], 'historique_emprunts': []}
+         for i in range(max(1, taille // 10))]).inserted_ids
+    demandes = [{'abonne_id': str(abonnes[i % len(abonnes)]), 'document_id': str(d)}
+                for i, d in enumerate(documents)]
+    return demandes
+
+
+def mesurer(fn):
+    with compter_requetes() as compteur:
+        debut = time.perf_counter()
+        fn()
+        duree = time.perf_counter() - debut
+    return compteur['requetes'], duree * 1000
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--tailles', type=int, nargs='+', default=[100, 500])
+    args = args.parse_args()
+    if args.memoire:
+        raise SystemExit("bulk_write n'est pas pris en charge par mongomock : lancer contre MONGO_URI")
+
+    app = build_app()
+    service = EmpruntService()
+    lignes = []
+    with app.app_context():
+        for taille in args.tailles:
+            demandes = preparer(taille)
+            ids = [service.creer_emprunt(d['abonne_id'], d['document_id']) for d in demandes]
+            requetes, ms = mesurer(lambda: [service.enregistrer_retour(i) for i in ids])
+            lignes.append([taille, 'retours un par un', requetes, f'{ms:.0f}'])
+
+            demandes = preparer(taille)
+            requetes, ms = mesurer(lambda: service.creer_emprunts_bulk(demandes))
+            lignes.append([taille, 'emprunts bulk', requetes, f'{ms:.0f}'])
+            ids = [e['_id'] for e in mongo.db.emprunts.find({}, {'_id': 1})]
+            requetes, ms = mesurer(lambda: service.enregistrer_retours_bulk(ids))
+            lignes.append([taille, 'retours bulk', requetes, f'{ms:.0f}'])
+        vider('documents', 'abonnes', 'emprunts', 'stats')
+    afficher_tableau(['lot', 'méthode', 'requêtes', 'ms'], lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Historique d'emprunts joint par $lookup ou depuis les caches d'entités.
+
+    python -m benchmarks.bench_cache_entites [--abonnes 50] [--documents 200]
+        [--historique 40] [--lectures 500] [--latence 0] [--memoire]
+
+Chaque abonné a --historique emprunts pris parmi --documents documents : les
+mêmes abonnés et documents reviennent d'une page à l'autre. Les lectures
+tirent un abonné au hasard et lisent la première page de son historique.
+--latence ajoute un délai (ms) par aller-retour MongoDB.
+"""
+import random
+import time
+
+from bson import ObjectId
+
+from benchmarks.common import afficher_tableau, build_app, compter_requetes, parser, vider
+from app import mongo
+from app.services.emprunt_service import EmpruntService
+from app.utils.cache import abonnes_cache, documents_cache
+from app.utils.politiques import ANALYTIQUE, collection
+
+
+def preparer(args):
+    vider('documents', 'abonnes', 'emprunts')
+    documents = mongo.db.documents.insert_many(
+        [{'titre': f'Titre {i}', 'auteur': 'Auteur', 'type': 'livre', 'isbn': str(i),
+          'exemplaires_total': 1, 'exemplaires_disponibles': 1,
+          'disponible': True, 'emprunts': []} for i in range(args.documents)]).inserted_ids
+    abonnes = mongo.db.abonnes.insert_many(
+        [{'nom': f'Nom {i}', 'prenom': 'Prénom', 'email': f'{i}@exemple.fr',
+          'emprunts_actuels': [], 'historique_emprunts': []}
+         for i in range(args.abonnes)]).inserted_ids
+    rng = random.Random(42)
+    mongo.db.emprunts.insert_many([{'_id': ObjectId(), 'abonne_id': abonne_id,
+                                    'document_id': rng.choice(documents), 'statut': 'retourne'}
+                                   for abonne_id in abonnes for _ in range(args.historique)])
+    return [str(a) for a in abonnes]
+
+
+def lookup(service, abonne_id):
+    # Lecture d'avant le cache : jointure $lookup dans l'agrégation
+    pipeline = service._pipeline_jointure({'abonne_id': ObjectId(abonne_id)}, limit=20)
+    return list(collection(mongo.db, 'emprunts', ANALYTIQUE).aggregate(pipeline))
+
+
+def mesurer(nom, lire, abonnes, args, lignes, froid=False):
+    rng = random.Random(0)
+    abonnes_cache.vider()
+    documents_cache.vider()
+    avant = documents_cache.compteurs()
+    duree = 0
+    with compter_requetes(args.latence / 1000) as compteur:
+        for _ in range(args.lectures):
+            if froid:
+                abonnes_cache.vider()
+                documents_cache.vider()
+            abonne_id = rng.choice(abonnes)
+            debut = time.perf_counter()
+            lire(abonne_id)
+            duree += time.perf_counter() - debut
+    apres = documents_cache.compteurs()
+    vus = apres['hits'] - avant['hits'] + apres['misses'] - avant['misses']
+    taux = f"{(apres['hits'] - avant['hits']) / vus:.0%}" if vus else '-'
+    lignes.append([nom, f'{duree * 1000 / args.lectures:.2f}',
+                   f"{compteur['requetes'] / args.lectures:.2f}", taux])
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--abonnes', type=int, default=50)
+    args.add_argument('--documents', type=int, default=200)
+    args.add_argument('--historique', type=int, default=40)
+    args.add_argument('--lectures', type=int, default=500)
+    args.add_argument('--latence', type=float, default=0, help='délai simulé par aller-retour (ms)')
+    args = args.parse_args()
+
+    app = build_app(args.memoire)
+    lignes = []
+    with app.app_context():
+        abonnes = preparer(args)
+        service = EmpruntService()
+        historique = lambda abonne_id: service.get_historique_emprunts_abonne(abonne_id, limit=20)
+        mesurer('$lookup', lambda abonne_id: lookup(service, abonne_id), abonnes, args, lignes)
+        mesurer('cache froid', historique, abonnes, args, lignes, froid=True)
+        mesurer('cache chaud', historique, abonnes, args, lignes)
+        vider('documents', 'abonnes', 'emprunts')
+    print(f'{args.lectures} pages de 20 emprunts, {args.abonnes} abonnés, '
+          f'{args.documents} documents, latence simulée {args.latence:g} ms')
+    afficher_tableau(['jointure', 'ms / page', 'requêtes / page', 'hits documents'], lignes)
+
+
+if __name__ == '__main__':
+    main()
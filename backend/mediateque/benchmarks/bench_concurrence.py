@@ -0,0 +1,65 @@
+"""Débit des emprunts/retours concurrents avec réservation transactionnelle.
+
+    python -m benchmarks.bench_concurrence [--threads 1 8 32] [--documents 50]
+
+Chaque thread enchaîne emprunt puis retour sur un document tiré au hasard ;
+les refus (document déjà réservé par un autre thread) sont comptés à part.
+Avec --memoire les transactions sont désactivées (mongomock n'a pas de
+sessions).
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import afficher_tableau, build_app, parser, vider
+from app import mongo
+from app.services.emprunt_service import EmpruntService
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    args.add_argument('--documents', type=int, default=50)
+    args.add_argument('--operations', type=int, default=500)
+    args = args.parse_args()
+
+    random.seed(42)
+    app = build_app(args.memoire)
+    service = EmpruntService()
+    lignes = []
+    with app.app_context():
+        vider('documents', 'abonnes', 'emprunts', 'stats')
+        documents = mongo.db.documents.insert_many(
+            [{'titre': f'Titre {i}', 'exemplaires_total': 1, 'exemplaires_disponibles': 1,
+              'disponible': True, 'emprunts': []}
+             for i in range(args.documents)]).inserted_ids
+        abonnes = mongo.db.abonnes.insert_many(
+            [{'nom': f'Nom {i}', 'emprunts_actuels': [], 'historique_emprunts': []}
+             for i in range(100)]).inserted_ids
+
+    def emprunter_rendre(_):
+        with app.app_context():
+            try:
+                emprunt_id = service.creer_emprunt(str(random.choice(abonnes)),
+                                                   str(random.choice(documents)))
+            except ValueError:
+                return False
+            service.enregistrer_retour(emprunt_id)
+            return True
+
+    for threads in args.threads:
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            resultats = list(executor.map(emprunter_rendre, range(args.operations)))
+        duree = time.perf_counter() - debut
+        reussis = sum(resultats)
+        lignes.append([threads, reussis, len(resultats) - reussis,
+                       f'{duree * 1000:.0f}', f'{reussis / duree:.0f}'])
+
+    with app.app_context():
+        vider('documents', 'abonnes', 'emprunts', 'stats')
+    afficher_tableau(['threads', 'cycles', 'refus', 'ms', 'cycles/s'], lignes)
+
+
+if __name__ == '__main__':
+    main()
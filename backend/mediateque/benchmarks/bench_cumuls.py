@@ -0,0 +1,107 @@
+"""Statistiques d'emprunts lues dans les cumuls ou recalculées sur l'historique.
+
+    python -m benchmarks.bench_cumuls [--echelle 100k] [--graine 42] [--generer]
+        [--repetitions 5] [--nouveaux 1000]
+
+Sur le jeu de benchmarks.generateur (recréé par --generer), mesure :
+- la reconstruction des cumuls (reconstruire-cumuls) ;
+- une mise à jour incrémentale (cumuler-emprunts) après --nouveaux emprunts
+  du jour, qui ne relit que les emprunts du jour du filigrane ;
+- /stats/timeseries par semaine et /stats/top-documents sur un an, lus
+  dans les cumuls, face au même calcul par agrégation de la collection
+  emprunts.
+Les cumuls s'écrivent par $merge : MongoDB requis, pas de --memoire.
+"""
+from datetime import datetime, timedelta
+
+from benchmarks.common import afficher_tableau, build_app, chronometrer, parser
+from benchmarks.generateur import ID_JEU, generer
+from app import mongo
+from app.services.cumul_service import CumulService, jour
+
+DUREE_PRET = timedelta(days=14)
+
+
+def ajouter_emprunts(nombre, maintenant):
+    documents = [d['_id'] for d in mongo.db.documents.find({}, {'_id': 1}).limit(nombre)]
+    abonne = mongo.db.abonnes.find_one({}, {'_id': 1})['_id']
+    mongo.db.emprunts.insert_many([{
+        'abonne_id': abonne, 'document_id': document_id, 'date_emprunt': maintenant,
+        'date_retour_prevue': maintenant + DUREE_PRET, 'date_retour_effective': None,
+        'statut': 'en_cours', 'bench_cumuls': True
+    } for document_id in documents])
+
+
+def series_historique(debut, fin):
+    # Même série que get_series, recalculée sur les emprunts
+    return list(mongo.db.emprunts.aggregate([
+        {'$match': {'date_emprunt': {'$gte': debut, '$lt': fin}}},
+        {'$lookup': {'from': 'documents', 'localField': 'document_id', 'foreignField': '_id',
+                     'pipeline': [{'$project': {'type': 1}}], 'as': 'document'}},
+        {'$group': {'_id': {'periode': {'$dateTrunc': {'date': '$date_emprunt', 'unit': 'week',
+                                                       'startOfWeek': 'monday'}},
+                            'type': {'$first': '$document.type'}},
+                    'emprunts': {'$sum': 1}}}
+    ]))
+
+
+def top_historique(debut, fin):
+    return list(mongo.db.emprunts.aggregate([
+        {'$match': {'date_emprunt': {'$gte': debut, '$lt': fin}}},
+        {'$group': {'_id': '$document_id', 'emprunts': {'$sum': 1}}},
+        {'$sort': {'emprunts': -1, '_id': 1}},
+        {'$limit': 10}
+    ]))
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--echelle', default='100k')
+    args.add_argument('--graine', type=int, default=42)
+    args.add_argument('--generer', action='store_true', help='recréer le jeu dans MongoDB')
+    args.add_argument('--repetitions', type=int, default=5)
+    args.add_argument('--nouveaux', type=int, default=1000)
+    args = args.parse_args()
+    if args.memoire:
+        raise SystemExit('Les cumuls utilisent $merge et $dateTrunc : MongoDB requis')
+
+    app = build_app()
+    service = CumulService()
+    lignes = []
+    with app.app_context():
+        if args.generer:
+            generer(args.echelle, args.graine)
+        if not mongo.db.stats.find_one({'_id': ID_JEU}):
+            raise SystemExit('Aucun jeu de données : lancer benchmarks.generateur ou passer --generer')
+        emprunts = mongo.db.emprunts.estimated_document_count()
+
+        rapport = service.cumuler(reconstruire=True)
+        lignes.append(['reconstruction', f"{rapport['duree_ms']:.0f}"])
+        maintenant = datetime.now()
+        ajouter_emprunts(args.nouveaux, maintenant)
+        rapport = service.cumuler(maintenant + service.marge)
+        lignes.append([f'incrément ({args.nouveaux} emprunts)', f"{rapport['duree_ms']:.0f}"])
+
+        fin = jour(maintenant) + timedelta(days=1)
+        debut = fin - timedelta(days=365)
+        mesures = [
+            ('séries hebdomadaires, cumuls', lambda: service.get_series(debut, fin, 'semaine')),
+            ('séries hebdomadaires, historique', lambda: series_historique(debut, fin)),
+            ('top 10 documents, cumuls', lambda: service.get_top_documents(debut, fin)),
+            ('top 10 documents, historique', lambda: top_historique(debut, fin)),
+        ]
+        for nom, lire in mesures:
+            lignes.append([nom, f'{chronometrer(lire, args.repetitions):.0f}'])
+        cumuls = (mongo.db.cumuls_jours.estimated_document_count(),
+                  mongo.db.cumuls_documents.estimated_document_count())
+
+        mongo.db.emprunts.delete_many({'bench_cumuls': True})
+        service.cumuler(reconstruire=True)
+
+    print(f'{emprunts} emprunts, {cumuls[0]} cumuls par jour et type, '
+          f'{cumuls[1]} cumuls par jour et document')
+    afficher_tableau(['opération', 'ms'], lignes)
+
+
+if __name__ == '__main__':
+    main()
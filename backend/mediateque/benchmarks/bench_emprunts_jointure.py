@@ -0,0 +1,75 @@
+"""Compare la jointure N+1 historique de get_emprunts avec le pipeline $lookup.
+
+    python -m benchmarks.bench_emprunts_jointure [--memoire] [--tailles 100 1000 10000]
+"""
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from benchmarks.common import (afficher_tableau, build_app, chronometrer,
+                               compter_requetes, parser, vider)
+from app import mongo
+from app.services.abonne_service import AbonneService
+from app.services.document_service import DocumentService
+from app.services.emprunt_service import EmpruntService
+
+
+def get_emprunts_n_plus_un():
+    # Ancienne implémentation : un find_one par abonné et par document
+    abonne_service = AbonneService()
+    document_service = DocumentService()
+    emprunts = list(mongo.db.emprunts.find({}))
+    for emprunt in emprunts:
+        emprunt['abonne'] = abonne_service.find_by_id(emprunt['abonne_id'])
+        emprunt['document'] = document_service.find_by_id(emprunt['document_id'])
+    return emprunts
+
+
+def peupler(nb_emprunts):
+    vider('abonnes', 'documents', 'emprunts')
+    nb_abonnes = max(1, nb_emprunts // 5)
+    nb_documents = max(1, nb_emprunts // 2)
+    abonnes = [{'_id': ObjectId(), 'nom': f'Nom{i}', 'prenom': f'Prenom{i}',
+                'email': f'abonne{i}@exemple.fr', 'telephone': '0600000000'}
+               for i in range(nb_abonnes)]
+    documents = [{'_id': ObjectId(), 'titre': f'Titre {i}', 'auteur': f'Auteur {i}',
+                  'type': 'livre', 'disponible': True}
+                 for i in range(nb_documents)]
+    maintenant = datetime.now()
+    emprunts = [{'abonne_id': random.choice(abonnes)['_id'],
+                 'document_id': random.choice(documents)['_id'],
+                 'date_emprunt': maintenant,
+                 'date_retour_prevue': maintenant + timedelta(days=14),
+                 'date_retour_effective': None,
+                 'statut': 'en_cours'}
+                for _ in range(nb_emprunts)]
+    mongo.db.abonnes.insert_many(abonnes)
+    mongo.db.documents.insert_many(documents)
+    mongo.db.emprunts.insert_many(emprunts)
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--tailles', type=int, nargs='+', default=[100, 1000, 10000])
+    args = args.parse_args()
+
+    random.seed(42)
+    app = build_app(args.memoire)
+    service = EmpruntService()
+    lignes = []
+    with app.app_context():
+        for taille in args.tailles:
+            peupler(taille)
+            for nom, fn in [('N+1', get_emprunts_n_plus_un),
+                            ('$lookup', service.get_emprunts)]:
+                with compter_requetes() as compteur:
+                    fn()
+                duree = chronometrer(fn)
+                lignes.append([taille, nom, compteur['requetes'], f'{duree:.1f}'])
+        vider('abonnes', 'documents', 'emprunts')
+    afficher_tableau(['emprunts', 'méthode', 'requêtes', 'ms'], lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Listes et exports décodés en dictionnaires ou en enregistrements compacts.
+
+    python -m benchmarks.bench_enregistrements [--documents 100000] [--graine 42]
+        [--repetitions 3] [--generer] [--memoire]
+
+Les documents de benchmarks.generateur sont encodés en BSON par lots de
+TAILLE_LOT, tels que le serveur les renvoie, puis décodés :
+- dict : décodage complet par le pilote (lecture par défaut) ;
+- enregistrement : RawBSONDocument décodé en Document (app/models) ;
+- enregistrement CSV : seules les colonnes de l'export CSV sont décodées.
+Pour chaque lecture : meilleur temps de décodage, mémoire retenue par la
+liste décodée et pic pendant le décodage (tracemalloc, passe séparée), puis
+temps de sérialisation JSON de la liste par orjson, comme dans les réponses.
+
+Sans --memoire, la même comparaison est refaite sur un find() complet de la
+collection documents de MongoDB (jeu du générateur, recréé par --generer ;
+mongomock ne sait pas renvoyer de RawBSONDocument), plus l'export CSV avec
+ses colonnes projetées par le serveur.
+"""
+import gc
+import random
+import time
+import tracemalloc
+
+import bson
+import orjson
+
+from benchmarks.common import afficher_tableau, build_app, chronometrer, parser
+from benchmarks.generateur import ID_JEU, document, generer
+from app import mongo
+from app.models.document import Document
+from app.models.enregistrement import OPTIONS_BRUTES
+from app.services.document_service import DocumentService
+from app.utils.export import TAILLE_LOT
+from app.utils.pagination import paginer, requete_paginee
+from app.utils.serialisation import OPTIONS, encoder_bson
+
+COLONNES = DocumentService.COLONNES_EXPORT
+
+
+def encoder(args):
+    rng = random.Random(args.graine)
+    lots, lot = [], []
+    for i in range(args.documents):
+        lot.append(bson.encode(document(rng, i)))
+        if len(lot) == TAILLE_LOT:
+            lots.append(b''.join(lot))
+            lot = []
+    if lot:
+        lots.append(b''.join(lot))
+    return lots
+
+
+def lectures_octets(lots):
+    def enregistrements(champs=None):
+        return [Document.depuis_bson(brut, champs)
+                for lot in lots for brut in bson.decode_all(lot, OPTIONS_BRUTES)]
+    return {
+        'dict': lambda: [d for lot in lots for d in bson.decode_all(lot)],
+        'enregistrement': enregistrements,
+        'enregistrement CSV': lambda: enregistrements(COLONNES)
+    }
+
+
+def lectures_mongodb():
+    documents = mongo.db.documents
+    return {
+        'dict': lambda: paginer(documents),
+        'enregistrement': lambda: paginer(documents, modele=Document),
+        'enregistrement CSV': lambda: [Document.depuis_bson(brut, COLONNES) for brut in
+                                       requete_paginee(documents, modele=Document)],
+        # Export CSV tel que servi : colonnes projetées par le serveur
+        'dict CSV projeté': lambda: paginer(documents, fields=COLONNES),
+        'enregistrement CSV projeté': lambda: paginer(documents, modele=Document, fields=COLONNES)
+    }
+
+
+def memoire(lire):
+    gc.collect()
+    tracemalloc.start()
+    resultat = lire()
+    retenue, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultat, retenue, pic
+
+
+def mesurer(lectures, repetitions, lignes):
+    for nom, lire in lectures.items():
+        duree = chronometrer(lire, repetitions)
+        resultat, retenue, pic = memoire(lire)
+        n = len(resultat)
+        debut = time.perf_counter()
+        orjson.dumps(resultat, default=encoder_bson, option=OPTIONS)
+        serialisation = (time.perf_counter() - debut) * 1000
+        lignes.append([nom, n, f'{duree:.0f}', f'{duree * 1000 / n:.2f}',
+                       f'{retenue / n:.0f}', f'{pic / 2 ** 20:.1f}', f'{serialisation:.0f}'])
+        del resultat
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--documents', type=int, default=100_000)
+    args.add_argument('--graine', type=int, default=42)
+    args.add_argument('--repetitions', type=int, default=3)
+    args.add_argument('--generer', action='store_true', help='recréer le jeu dans MongoDB')
+    args = args.parse_args()
+
+    entetes = ['lecture', 'documents', 'décodage ms', 'µs / doc', 'octets / doc',
+               'pic Mio', 'JSON ms']
+    lignes = []
+    mesurer(lectures_octets(encoder(args)), args.repetitions, lignes)
+    print(f'Octets BSON décodés par lots de {TAILLE_LOT} (graine {args.graine})')
+    afficher_tableau(entetes, lignes)
+    if args.memoire:
+        return
+
+    app = build_app()
+    with app.app_context():
+        if args.generer:
+            generer(str(args.documents), args.graine)
+        if not mongo.db.stats.find_one({'_id': ID_JEU}):
+            raise SystemExit('Aucun jeu de données : lancer benchmarks.generateur ou passer --generer')
+        lignes = []
+        mesurer(lectures_mongodb(), args.repetitions, lignes)
+    print('\nfind() sur la collection documents de MongoDB')
+    afficher_tableau(entetes, lignes)
+
+
+if __name__ == '__main__':
+    main()
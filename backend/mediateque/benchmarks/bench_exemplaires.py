@@ -0,0 +1,90 @@
+"""Emprunts concurrents des exemplaires d'un même titre.
+
+    python -m benchmarks.bench_exemplaires [--threads 8 32] [--exemplaires 10 100]
+
+Pour chaque combinaison, un titre possède N exemplaires et deux fois plus
+de demandes d'emprunt que d'exemplaires sont lancées en parallèle : la
+réservation par $inc conditionnel doit en accepter exactement N, sans que
+exemplaires_disponibles passe sous zéro. Tous les emprunts sont ensuite
+rendus en parallèle et le titre doit retrouver ses N exemplaires. Le
+tableau donne le débit des deux phases et le résultat des vérifications.
+Avec --memoire les transactions sont désactivées (mongomock n'a pas de
+sessions) ; mongomock n'exécute pas non plus find_one_and_update de façon
+atomique entre threads, la vérification n'a de sens que contre MongoDB.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+
+from benchmarks.common import afficher_tableau, build_app, parser, vider
+from app import mongo
+from app.services.emprunt_service import EmpruntService
+
+
+def preparer(exemplaires, demandes):
+    vider('documents', 'abonnes', 'emprunts', 'stats')
+    document_id = mongo.db.documents.insert_one(
+        {'titre': 'Titre', 'exemplaires_total': exemplaires,
+         'exemplaires_disponibles': exemplaires, 'disponible': True, 'emprunts': []}).inserted_id
+    abonnes = mongo.db.abonnes.insert_many(
+        [{'nom': f'Nom {i}', 'emprunts_actuels': [], 'historique_emprunts': []}
+         for i in range(demandes)]).inserted_ids
+    return str(document_id), [str(a) for a in abonnes]
+
+
+def en_parallele(app, threads, fn, arguments):
+    def appel(argument):
+        with app.app_context():
+            try:
+                return fn(argument)
+            except ValueError:
+                return None
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        resultats = list(executor.map(appel, arguments))
+    return [r for r in resultats if r is not None], time.perf_counter() - debut
+
+
+def etat(document_id):
+    document = mongo.db.documents.find_one({'_id': ObjectId(document_id)})
+    return document['exemplaires_disponibles'], document['disponible']
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--threads', type=int, nargs='+', default=[8, 32])
+    args.add_argument('--exemplaires', type=int, nargs='+', default=[10, 100])
+    args = args.parse_args()
+
+    app = build_app(args.memoire)
+    service = EmpruntService()
+    lignes = []
+    for threads in args.threads:
+        for exemplaires in args.exemplaires:
+            with app.app_context():
+                document_id, abonnes = preparer(exemplaires, 2 * exemplaires)
+            emprunts, duree_emprunts = en_parallele(
+                app, threads, lambda a: service.creer_emprunt(a, document_id), abonnes)
+            with app.app_context():
+                apres_emprunts = etat(document_id)
+            rendus, duree_retours = en_parallele(
+                app, threads, lambda e: service.enregistrer_retour(e) is not None, emprunts)
+            with app.app_context():
+                apres_retours = etat(document_id)
+            correct = (len(emprunts) == exemplaires and apres_emprunts == (0, False)
+                       and len(rendus) == exemplaires and apres_retours == (exemplaires, True))
+            lignes.append([threads, exemplaires, 2 * exemplaires, len(emprunts),
+                           f'{len(emprunts) / duree_emprunts:.0f}',
+                           f'{len(rendus) / duree_retours:.0f}',
+                           'oui' if correct else f'NON {apres_emprunts} {apres_retours}'])
+
+    with app.app_context():
+        vider('documents', 'abonnes', 'emprunts', 'stats')
+    afficher_tableau(['threads', 'exemplaires', 'demandes', 'accordés', 'emprunts/s',
+                      'retours/s', 'cohérent'], lignes)
+
+
+if __name__ == '__main__':
+    main()
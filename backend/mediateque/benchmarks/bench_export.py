@@ -0,0 +1,64 @@
+"""Compare mémoire et débit de GET /api/documents et de l'export NDJSON/CSV.
+
+    python -m benchmarks.bench_export [--memoire] [--tailles 10000 100000]
+
+Le pic mémoire est mesuré avec tracemalloc pendant toute la requête, corps
+de réponse consommé compris.
+"""
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.common import afficher_tableau, build_app, parser, vider
+from app import mongo
+
+
+def peupler(taille):
+    vider('documents')
+    lot = []
+    for i in range(taille):
+        lot.append({'titre': f'Titre {i}', 'auteur': f'Auteur {i % 500}',
+                    'type': ['livre', 'dvd', 'cd'][i % 3], 'isbn': f'978{i:010d}',
+                    'disponible': True, 'emprunts': [], 'date_ajout': datetime.now()})
+        if len(lot) == 5000:
+            mongo.db.documents.insert_many(lot)
+            lot = []
+    if lot:
+        mongo.db.documents.insert_many(lot)
+
+
+def mesurer(client, url):
+    tracemalloc.start()
+    debut = time.perf_counter()
+    response = client.get(url)
+    octets = sum(len(morceau) for morceau in response.response)
+    duree = time.perf_counter() - debut
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duree, pic, octets
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--tailles', type=int, nargs='+', default=[10000, 100000])
+    args = args.parse_args()
+
+    app = build_app(args.memoire)
+    client = app.test_client()
+    lignes = []
+    with app.app_context():
+        for taille in args.tailles:
+            peupler(taille)
+            for url in ['/api/documents', '/api/documents/export?format=ndjson',
+                        '/api/documents/export?format=csv']:
+                duree, pic, octets = mesurer(client, url)
+                lignes.append([taille, url, f'{pic / 2**20:.1f}',
+                               f'{duree * 1000:.0f}', f'{taille / duree:.0f}',
+                               f'{octets / 2**20:.1f}'])
+        vider('documents')
+    afficher_tableau(['documents', 'endpoint', 'pic Mo', 'ms', 'docs/s', 'réponse Mo'],
+                     lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Taille des documents et latence des listes, avant et après bornage des
+historiques embarqués.
+
+    python -m benchmarks.bench_historique [--lignes 500] [--historique 2000] [--memoire]
+
+Chaque abonné et chaque document reçoit --historique identifiants
+d'emprunts, comme après des années de $push non bornés, puis
+EmpruntService.borner_historiques les ramène à HISTORIQUE_EMBARQUE_MAX.
+"""
+import bson
+from bson import ObjectId
+
+from benchmarks.common import afficher_tableau, build_app, chronometrer, parser, vider
+from app import mongo
+from app.services.abonne_service import AbonneService
+from app.services.document_service import DocumentService
+from app.services.emprunt_service import EmpruntService
+
+
+def preparer(lignes, historique):
+    vider('documents', 'abonnes')
+    for _ in range(lignes):
+        ids = [str(ObjectId()) for _ in range(historique)]
+        mongo.db.abonnes.insert_one({'nom': 'Nom', 'prenom': 'Prénom', 'emprunts_actuels': [],
+                                     'historique_emprunts': ids})
+        mongo.db.documents.insert_one({'titre': 'Titre', 'auteur': 'Auteur', 'type': 'livre',
+                                       'disponible': True, 'emprunts': ids})
+
+
+def mesurer(phase, lignes):
+    services = {'abonnes': AbonneService(), 'documents': DocumentService()}
+    for collection, service in services.items():
+        tailles = [len(bson.encode(d)) for d in mongo.db[collection].find()]
+        ms = chronometrer(lambda: service.find_all(limit=100, after=None, fields=None))
+        lignes.append([collection, phase, f'{sum(tailles) / len(tailles) / 1024:.1f}',
+                       f'{max(tailles) / 1024:.1f}', f'{ms:.1f}'])
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--lignes', type=int, default=500)
+    args.add_argument('--historique', type=int, default=2000)
+    args = args.parse_args()
+
+    app = build_app(args.memoire)
+    lignes = []
+    with app.app_context():
+        preparer(args.lignes, args.historique)
+        mesurer('non borné', lignes)
+        service = EmpruntService()
+        modifies = service.borner_historiques()
+        mesurer(f'borné à {service.historique_max}', lignes)
+        vider('documents', 'abonnes')
+    print(f"Documents tronqués : {modifies}")
+    afficher_tableau(['collection', 'historique', 'moy. Ko', 'max Ko', 'page de 100 (ms)'], lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Sérialisation de 10 000 emprunts : ancien chemin contre ReponseJSON.
+
+    python -m benchmarks.bench_json [--emprunts 10000]
+
+L'ancien chemin copie chaque emprunt pour convertir son _id puis passe par
+le fournisseur JSON par défaut de Flask (module json de la bibliothèque
+standard). Le nouveau sérialise les documents tels quels avec orjson.
+Aucune base n'est nécessaire.
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.common import afficher_tableau, chronometrer, parser
+from app.utils.serialisation import ReponseJSON
+
+
+def generer(nombre):
+    debut = datetime(2024, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'abonne_id': str(ObjectId()),
+        'document_id': str(ObjectId()),
+        'date_emprunt': debut + timedelta(minutes=i),
+        'date_retour_prevue': debut + timedelta(days=14, minutes=i),
+        'date_retour_effective': None,
+        'statut': 'en_cours',
+        'abonne': {'nom': f'Nom {i}', 'prenom': 'Prénom', 'email': f'abonne{i}@exemple.fr',
+                   'telephone': '0102030405'},
+        'document': {'titre': f'Titre {i}', 'auteur': 'Auteur', 'type': 'livre',
+                     'isbn': f'978{i:010d}'}
+    } for i in range(nombre)]
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--emprunts', type=int, default=10000)
+    args = args.parse_args()
+
+    emprunts = generer(args.emprunts)
+    ancien, nouveau = Flask('ancien'), Flask('nouveau')
+    ancien.json = DefaultJSONProvider(ancien)
+    nouveau.json = ReponseJSON(nouveau)
+
+    def chemin_ancien():
+        with ancien.app_context():
+            return jsonify([{**e, '_id': str(e['_id'])} for e in emprunts]).get_data()
+
+    def chemin_nouveau():
+        with nouveau.app_context():
+            return jsonify(emprunts).get_data()
+
+    lignes = []
+    for nom, fn in [('copie + json', chemin_ancien), ('orjson', chemin_nouveau)]:
+        taille = len(fn())
+        lignes.append([nom, f'{chronometrer(fn, repetitions=5):.1f}', f'{taille / 1024:.0f}'])
+    print(f'{args.emprunts} emprunts joints')
+    afficher_tableau(['chemin', 'ms', 'Ko'], lignes)
+
+
+if __name__ == '__main__':
+    main()
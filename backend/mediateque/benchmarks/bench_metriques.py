@@ -0,0 +1,64 @@
+"""Coût de l'instrumentation : hooks de route et écouteur de commandes.
+
+    python -m benchmarks.bench_metriques [--requetes 5000] [--commandes 100000]
+
+Compare une route JSON triviale servie avec et sans les hooks de
+app.instrumenter, puis mesure started + succeeded de EcouteurCommandes
+par commande. Aucune base n'est nécessaire.
+"""
+from types import SimpleNamespace
+
+from flask import Flask, jsonify
+
+from benchmarks.common import afficher_tableau, chronometrer, parser
+from app import instrumenter
+from app.utils.metriques import EcouteurCommandes
+from app.utils.serialisation import ReponseJSON
+
+
+def application(instrumentee):
+    app = Flask('instrumentee' if instrumentee else 'nue')
+    app.json = ReponseJSON(app)
+
+    @app.route('/ping')
+    def ping():
+        return jsonify({'ok': True})
+
+    if instrumentee:
+        instrumenter(app)
+    return app.test_client()
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--requetes', type=int, default=5000)
+    args.add_argument('--commandes', type=int, default=100000)
+    args = args.parse_args()
+
+    lignes = []
+    durees = {}
+    for nom, instrumentee in [('route sans hooks', False), ('route instrumentée', True)]:
+        client = application(instrumentee)
+        durees[nom] = chronometrer(lambda: [client.get('/ping') for _ in range(args.requetes)])
+        lignes.append([nom, f'{durees[nom] * 1000 / args.requetes:.1f}'])
+    surcout = (durees['route instrumentée'] - durees['route sans hooks']) * 1000 / args.requetes
+    lignes.append(['surcoût par requête', f'{surcout:.1f}'])
+
+    ecouteur = EcouteurCommandes()
+    debut = SimpleNamespace(connection_id=('localhost', 27017), request_id=1, command_name='find',
+                            command={'find': 'documents', 'filter': {'_id': 1}})
+    fin = SimpleNamespace(connection_id=('localhost', 27017), request_id=1, command_name='find',
+                          database_name='mediatheque', duration_micros=800,
+                          reply={'cursor': {'firstBatch': [{}]}})
+
+    def commandes():
+        for _ in range(args.commandes):
+            ecouteur.started(debut)
+            ecouteur.succeeded(fin)
+    ms = chronometrer(commandes)
+    lignes.append(['écouteur, par commande', f'{ms * 1000 / args.commandes:.1f}'])
+    afficher_tableau(['mesure', 'µs'], lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare l'ancienne recherche $regex et la recherche plein texte.
+
+    python -m benchmarks.bench_recherche [--taille 100000]
+
+Nécessite un vrai MongoDB (MONGO_URI) : mongomock n'implémente pas $text.
+"""
+import random
+
+from benchmarks.common import (afficher_tableau, build_app, chronometrer,
+                               parser, vider)
+from app import mongo
+from app.indexes import ensure_indexes
+from app.services.document_service import DocumentService
+
+MOTS = ['prince', 'étoile', 'mer', 'nuit', 'château', 'jardin', 'été', 'voyage',
+        'rivière', 'forêt', 'hiver', 'ombre', 'lumière', 'secret', 'île']
+AUTEURS = ['Hugo', 'Zola', 'Camus', 'Sand', 'Verne', 'Duras', 'Proust', 'Colette']
+
+
+def recherche_regex(query):
+    # Ancienne implémentation : $regex insensible à la casse sur deux champs
+    return list(mongo.db.documents.find({
+        '$or': [
+            {'titre': {'$regex': query, '$options': 'i'}},
+            {'auteur': {'$regex': query, '$options': 'i'}}
+        ]
+    }).limit(20))
+
+
+def peupler(taille):
+    vider('documents')
+    lot = []
+    for i in range(taille):
+        titre = ' '.join(random.choice(MOTS) for _ in range(3)).capitalize()
+        lot.append({'titre': titre, 'auteur': random.choice(AUTEURS), 'type': 'livre'})
+        if len(lot) == 10000:
+            mongo.db.documents.insert_many(lot)
+            lot = []
+    if lot:
+        mongo.db.documents.insert_many(lot)
+    ensure_indexes(mongo.db)
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--taille', type=int, default=100000)
+    args = args.parse_args()
+    if args.memoire:
+        raise SystemExit("mongomock n'implémente pas $text : lancer contre MONGO_URI")
+
+    random.seed(42)
+    app = build_app()
+    service = DocumentService()
+    lignes = []
+    with app.app_context():
+        peupler(args.taille)
+        for query in ['prince', 'Château', 'Verne', 'lumiere']:
+            regex = chronometrer(lambda: recherche_regex(query))
+            texte = chronometrer(lambda: service.search(query, limit=20))
+            lignes.append([query, f'{regex:.1f}', f'{texte:.1f}'])
+        # Motif à retour arrière catastrophique : traité comme du texte
+        motif = '(a+)+$'
+        lignes.append([motif, 'n/a', f'{chronometrer(lambda: service.search(motif, limit=20)):.1f}'])
+        vider('documents')
+    print(f'{args.taille} documents, 20 premiers résultats')
+    afficher_tableau(['requête', '$regex ms', '$text ms'], lignes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Charge HTTP : serveur de développement, gunicorn multi-workers et API asyncio.
+
+    python -m benchmarks.bench_serveur [--clients 16] [--duree 10] [--url /api/stats]
+
+Lance run.py dans chaque SERVER_MODE, envoie des requêtes concurrentes
+pendant --duree secondes puis arrête le serveur par SIGTERM (arrêt
+gracieux). Nécessite le MongoDB désigné par MONGO_URI.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import afficher_tableau, parser, percentile
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def attendre_port(port, delai=30):
+    fin = time.time() + delai
+    while time.time() < fin:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'Le serveur ne répond pas sur le port {port}')
+
+
+def client(url, fin):
+    latences, erreurs = [], 0
+    while time.time() < fin:
+        debut = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+            latences.append(time.perf_counter() - debut)
+        except OSError:
+            erreurs += 1
+    return latences, erreurs
+
+
+def charger(mode, port, args):
+    env = {**os.environ, 'SERVER_MODE': mode, 'PORT': str(port)}
+    serveur = subprocess.Popen([sys.executable, 'run.py'], cwd=RACINE, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        attendre_port(port)
+        url = f'http://127.0.0.1:{port}{args.url}'
+        client(url, time.time() + 1)  # échauffement
+        fin = time.time() + args.duree
+        with ThreadPoolExecutor(max_workers=args.clients) as executor:
+            resultats = list(executor.map(lambda _: client(url, fin), range(args.clients)))
+    finally:
+        serveur.send_signal(signal.SIGTERM)
+        serveur.wait(timeout=60)
+    latences = [l for r in resultats for l in r[0]]
+    erreurs = sum(r[1] for r in resultats)
+    return [mode, len(latences) / args.duree, percentile(latences, 50) * 1000,
+            percentile(latences, 95) * 1000, percentile(latences, 99) * 1000, erreurs]
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--clients', type=int, default=16)
+    args.add_argument('--duree', type=float, default=10)
+    args.add_argument('--url', default='/api/stats')
+    args = args.parse_args()
+    if args.memoire:
+        raise SystemExit('Les serveurs lancés en sous-processus utilisent MONGO_URI')
+
+    lignes = []
+    for mode, port in [('development', 5101), ('production', 5102), ('async', 5103)]:
+        mode, debit, p50, p95, p99, erreurs = charger(mode, port, args)
+        lignes.append([mode, f'{debit:.0f}', f'{p50:.1f}', f'{p95:.1f}', f'{p99:.1f}', erreurs])
+    print(f'{args.clients} clients concurrents sur {args.url} pendant {args.duree:.0f} s')
+    afficher_tableau(['mode', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'erreurs'], lignes)
+
+
+if __name__ == '__main__':
+    main()
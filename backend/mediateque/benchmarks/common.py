@@ -0,0 +1,112 @@
+"""Outils partagés par les scripts de benchmark.
+
+Les benchmarks tournent contre le MongoDB désigné par MONGO_URI, ou contre
+une base mongomock en mémoire avec l'option --memoire (aucun réseau requis).
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, mongo  # noqa: E402
+from app.indexes import ensure_indexes  # noqa: E402
+
+
+def parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--memoire', action='store_true',
+                        help='utiliser une base mongomock en mémoire')
+    return parser
+
+
+def build_app(memoire=False):
+    if not memoire:
+        return create_app()
+    import mongomock
+    app = create_app({'MONGO_AUTO_INDEX': False, 'MONGO_TRANSACTIONS': False,
+                      'MONGO_CHANGE_STREAMS': False})
+    mongo.cx = mongomock.MongoClient()
+    mongo.db = mongo.cx['mediatheque_bench']
+    ensure_indexes(mongo.db)
+    return app
+
+
+def vider(*collections):
+    for nom in collections:
+        mongo.db[nom].delete_many({})
+
+
+class _CollectionComptee:
+    def __init__(self, collection, compteur, latence=0):
+        self._collection = collection
+        self._compteur = compteur
+        self._latence = latence
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if callable(attr):
+            def appel(*args, **kwargs):
+                self._compteur['requetes'] += 1
+                if self._latence:
+                    time.sleep(self._latence)
+                return attr(*args, **kwargs)
+            return appel
+        return attr
+
+
+class _BaseComptee:
+    def __init__(self, db, compteur, latence=0):
+        self._db = db
+        self._compteur = compteur
+        self._latence = latence
+
+    def __getattr__(self, name):
+        return _CollectionComptee(self._db[name], self._compteur, self._latence)
+
+    def __getitem__(self, name):
+        return _CollectionComptee(self._db[name], self._compteur, self._latence)
+
+    def get_collection(self, name, **options):
+        return _CollectionComptee(self._db.get_collection(name, **options),
+                                  self._compteur, self._latence)
+
+
+@contextmanager
+def compter_requetes(latence=0):
+    """Compte les appels de méthodes de collection (un par aller-retour).
+
+    `latence` (secondes) est ajoutée avant chaque appel pour simuler un
+    serveur distant.
+    """
+    compteur = {'requetes': 0}
+    db = mongo.db
+    mongo.db = _BaseComptee(db, compteur, latence)
+    try:
+        yield compteur
+    finally:
+        mongo.db = db
+
+
+def chronometrer(fn, repetitions=3):
+    """Renvoie la meilleure durée (en ms) sur plusieurs exécutions."""
+    meilleur = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fn()
+        duree = (time.perf_counter() - debut) * 1000
+        meilleur = duree if meilleur is None else min(meilleur, duree)
+    return meilleur
+
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * p / 100))] if valeurs else 0
+
+
+def afficher_tableau(entetes, lignes):
+    largeurs = [max(len(str(x)) for x in col) for col in zip(entetes, *lignes)]
+    for ligne in [entetes] + lignes:
+        print('  '.join(str(x).rjust(l) for x, l in zip(ligne, largeurs)))
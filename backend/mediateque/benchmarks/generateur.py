@@ -0,0 +1,179 @@
+"""Jeu de données synthétique et reproductible : documents, abonnés, emprunts.
+
+    python -m benchmarks.generateur [--echelle 10k] [--graine 42] [--memoire]
+
+L'échelle fixe le nombre de documents (10k, 100k, 1m ou un entier). Les
+abonnés et les emprunts suivent des proportions de médiathèque : un abonné
+pour cinq documents, trois emprunts par document dont le dernier est en
+cours pour un document sur dix (en retard s'il est échu). Une même graine
+donne les mêmes identifiants et les mêmes valeurs : deux exécutions, ou
+deux commits, mesurent la même base.
+
+La structure (qui emprunte quoi, quand) se calcule à partir des indices :
+l'emprunt j porte sur le document j // 3 et revient à l'abonné j % abonnés.
+Rien n'est gardé en mémoire d'un lot à l'autre, même à 1m documents.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from benchmarks.common import afficher_tableau, build_app, parser, vider
+from app import mongo
+from app.services.stats_service import StatsService
+from config import Config
+
+ECHELLES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+EMPRUNTS_PAR_DOCUMENT = 3
+DOCUMENTS_PAR_ABONNE = 5
+# Un document sur dix est emprunté au moment de la génération
+PART_EMPRUNTES = 10
+
+MOTS = ['prince', 'étoile', 'mer', 'nuit', 'château', 'jardin', 'été', 'voyage',
+        'rivière', 'forêt', 'hiver', 'ombre', 'lumière', 'secret', 'île', 'temps',
+        'ville', 'montagne', 'silence', 'mémoire']
+AUTEURS = ['Hugo', 'Zola', 'Camus', 'Sand', 'Verne', 'Duras', 'Proust', 'Colette',
+           'Balzac', 'Flaubert', 'Yourcenar', 'Modiano']
+NOMS = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit',
+        'Durand', 'Leroy', 'Moreau', 'Simon', 'Laurent']
+PRENOMS = ['Jean', 'Marie', 'Pierre', 'Sophie', 'Luc', 'Claire', 'Paul', 'Julie',
+           'Louis', 'Emma', 'Hugo', 'Léa']
+TYPES = [('livre', 70), ('dvd', 12), ('cd', 10), ('revue', 8)]
+VILLES = ['Paris', 'Lyon', 'Lille', 'Nantes', 'Rennes', 'Bordeaux']
+
+# Préfixes des identifiants, un par collection
+PREFIXES = {'documents': 1, 'abonnes': 2, 'emprunts': 3}
+HORODATAGE_BASE = 1_600_000_000
+# Document de la collection stats décrivant le jeu généré (lu par les scénarios)
+ID_JEU = 'jeu_benchmark'
+
+
+def identifiant(collection, i):
+    """ObjectId déterministe, croissant avec i (la pagination suit l'ordre)."""
+    return ObjectId(f'{HORODATAGE_BASE + i:08x}{PREFIXES[collection]:04x}{i:012x}')
+
+
+def taille(echelle):
+    documents = ECHELLES.get(echelle) or int(echelle)
+    return {
+        'documents': documents,
+        'abonnes': max(documents // DOCUMENTS_PAR_ABONNE, 1),
+        'emprunts': documents * EMPRUNTS_PAR_DOCUMENT
+    }
+
+
+def emprunte(document):
+    # Hachage multiplicatif : répartition fixe et dispersée sur les indices
+    return ((document * 2654435761) & 0xFFFFFFFF) >> 16 & 0xFF < 256 // PART_EMPRUNTES
+
+
+def emprunt(j, tailles, reference):
+    """Emprunt j, déduit de son indice seul."""
+    document, rang = divmod(j, EMPRUNTS_PAR_DOCUMENT)
+    actif = rang == EMPRUNTS_PAR_DOCUMENT - 1 and emprunte(document)
+    if actif:
+        # Emprunté entre 0 et 19 jours : un quart des emprunts en cours est échu
+        date_emprunt = reference - timedelta(days=document % 20, minutes=j % 1440)
+    else:
+        date_emprunt = reference - timedelta(days=30 * (EMPRUNTS_PAR_DOCUMENT - rang) + document % 30,
+                                             minutes=j % 1440)
+    date_retour_prevue = date_emprunt + timedelta(days=14)
+    return {
+        '_id': identifiant('emprunts', j),
+        'abonne_id': identifiant('abonnes', j % tailles['abonnes']),
+        'document_id': identifiant('documents', document),
+        'date_emprunt': date_emprunt,
+        'date_retour_prevue': date_retour_prevue,
+        'date_retour_effective': None if actif else date_emprunt + timedelta(days=1 + j % 14),
+        'statut': ('retarde' if date_retour_prevue < reference else 'en_cours') if actif else 'retourne'
+    }
+
+
+def document(rng, i):
+    types, poids = zip(*TYPES)
+    return {
+        '_id': identifiant('documents', i),
+        'titre': ' '.join(rng.choice(MOTS) for _ in range(rng.randint(2, 4))).capitalize(),
+        'auteur': f'{rng.choice(PRENOMS)} {rng.choice(AUTEURS)}',
+        'type': rng.choices(types, poids)[0],
+        'isbn': f'978{i:010d}',
+        'date_publication': datetime(1950, 1, 1) + timedelta(days=rng.randrange(27000)),
+        # Un exemplaire par titre : chaque emprunt en cours le retire du rayon
+        'exemplaires_total': 1,
+        'exemplaires_disponibles': 0 if emprunte(i) else 1,
+        'disponible': not emprunte(i),
+        'emprunts': [str(identifiant('emprunts', i * EMPRUNTS_PAR_DOCUMENT + rang))
+                     for rang in range(EMPRUNTS_PAR_DOCUMENT)]
+    }
+
+
+def abonne(rng, a, tailles, reference):
+    nom, prenom = rng.choice(NOMS), rng.choice(PRENOMS)
+    emprunts = range(a, tailles['emprunts'], tailles['abonnes'])
+    actuels = [j for j in emprunts
+               if j % EMPRUNTS_PAR_DOCUMENT == EMPRUNTS_PAR_DOCUMENT - 1
+               and emprunte(j // EMPRUNTS_PAR_DOCUMENT)]
+    return {
+        '_id': identifiant('abonnes', a),
+        'nom': nom,
+        'prenom': prenom,
+        'email': f'{prenom.lower()}.{nom.lower()}{a}@exemple.fr',
+        'adresse': f'{rng.randint(1, 200)} rue {rng.choice(MOTS)}, {rng.choice(VILLES)}',
+        'telephone': f'0{rng.randint(100000000, 799999999)}',
+        'date_inscription': reference - timedelta(days=rng.randrange(3650)),
+        'emprunts_actuels': [str(identifiant('emprunts', j)) for j in actuels],
+        'historique_emprunts': [str(identifiant('emprunts', j))
+                                for j in emprunts[-Config.HISTORIQUE_EMBARQUE_MAX:]]
+    }
+
+
+def inserer(collection, generateur, total, taille_lot):
+    lot = []
+    for i in range(total):
+        lot.append(generateur(i))
+        if len(lot) == taille_lot:
+            mongo.db[collection].insert_many(lot, ordered=False)
+            lot = []
+    if lot:
+        mongo.db[collection].insert_many(lot, ordered=False)
+
+
+def generer(echelle='10k', graine=42, reference=None, taille_lot=10000):
+    """Remplace documents, abonnes et emprunts de mongo.db par le jeu de
+    données de l'échelle et de la graine, puis recalcule les compteurs.
+    Le jeu est décrit dans stats (ID_JEU). Renvoie le nombre de documents
+    insérés par collection."""
+    tailles = taille(echelle)
+    # Dates relatives au jour de génération : les retards restent réalistes
+    reference = reference or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rng = random.Random(graine)
+    vider('documents', 'abonnes', 'emprunts', 'stats', 'relances')
+    inserer('documents', lambda i: document(rng, i), tailles['documents'], taille_lot)
+    inserer('abonnes', lambda a: abonne(rng, a, tailles, reference), tailles['abonnes'], taille_lot)
+    inserer('emprunts', lambda j: emprunt(j, tailles, reference), tailles['emprunts'], taille_lot)
+    StatsService().reconcilier_compteurs()
+    mongo.db.stats.replace_one({'_id': ID_JEU},
+                               {'echelle': echelle, 'graine': graine, 'tailles': tailles},
+                               upsert=True)
+    return tailles
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--echelle', default='10k', help='10k, 100k, 1m ou un nombre de documents')
+    args.add_argument('--graine', type=int, default=42)
+    args.add_argument('--taille-lot', type=int, default=10000)
+    args = args.parse_args()
+
+    app = build_app(args.memoire)
+    with app.app_context():
+        debut = time.perf_counter()
+        tailles = generer(args.echelle, args.graine, taille_lot=args.taille_lot)
+        duree = time.perf_counter() - debut
+    afficher_tableau(['collection', 'documents'], [[c, n] for c, n in tailles.items()])
+    print(f'Généré en {duree:.1f} s (graine {args.graine})')
+
+
+if __name__ == '__main__':
+    main()
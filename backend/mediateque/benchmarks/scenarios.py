@@ -0,0 +1,252 @@
+"""Scénarios de charge contre l'application Flask réelle.
+
+    python -m benchmarks.scenarios [--scenario mixte] [--duree 30] [--clients 4]
+        [--generer] [--echelle 10k] [--graine 42] [--memoire]
+        [--sortie resultats.json] [--comparer reference.json]
+
+Chaque client (un thread, un client de test Flask) enchaîne des actions
+tirées au sort selon les poids du scénario : parcours et filtres du
+catalogue, fiches, recherche plein texte, rafales d'emprunts suivies des
+retours, tableau de bord. Les requêtes traversent routes, services,
+sérialisation et MongoDB, sans réseau HTTP.
+
+Le jeu de données est celui de benchmarks.generateur (--generer le
+recrée ; toujours le cas avec --memoire). Latences p50/p95/p99 et débit
+sont donnés par route ; --sortie les enregistre avec le commit courant et
+--comparer affiche l'écart avec un enregistrement précédent. Comparer deux
+commits : même scénario, même échelle, même graine, jeu régénéré.
+
+Avec --memoire, la recherche est retirée (mongomock n'a pas de $text) et
+un seul client tourne (mongomock n'est pas thread-safe).
+"""
+import json
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import afficher_tableau, build_app, parser, percentile
+from benchmarks.generateur import ID_JEU, MOTS, TYPES, emprunte, generer, identifiant
+from app import mongo
+
+TAILLE_PAGE = 20
+TAILLE_RAFALE = 5
+
+
+class Client:
+    """Un utilisateur simulé : son tirage, son client de test, ses mesures."""
+
+    def __init__(self, app, tailles, graine):
+        self.http = app.test_client()
+        self.tailles = tailles
+        self.rng = random.Random(graine)
+        self.mesures = {}
+
+    def appeler(self, route, methode, url, **kwargs):
+        debut = time.perf_counter()
+        reponse = self.http.open(url, method=methode, **kwargs)
+        duree = time.perf_counter() - debut
+        mesure = self.mesures.setdefault(route, {'latences': [], 'refus': 0, 'erreurs': 0})
+        mesure['latences'].append(duree)
+        if reponse.status_code >= 500:
+            mesure['erreurs'] += 1
+        elif reponse.status_code >= 400:
+            mesure['refus'] += 1
+        return reponse
+
+    def document(self):
+        return str(identifiant('documents', self.rng.randrange(self.tailles['documents'])))
+
+    def document_disponible(self):
+        # Disponible à la génération ; les autres clients ont pu l'emprunter
+        while True:
+            i = self.rng.randrange(self.tailles['documents'])
+            if not emprunte(i):
+                return str(identifiant('documents', i))
+
+
+def parcourir(client):
+    client.appeler('GET /documents', 'GET',
+                   f'/api/documents?limit={TAILLE_PAGE}&after={client.document()}')
+
+
+def filtrer(client):
+    if client.rng.random() < .5:
+        type_doc = client.rng.choice(TYPES)[0]
+        client.appeler('GET /documents?type', 'GET',
+                       f'/api/documents?type={type_doc}&limit={TAILLE_PAGE}')
+    else:
+        client.appeler('GET /documents?disponible', 'GET',
+                       f'/api/documents?disponible=true&limit={TAILLE_PAGE}')
+
+
+def fiche(client):
+    client.appeler('GET /documents/<id>', 'GET', f'/api/documents/{client.document()}')
+
+
+def rechercher(client):
+    termes = ' '.join(client.rng.sample(MOTS, 2))
+    client.appeler('GET /documents?search', 'GET',
+                   f'/api/documents?search={termes}&limit={TAILLE_PAGE}')
+
+
+def rafale(client):
+    """Emprunts successifs d'un abonné au comptoir, puis leurs retours."""
+    abonne = str(identifiant('abonnes', client.rng.randrange(client.tailles['abonnes'])))
+    emprunts = []
+    for _ in range(TAILLE_RAFALE):
+        reponse = client.appeler('POST /emprunts', 'POST', '/api/emprunts',
+                                 json={'abonne_id': abonne,
+                                       'document_id': client.document_disponible()})
+        if reponse.status_code == 201:
+            emprunts.append(reponse.get_json()['id'])
+    for emprunt_id in emprunts:
+        client.appeler('POST /emprunts/<id>/retour', 'POST', f'/api/emprunts/{emprunt_id}/retour')
+
+
+def tableau(client):
+    client.appeler('GET /stats', 'GET', '/api/stats')
+    client.appeler('GET /documents/stats', 'GET', '/api/documents/stats')
+    client.appeler('GET /emprunts/en-retard', 'GET', f'/api/emprunts/en-retard?limit={TAILLE_PAGE}')
+
+
+# Poids des actions par scénario
+SCENARIOS = {
+    'catalogue': {parcourir: 6, filtrer: 3, fiche: 3},
+    'recherche': {rechercher: 1},
+    'emprunts': {rafale: 1},
+    'tableau': {tableau: 1},
+    'mixte': {parcourir: 30, filtrer: 10, fiche: 15, rechercher: 15, rafale: 10, tableau: 20}
+}
+
+
+def executer(client, actions, fin, operations):
+    fonctions, poids = zip(*actions.items())
+    faites = 0
+    while time.perf_counter() < fin and (operations is None or faites < operations):
+        client.rng.choices(fonctions, poids)[0](client)
+        faites += 1
+
+
+def charger(app, tailles, actions, args):
+    clients = [Client(app, tailles, args.graine + i) for i in range(args.clients)]
+    # Échauffement : caches, pool de connexions, plans de requête
+    for client in clients:
+        executer(client, actions, time.perf_counter() + args.echauffement, None)
+        client.mesures = {}
+    debut = time.perf_counter()
+    threads = [threading.Thread(target=executer,
+                                args=(client, actions, debut + args.duree, args.operations))
+               for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duree = time.perf_counter() - debut
+
+    resultats = {}
+    for route in sorted({r for client in clients for r in client.mesures}):
+        mesures = [client.mesures[route] for client in clients if route in client.mesures]
+        latences = [l for m in mesures for l in m['latences']]
+        resultats[route] = {
+            'requetes': len(latences),
+            'debit': len(latences) / duree,
+            'p50_ms': percentile(latences, 50) * 1000,
+            'p95_ms': percentile(latences, 95) * 1000,
+            'p99_ms': percentile(latences, 99) * 1000,
+            'refus': sum(m['refus'] for m in mesures),
+            'erreurs': sum(m['erreurs'] for m in mesures)
+        }
+    return resultats, duree
+
+
+def commit_courant():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        modifie = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-modifie' if modifie else commit
+
+
+def ecart(avant, apres):
+    return f'{(apres - avant) / avant * 100:+.0f}%' if avant else '-'
+
+
+def comparer(reference, rapport):
+    for cle in ['scenario', 'echelle', 'graine', 'clients', 'base']:
+        if reference.get(cle) != rapport[cle]:
+            print(f"Attention : {cle} différent ({reference.get(cle)} contre {rapport[cle]})")
+    lignes = []
+    for route, actuel in rapport['resultats'].items():
+        avant = reference['resultats'].get(route)
+        if not avant:
+            continue
+        lignes.append([route] + [f"{avant[k]:.1f} -> {actuel[k]:.1f} ({ecart(avant[k], actuel[k])})"
+                                 for k in ['p50_ms', 'p95_ms', 'p99_ms', 'debit']])
+    print(f"Comparaison avec {reference.get('commit')} ({reference.get('date')})")
+    afficher_tableau(['route', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s'], lignes)
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixte')
+    args.add_argument('--duree', type=float, default=30, help='durée de la mesure (s)')
+    args.add_argument('--operations', type=int, help='actions par client (arrête avant --duree)')
+    args.add_argument('--echauffement', type=float, default=2, help='durée non mesurée (s)')
+    args.add_argument('--clients', type=int, default=4)
+    args.add_argument('--generer', action='store_true', help='recréer le jeu de données')
+    args.add_argument('--echelle', default='10k')
+    args.add_argument('--graine', type=int, default=42)
+    args.add_argument('--sortie', help='fichier JSON où enregistrer les résultats')
+    args.add_argument('--comparer', help='résultats JSON de référence')
+    args = args.parse_args()
+
+    actions = dict(SCENARIOS[args.scenario])
+    if args.memoire:
+        actions.pop(rechercher, None)
+        args.clients = 1
+        if not actions:
+            raise SystemExit('La recherche plein texte nécessite MongoDB : lancer contre MONGO_URI')
+
+    app = build_app(args.memoire)
+    with app.app_context():
+        if args.generer or args.memoire:
+            print(f'Génération du jeu {args.echelle} (graine {args.graine})...')
+            generer(args.echelle, args.graine)
+        jeu = mongo.db.stats.find_one({'_id': ID_JEU})
+    if not jeu:
+        raise SystemExit('Aucun jeu de données : lancer benchmarks.generateur ou passer --generer')
+
+    resultats, duree = charger(app, jeu['tailles'], actions, args)
+    rapport = {
+        'commit': commit_courant(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'scenario': args.scenario,
+        'echelle': jeu['echelle'],
+        'graine': jeu['graine'],
+        'clients': args.clients,
+        'base': 'mongomock' if args.memoire else 'mongodb',
+        'duree': duree,
+        'resultats': resultats
+    }
+
+    print(f"Scénario {args.scenario}, {args.clients} clients, {duree:.1f} s, "
+          f"jeu {jeu['echelle']} (graine {jeu['graine']})")
+    afficher_tableau(['route', 'requêtes', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'refus', 'erreurs'],
+                     [[route, r['requetes'], f"{r['debit']:.0f}", f"{r['p50_ms']:.1f}",
+                       f"{r['p95_ms']:.1f}", f"{r['p99_ms']:.1f}", r['refus'], r['erreurs']]
+                      for route, r in resultats.items()])
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+    if args.comparer:
+        with open(args.comparer, encoding='utf-8') as f:
+            comparer(json.load(f), rapport)
+
+
+if __name__ == '__main__':
+    main()
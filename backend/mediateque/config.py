@@ -5,4 +5,95 @@ load_dotenv()
 
 class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/mediatheque')
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
\ No newline at end of file
+    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
+
+    # Application du registre d'index (app/indexes.py) au démarrage
+    MONGO_AUTO_INDEX = os.getenv('MONGO_AUTO_INDEX', 'true').lower() == 'true'
+    # Durée de vie (secondes) de l'instantané des statistiques
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '30'))
+    # Cache des abonnés et documents lus par _id : entrées par collection et
+    # durée de vie (secondes) quand les change streams ne les invalident pas
+    ENTITES_CACHE_TAILLE = int(os.getenv('ENTITES_CACHE_TAILLE', '10000'))
+    ENTITES_CACHE_TTL = float(os.getenv('ENTITES_CACHE_TTL', '30'))
+    # Durée de vie (secondes) des versions de collections lues pour les ETag,
+    # quand les change streams ne les invalident pas
+    VERSIONS_CACHE_TTL = float(os.getenv('VERSIONS_CACHE_TTL', '5'))
+    # Transactions multi-documents pour les emprunts et retours (replica set requis)
+    MONGO_TRANSACTIONS = os.getenv('MONGO_TRANSACTIONS', 'true').lower() == 'true'
+    # Nombre de notices écrites par bulk_write lors d'un import de catalogue
+    IMPORT_TAILLE_LOT = int(os.getenv('IMPORT_TAILLE_LOT', '1000'))
+    # Demandes acceptées par POST /emprunts/bulk et /emprunts/retours/bulk
+    BULK_TAILLE_MAX = int(os.getenv('BULK_TAILLE_MAX', '500'))
+    # Emprunts récents gardés dans abonnes.historique_emprunts et
+    # documents.emprunts ; l'historique complet reste dans la collection emprunts
+    HISTORIQUE_EMBARQUE_MAX = int(os.getenv('HISTORIQUE_EMBARQUE_MAX', '20'))
+    # Listes et exports de documents et d'abonnés lus en BSON brut et décodés
+    # en enregistrements compacts (app/models) : seuls les champs projetés,
+    # ou ceux du schéma, sont décodés ; non pris en charge par mongomock
+    LECTURE_BSON_BRUTE = os.getenv('LECTURE_BSON_BRUTE', 'false').lower() == 'true'
+
+    # Balayage des emprunts échus (RetardService, commande balayer-retards) :
+    # emprunts passés au statut 'retarde' par update_many, et période du
+    # balayage en boucle
+    RETARDS_TAILLE_LOT = int(os.getenv('RETARDS_TAILLE_LOT', '500'))
+    RETARDS_INTERVALLE_SECONDES = float(os.getenv('RETARDS_INTERVALLE_SECONDES', '300'))
+
+    # Cumuls des emprunts par jour (CumulService, commande cumuler-emprunts) :
+    # les emprunts écrits moins de CUMULS_MARGE_SECONDES avant la mise à
+    # jour restent derrière le filigrane, et période de la mise à jour en boucle
+    CUMULS_MARGE_SECONDES = float(os.getenv('CUMULS_MARGE_SECONDES', '60'))
+    CUMULS_INTERVALLE_SECONDES = float(os.getenv('CUMULS_INTERVALLE_SECONDES', '300'))
+
+    # Archivage des emprunts retournés (ArchiveService, commande
+    # archiver-emprunts) : âge du retour au-delà duquel un emprunt quitte la
+    # collection emprunts, emprunts déplacés par transaction, et période de
+    # l'archivage en boucle
+    ARCHIVE_AGE_JOURS = int(os.getenv('ARCHIVE_AGE_JOURS', '365'))
+    ARCHIVE_TAILLE_LOT = int(os.getenv('ARCHIVE_TAILLE_LOT', '1000'))
+    ARCHIVE_INTERVALLE_SECONDES = float(os.getenv('ARCHIVE_INTERVALLE_SECONDES', '86400'))
+
+    # Flux de modifications (app/utils/changements.py) : invalidation des
+    # caches de chaque worker et diffusion Server-Sent Events (replica set requis)
+    MONGO_CHANGE_STREAMS = os.getenv('MONGO_CHANGE_STREAMS', 'true').lower() == 'true'
+    # Événements gardés en mémoire pour les clients qui se reconnectent
+    FLUX_HISTORIQUE = int(os.getenv('FLUX_HISTORIQUE', '1000'))
+    # Connexion SSE fermée après cette durée (le navigateur se reconnecte
+    # avec Last-Event-ID après FLUX_RECONNEXION_SECONDES), commentaire de
+    # maintien et statistiques au plus toutes les FLUX_STATS_INTERVALLE_SECONDES
+    FLUX_DUREE_SECONDES = float(os.getenv('FLUX_DUREE_SECONDES', '300'))
+    FLUX_RECONNEXION_SECONDES = float(os.getenv('FLUX_RECONNEXION_SECONDES', '5'))
+    # Sous gunicorn gthread, une connexion SSE occupe un des WEB_THREADS du
+    # worker : durée écourtée, et au-delà de FLUX_CONNEXIONS_THREAD flux
+    # ouverts par worker, les statistiques sont envoyées seules et la
+    # connexion refermée aussitôt. Le mode async n'a pas ces limites
+    FLUX_DUREE_THREAD_SECONDES = float(os.getenv('FLUX_DUREE_THREAD_SECONDES', '25'))
+    FLUX_CONNEXIONS_THREAD = int(os.getenv('FLUX_CONNEXIONS_THREAD', '2'))
+    FLUX_HEARTBEAT_SECONDES = float(os.getenv('FLUX_HEARTBEAT_SECONDES', '15'))
+    FLUX_STATS_INTERVALLE_SECONDES = float(os.getenv('FLUX_STATS_INTERVALLE_SECONDES', '2'))
+
+    # Retard maximal toléré d'un secondaire servant les lectures analytiques
+    # (app/utils/politiques.py) ; MongoDB impose au moins 90 secondes
+    MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', '90'))
+
+    # Instrumentation (app/utils/metriques.py) : commandes MongoDB plus
+    # longues que ce seuil journalisées, niveau du journal
+    MONGO_SLOW_MS = float(os.getenv('MONGO_SLOW_MS', '100'))
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+    # Pool de connexions PyMongo, par processus (donc par worker)
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000'))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+
+    # Mode de service : 'development' (serveur Werkzeug, debug),
+    # 'production' (gunicorn multi-workers, voir gunicorn.conf.py) ou
+    # 'async' (API asyncio app.aio servie par hypercorn)
+    SERVER_MODE = os.getenv('SERVER_MODE', 'development')
+    PORT = int(os.getenv('PORT', '5000'))
+    # 0 : dimensionné sur le nombre de cœurs
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '0'))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '30'))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '20'))
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Configuration gunicorn du mode production (SERVER_MODE=production).
+
+L'application est chargée par 'app:create_app()' dans chaque worker, après
+le fork : chaque worker ouvre son propre client PyMongo et son propre pool
+de connexions (un MongoClient ne doit pas traverser un fork).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from config import Config
+
+# Métriques Prometheus partagées entre workers (app/utils/metriques.py) :
+# la variable doit être posée avant que les workers importent prometheus_client
+METRIQUES_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'mediateque-metriques'))
+
+bind = f'0.0.0.0:{Config.PORT}'
+worker_class = 'gthread'
+# Charge d'E/S (allers-retours MongoDB) : 2 workers par cœur + 1, chacun
+# servant WEB_THREADS requêtes simultanées sur son pool de connexions. Les
+# flux SSE (/stats/flux) en occupent au plus FLUX_CONNEXIONS_THREAD : au-delà
+# de quelques tableaux de bord ouverts, préférer SERVER_MODE=async
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count() * 2 + 1
+threads = Config.WEB_THREADS
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+# Jamais de préchargement : le client PyMongo serait créé avant le fork
+preload_app = False
+# Recycle les workers progressivement pour borner la fragmentation mémoire
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = '-'
+
+
+def on_starting(server):
+    # Les fichiers d'une exécution précédente fausseraient les compteurs
+    shutil.rmtree(METRIQUES_DIR, ignore_errors=True)
+    os.makedirs(METRIQUES_DIR)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    server.log.info('Worker %s démarré (%s threads)', worker.pid, threads)
+
+
+def worker_exit(server, worker):
+    # Arrêt gracieux : les requêtes en cours sont terminées, puis le pool
+    # de connexions du worker est fermé proprement
+    from app import mongo
+    from app.utils.changements import ecouteur
+    # Dernier jeton de reprise du flux de modifications enregistré
+    ecouteur.arreter()
+    if mongo.cx is not None:
+        mongo.cx.close()
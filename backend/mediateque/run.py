@@ -1,6 +1,35 @@
-from app import create_app
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from config import Config
+
+
+def main():
+    if Config.SERVER_MODE == 'production':
+        # gunicorn crée l'application dans chaque worker (voir gunicorn.conf.py)
+        from gunicorn.app.wsgiapp import run
+        sys.argv = ['gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()']
+        run()
+    elif Config.SERVER_MODE == 'async':
+        # Variante asyncio (app.aio) servie par hypercorn : une boucle
+        # d'événements par worker, un worker par cœur
+        from hypercorn.__main__ import main as hypercorn
+        workers = Config.WEB_WORKERS or multiprocessing.cpu_count()
+        # Métriques partagées entre workers, comme sous gunicorn
+        metriques = os.environ.setdefault(
+            'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'mediateque-metriques'))
+        shutil.rmtree(metriques, ignore_errors=True)
+        os.makedirs(metriques)
+        hypercorn(['--bind', f'0.0.0.0:{Config.PORT}', '--workers', str(workers),
+                   'app.aio:create_async_app()'])
+    else:
+        # Importée ici seulement : le processus maître de gunicorn ne doit pas
+        # charger l'application (ni prometheus_client) avant le fork
+        from app import create_app
+        create_app().run(host='0.0.0.0', port=Config.PORT, debug=True)
 
-app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
\ No newline at end of file
+    main()
\ No newline at end of file
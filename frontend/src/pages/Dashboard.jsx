@@ -18,11 +18,12 @@ const Dashboard = () => {
   const apiUrl = `${process.env.REACT_APP_API_URL}/stats`;
 
   useEffect(() => {
-    console.log(process.env);
-    fetch(apiUrl)
-      .then((res) => res.json())
-      .then((data) => setStats(data))
-      .catch((err) => console.error(err));
+    // Statistiques poussées par le serveur à chaque modification ; le
+    // navigateur se reconnecte seul si la connexion est coupée
+    const flux = new EventSource(`${apiUrl}/flux`);
+    flux.addEventListener("stats", (event) => setStats(JSON.parse(event.data)));
+    flux.onerror = (err) => console.error(err);
+    return () => flux.close();
   }, []);
 
   return (
@@ -37,7 +37,9 @@ const Emprunts = () => {
   const checkAndUpdateOverdueStatus = (emprunts) => {
     const today = new Date();
     return emprunts.map(emprunt => {
-      if (emprunt.statut === 'en_cours' && new Date(emprunt.date_retour_prevue) < today) {
+      // 'retarde' : emprunt échu marqué par le balayage des retards côté API
+      if (emprunt.statut === 'retarde' ||
+          (emprunt.statut === 'en_cours' && new Date(emprunt.date_retour_prevue) < today)) {
         return { ...emprunt, statut: 'en_retard' };
       }
       return emprunt;
@@ -356,7 +358,7 @@ const Emprunts = () => {
                   />
                 </TableCell>
                 <TableCell>
-                  {emprunt.statut === "en_cours" && (
+                  {(emprunt.statut === "en_cours" || emprunt.statut === "en_retard") && (
                     <IconButton onClick={() => handleRetour(emprunt._id)}>
                       <Check />
                     </IconButton>